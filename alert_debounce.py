@@ -0,0 +1,108 @@
+# alert_debounce.py
+#
+# Optional debounce stage between a detected restock and the alert:
+# - Confirmation: an out -> in edge is held and the key is re-checked right away
+#   (front of its queue); the alert only goes out if the re-check still shows stock
+# - Flap suppression: a key whose state flipped more than FLAP_MAX_FLIPS times in
+#   FLAP_WINDOW_SECONDS has its alerts muted (state is still tracked)
+# - Counts alerts saved and the latency the confirmation added
+
+from __future__ import annotations
+
+import collections
+import time
+
+
+class AlertDebouncer:
+    def __init__(self, confirm: bool = True, flap_max_flips: int = 0, flap_window_seconds: float = 3600.0):
+        self.confirm = confirm
+        self.flap_max_flips = max(0, int(flap_max_flips))
+        self.flap_window_seconds = float(flap_window_seconds)
+
+        # key -> monotonic time the unconfirmed edge was seen
+        self._held: dict[str, float] = {}
+        self._flips: dict[str, collections.deque[float]] = {}
+
+        self.confirmed = 0
+        self.blips_suppressed = 0
+        self.flaps_suppressed = 0
+        self._confirm_latency_total = 0.0
+        self._confirm_latency_max = 0.0
+
+    def hold(self, keys: list[str]) -> None:
+        """
+        Marks rising edges as waiting for a confirmation re-check.
+        """
+        now = time.monotonic()
+        for k in keys:
+            self._held.setdefault(k, now)
+
+    def is_held(self, key: str) -> bool:
+        return key in self._held
+
+    def resolve(self, key: str, still_in: bool) -> float | None:
+        """
+        Called with the confirmation re-check result for a held key.
+        Returns the latency the confirmation added, or None if the key was not held.
+        """
+        t0 = self._held.pop(key, None)
+        if t0 is None:
+            return None
+
+        latency = time.monotonic() - t0
+        if still_in:
+            self.confirmed += 1
+            self._confirm_latency_total += latency
+            self._confirm_latency_max = max(self._confirm_latency_max, latency)
+        else:
+            self.blips_suppressed += 1
+        return latency
+
+    def drop(self, key: str) -> None:
+        """
+        Re-check could not read the page; forget the edge, the next cycle sees it again.
+        """
+        self._held.pop(key, None)
+
+    def record_flip(self, key: str) -> None:
+        if self.flap_max_flips <= 0:
+            return
+        now = time.monotonic()
+        flips = self._flips.setdefault(key, collections.deque())
+        flips.append(now)
+        while flips and now - flips[0] > self.flap_window_seconds:
+            flips.popleft()
+
+    def is_flapping(self, key: str) -> bool:
+        if self.flap_max_flips <= 0:
+            return False
+        flips = self._flips.get(key)
+        if not flips:
+            return False
+        now = time.monotonic()
+        while flips and now - flips[0] > self.flap_window_seconds:
+            flips.popleft()
+        return len(flips) > self.flap_max_flips
+
+    def note_muted(self) -> None:
+        self.flaps_suppressed += 1
+
+    def clear_held(self) -> None:
+        """
+        End of cycle: edges whose re-check never came back are detected again next cycle.
+        """
+        self._held.clear()
+
+    def forget(self, key: str) -> None:
+        self._held.pop(key, None)
+        self._flips.pop(key, None)
+
+    def summary(self) -> str | None:
+        if not (self.confirmed or self.blips_suppressed or self.flaps_suppressed):
+            return None
+        avg = self._confirm_latency_total / self.confirmed if self.confirmed else 0.0
+        return (
+            f"Alert debounce: {self.confirmed} confirmed (added avg {avg:.1f}s, max {self._confirm_latency_max:.1f}s), "
+            f"saved {self.blips_suppressed + self.flaps_suppressed} alerts "
+            f"({self.blips_suppressed} blips, {self.flaps_suppressed} flapping)"
+        )
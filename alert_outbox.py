@@ -0,0 +1,257 @@
+# alert_outbox.py
+#
+# Durable outbox for alerts (ALERT_OUTBOX_PATH, SQLite):
+# - Every alert is written here, one row per destination, before main saves the
+#   in-stock state, so a crash or a Discord outage cannot lose it
+# - Rows are keyed by an idempotency key built from the alert "episode" (one per
+#   in-stock period of a SKU at a store). Seeing the same transition again after a
+#   restart is a no-op, and delivered rows are never sent again
+# - Failed deliveries are retried with exponential backoff; rows older than
+#   ALERT_OUTBOX_MAX_AGE_HOURS are given up on and counted as expired
+# - Depth and age of the undelivered backlog are exposed for the cycle summary
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    subject TEXT NOT NULL,
+    action TEXT NOT NULL,
+    dest_kind TEXT NOT NULL,
+    dest_label TEXT NOT NULL,
+    dest_target TEXT,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    delivered REAL,
+    expired REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (delivered, expired, next_attempt);
+CREATE TABLE IF NOT EXISTS episodes (
+    subject TEXT PRIMARY KEY,
+    n INTEGER NOT NULL,
+    open INTEGER NOT NULL
+);
+"""
+
+# A delete waits until the earlier post it removes has been delivered (or expired).
+# In-flight rows (JSON array of ids) are excluded before LIMIT, so rows stuck on one
+# slow destination never hide due rows for the others.
+_DUE_SQL = """
+SELECT id, subject, action, dest_kind, dest_label, dest_target, payload, attempts, created
+FROM outbox AS o
+WHERE delivered IS NULL AND expired IS NULL AND next_attempt <= ?
+  AND id NOT IN (SELECT value FROM json_each(?))
+  AND NOT (action = 'delete' AND EXISTS (
+      SELECT 1 FROM outbox AS p
+      WHERE p.subject = o.subject AND p.dest_kind = o.dest_kind
+        AND p.dest_target IS o.dest_target AND p.action != 'delete' AND p.created <= o.created
+        AND p.delivered IS NULL AND p.expired IS NULL))
+ORDER BY created
+LIMIT ?
+"""
+
+
+@dataclass
+class OutboxRow:
+    id: str
+    subject: str
+    action: str
+    dest_kind: str
+    dest_label: str
+    dest_target: str | None
+    payload: dict
+    attempts: int
+    created: float
+
+
+class AlertOutbox:
+    def __init__(
+        self,
+        path: str,
+        retry_base_seconds: float = 10.0,
+        retry_max_seconds: float = 600.0,
+        max_age_seconds: float = 24 * 3600.0,
+        keep_delivered_seconds: float = 7 * 24 * 3600.0,
+    ):
+        self.path = path
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_age_seconds = max_age_seconds
+        self.keep_delivered_seconds = keep_delivered_seconds
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.duplicates = 0
+        self.retries = 0
+
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # An alert row must survive a power cut, not only a crash
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, conn, key: str, subject: str, action: str, payload: dict, dests, now: float) -> int:
+        body = json.dumps(payload, ensure_ascii=False, default=str)
+        added = 0
+        for kind, label, target in dests:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO outbox "
+                "(id, subject, action, dest_kind, dest_label, dest_target, payload, created, next_attempt) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (f"{key}:{kind}:{target or 'default'}", subject, action, kind, label, target, body, now, now),
+            )
+            added += cur.rowcount
+        return added
+
+    def enqueue_alert(self, subject: str, action: str, payload: dict, dests: list[tuple[str, str, str | None]]) -> int | None:
+        """
+        Opens a new in-stock episode for subject ("ob_"-prefixed SKU + "_" + store id)
+        and adds one row per (kind, label, target) destination, in one transaction.
+        Returns None if an episode is already open: the alert for this transition was
+        queued before, e.g. by a run that crashed before saving state.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT n, open FROM episodes WHERE subject = ?", (subject,)).fetchone()
+            if row is not None and row[1]:
+                conn.execute("COMMIT")
+                with self._lock:
+                    self.duplicates += 1
+                return None
+
+            n = (row[0] if row else 0) + 1
+            conn.execute("INSERT OR REPLACE INTO episodes (subject, n, open) VALUES (?, ?, 1)", (subject, n))
+            added = self._insert(conn, f"{action}:{subject}:{n}", subject, action, payload, dests, time.time())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._lock:
+            self.enqueued += added
+        return added
+
+    def enqueue_sellout(self, subject: str, payload: dict, delete: bool, default_configured: bool = False) -> int:
+        """
+        Closes the open episode for subject. With delete=True, also queues a delete on
+        every Discord destination an alert for subject went to. The default webhook is
+        added only when default_configured (it may hold an alert sent before the outbox).
+        Returns how many deletes were queued.
+        """
+        conn = self._conn()
+        added = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT n, open FROM episodes WHERE subject = ?", (subject,)).fetchone()
+            n = row[0] if row else 0
+            if row is not None and row[1]:
+                conn.execute("UPDATE episodes SET open = 0 WHERE subject = ?", (subject,))
+
+            if delete:
+                dests = conn.execute(
+                    "SELECT DISTINCT dest_kind, dest_label, dest_target FROM outbox "
+                    "WHERE subject = ? AND action != 'delete' AND dest_kind = 'discord'",
+                    (subject,),
+                ).fetchall()
+                if default_configured and not any(target is None for _kind, _label, target in dests):
+                    dests.append(("discord", "default", None))
+                added = self._insert(conn, f"delete:{subject}:{n}", subject, "delete", payload, dests, time.time())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def due(self, exclude: set[str] | None = None, limit: int = 100) -> list[OutboxRow]:
+        rows = self._conn().execute(_DUE_SQL, (time.time(), json.dumps(sorted(exclude or ())), limit)).fetchall()
+        out = []
+        for r in rows:
+            try:
+                payload = json.loads(r[6])
+            except ValueError:
+                payload = {}
+            out.append(OutboxRow(r[0], r[1], r[2], r[3], r[4], r[5], payload, r[7], r[8]))
+        return out
+
+    def mark_attempt(self, row_id: str) -> None:
+        self._conn().execute("UPDATE outbox SET attempts = attempts + 1 WHERE id = ?", (row_id,))
+
+    def mark_delivered(self, row_id: str) -> None:
+        self._conn().execute("UPDATE outbox SET delivered = ?, last_error = NULL WHERE id = ?", (time.time(), row_id))
+
+    def mark_failed(self, row_id: str, attempts: int, error: str = "") -> None:
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * (2 ** max(0, attempts - 1)))
+        self._conn().execute(
+            "UPDATE outbox SET next_attempt = ?, last_error = ? WHERE id = ?",
+            (time.time() + delay, error[:300], row_id),
+        )
+        with self._lock:
+            self.retries += 1
+
+    def housekeeping(self) -> int:
+        """
+        Expires undelivered rows past max age and drops old delivered rows.
+        Returns how many rows expired.
+        """
+        now = time.time()
+        conn = self._conn()
+        expired = conn.execute(
+            "UPDATE outbox SET expired = ? WHERE delivered IS NULL AND expired IS NULL AND created < ?",
+            (now, now - self.max_age_seconds),
+        ).rowcount
+        conn.execute(
+            "DELETE FROM outbox WHERE COALESCE(delivered, expired) < ?",
+            (now - self.keep_delivered_seconds,),
+        )
+        if expired:
+            print(f"[alert_outbox] gave up on {expired} alert(s) older than {self.max_age_seconds / 3600:.0f}h")
+        return expired
+
+    def metrics(self) -> dict:
+        now = time.time()
+        depth, oldest, failing = self._conn().execute(
+            "SELECT COUNT(*), MIN(created), SUM(attempts > 0) FROM outbox WHERE delivered IS NULL AND expired IS NULL"
+        ).fetchone()
+        expired = self._conn().execute("SELECT COUNT(*) FROM outbox WHERE expired IS NOT NULL").fetchone()[0]
+        with self._lock:
+            return {
+                "depth": depth,
+                "oldest_age_seconds": round(now - oldest, 1) if oldest else 0.0,
+                "retrying": failing or 0,
+                "expired": expired,
+                "enqueued": self.enqueued,
+                "duplicates": self.duplicates,
+                "retries": self.retries,
+            }
+
+    def summary(self) -> str | None:
+        m = self.metrics()
+        if not (m["depth"] or m["enqueued"] or m["duplicates"] or m["retries"]):
+            return None
+        line = f"Alert outbox: {m['depth']} undelivered"
+        if m["depth"]:
+            line += f" (oldest {m['oldest_age_seconds']:.0f}s, {m['retrying']} retrying)"
+        line += f"; {m['enqueued']} queued, {m['retries']} retries"
+        if m["duplicates"]:
+            line += f", {m['duplicates']} duplicates ignored"
+        if m["expired"]:
+            line += f", {m['expired']} expired"
+        return line
@@ -0,0 +1,421 @@
+# alert_router.py
+#
+# Routes stock alerts to any number of Discord webhooks and email recipients:
+# - ALERT_ROUTES_FILE (JSON or TOML) maps SKUs, product tags and stores to destinations;
+#   it is reloaded when it changes
+# - The global DISCORD_WEBHOOK_URL / ALERT_EMAIL_TO stay the default destination
+# - Every destination has its own worker thread and queue, so a slow or failing one
+#   never delays the others; Discord webhooks also get their own token bucket
+# - Sell-out deletes go through the same per-webhook queue, after the post they delete
+# - Delivery latency (queued -> delivered) and failures are kept per destination
+# - With ALERT_OUTBOX_PATH set (default), alerts go through the durable outbox in
+#   alert_outbox.py and a dispatcher thread feeds the destination workers from it
+#
+# Routes file:
+#   {
+#     "default": "all",            # all | unrouted | none: what the default destination gets
+#     "routes": [
+#       {"name": "rtx-5080", "skus": ["698877"], "tags": ["rtx5080"], "stores": ["131"],
+#        "discord": ["https://discord.com/api/webhooks/..."], "email": ["a@example.com"],
+#        "open_box": true}
+#     ]
+#   }
+# A route matches when the SKU or one of the product's tags is listed ("*" matches all
+# SKUs) and, if "stores" is given, the store id or name is listed too.
+
+from __future__ import annotations
+
+import functools
+import os
+import queue
+import threading
+import time
+
+import discord_alert
+import discord_alert_tracker
+import email_alert
+from alert_outbox import AlertOutbox, OutboxRow
+from catalog import load_structured
+from config import env_float, env_int, get_settings
+from rate_limiter import TokenBucket
+
+
+DEFAULT_LABEL = "default"
+OUTBOX_POLL_SECONDS = 1.0
+OUTBOX_HOUSEKEEPING_SECONDS = 600.0
+
+
+def _as_list(value) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.replace(";", ",").split(",")
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def product_tags(product: dict) -> set[str]:
+    return {t.lower() for t in _as_list(product.get("tags"))}
+
+
+class Route:
+    def __init__(self, raw: dict, index: int):
+        self.name = str(raw.get("name") or f"route-{index + 1}")
+        self.skus = set(_as_list(raw.get("skus") or raw.get("sku")))
+        self.tags = {t.lower() for t in _as_list(raw.get("tags") or raw.get("tag"))}
+        self.stores = set(_as_list(raw.get("stores") or raw.get("store")))
+        self.webhooks = _as_list(raw.get("discord") or raw.get("webhooks"))
+        self.emails = _as_list(raw.get("email") or raw.get("emails"))
+        self.open_box = bool(raw.get("open_box", True))
+
+    def matches(self, product: dict, store_name: str, store_id: str, open_box: bool) -> bool:
+        if open_box and not self.open_box:
+            return False
+        if self.stores and store_id not in self.stores and store_name not in self.stores:
+            return False
+        sku = str(product.get("sku", ""))
+        return "*" in self.skus or sku in self.skus or bool(self.tags & product_tags(product))
+
+
+class Destination:
+    """
+    One webhook or email recipient with its own queue and worker thread.
+    webhook / to_addr None means the global default from config.env.
+    """
+
+    def __init__(self, kind: str, label: str, target: str | None, bucket: TokenBucket | None = None):
+        self.kind = kind
+        self.label = label
+        self.target = target
+        self.bucket = bucket
+
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+        self.sent = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.kind}:{self.label}"
+
+    def submit(self, job, created: float | None = None) -> None:
+        """
+        job(destination) runs on this destination's worker thread and returns
+        True (delivered), False (failed) or None (not counted).
+        created: epoch seconds the alert was first queued (outbox rows), default now.
+        """
+        queued_at = time.monotonic() - (time.time() - created if created else 0.0)
+        self._queue.put((queued_at, job))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"alert-{self.name}", daemon=True)
+                self._thread.start()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        while True:
+            queued_at, job = self._queue.get()
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                ok = job(self)
+            except Exception as e:
+                print(f"[alert_router] {self.name} failed: {e}")
+                ok = False
+
+            if ok is None:
+                # Housekeeping (deletes), not an alert delivery
+                continue
+
+            latency = time.monotonic() - queued_at
+            with self._lock:
+                if ok:
+                    self.sent += 1
+                    self.latency_total += latency
+                    self.latency_max = max(self.latency_max, latency)
+                else:
+                    self.failed += 1
+
+    def take_stats(self) -> tuple[int, int, float, float]:
+        with self._lock:
+            stats = (self.sent, self.failed, self.latency_total, self.latency_max)
+            self.sent = self.failed = 0
+            self.latency_total = self.latency_max = 0.0
+        return stats
+
+
+class AlertRouter:
+    def __init__(
+        self,
+        routes_path: str = "",
+        webhook_rate: float = 2.5,
+        webhook_burst: int = 5,
+        outbox: AlertOutbox | None = None,
+    ):
+        self.routes_path = (routes_path or "").strip()
+        self.webhook_rate = webhook_rate
+        self.webhook_burst = webhook_burst
+        self.outbox = outbox
+
+        self.routes: list[Route] = []
+        self.default_mode = "all"
+        self._sig = None
+        self._destinations: dict[tuple[str, str | None], Destination] = {}
+        self._lock = threading.Lock()
+        self._inflight: set[str] = set()
+        self._wake = threading.Event()
+
+        self.refresh()
+
+        if outbox is not None:
+            # Also replays whatever a previous run left undelivered
+            threading.Thread(target=self._dispatch_loop, name="alert-outbox", daemon=True).start()
+
+    def refresh(self) -> None:
+        if not self.routes_path:
+            return
+        try:
+            st = os.stat(self.routes_path)
+            sig = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            sig = None
+        if sig == self._sig:
+            return
+        self._sig = sig
+
+        if sig is None:
+            print(f"[alert_router] {self.routes_path} not found, using the default destination only")
+            self.routes, self.default_mode = [], "all"
+            return
+
+        try:
+            data = load_structured(self.routes_path)
+            raw_routes = data.get("routes", []) if isinstance(data, dict) else data
+            mode = str(data.get("default", "all")).strip().lower() if isinstance(data, dict) else "all"
+            routes = [Route(r, i) for i, r in enumerate(raw_routes or []) if isinstance(r, dict)]
+        except Exception as e:
+            print(f"[alert_router] could not load {self.routes_path}, keeping previous routes (non fatal): {e}")
+            return
+
+        self.routes = routes
+        self.default_mode = mode if mode in {"all", "unrouted", "none"} else "all"
+        print(f"[alert_router] loaded {len(routes)} route(s), default destination gets: {self.default_mode}")
+
+    def _destination(self, kind: str, label: str, target: str | None) -> Destination:
+        key = (kind, target)
+        with self._lock:
+            dest = self._destinations.get(key)
+            if dest is None:
+                bucket = TokenBucket(self.webhook_rate, self.webhook_burst) if kind == "discord" else None
+                dest = Destination(kind, label, target, bucket)
+                self._destinations[key] = dest
+            return dest
+
+    def destinations_for(
+        self, product: dict, store_name: str, store_id: str, open_box: bool, discord: bool, email: bool
+    ) -> list[Destination]:
+        self.refresh()
+
+        matched = [r for r in self.routes if r.matches(product, store_name, str(store_id), open_box)]
+        out: dict[tuple[str, str | None], Destination] = {}
+
+        use_default = self.default_mode == "all" or (self.default_mode == "unrouted" and not matched)
+        if use_default:
+            # An unconfigured default would only pile up undeliverable outbox rows
+            if discord and discord_alert.webhook_configured():
+                out[("discord", None)] = self._destination("discord", DEFAULT_LABEL, None)
+            if email and email_alert.email_configured():
+                out[("email", None)] = self._destination("email", DEFAULT_LABEL, None)
+
+        for route in matched:
+            if discord:
+                for webhook in route.webhooks:
+                    out.setdefault(("discord", webhook), self._destination("discord", route.name, webhook))
+            if email:
+                for addr in route.emails:
+                    out.setdefault(("email", addr), self._destination("email", addr, addr))
+
+        return list(out.values())
+
+    def notify(
+        self,
+        product: dict,
+        store_name: str,
+        store_id: str,
+        qty: int | None = None,
+        open_box: bool = False,
+        discord: bool = True,
+        email: bool = True,
+    ) -> int:
+        """
+        Queues the alert on every matching destination and returns immediately.
+        Returns the number of destinations it was newly queued on.
+        """
+        dests = self.destinations_for(product, store_name, store_id, open_box, discord, email and not open_box)
+        action = "open_box" if open_box else "new"
+        payload = {"product": product, "store_name": store_name, "store_id": str(store_id), "qty": qty}
+
+        if self.outbox is None:
+            for dest in dests:
+                dest.submit(functools.partial(_send, action=action, payload=payload))
+            return len(dests)
+
+        subject = f"{'ob_' if open_box else ''}{product.get('sku', 'unknown')}_{store_id}"
+        added = self.outbox.enqueue_alert(subject, action, payload, [(d.kind, d.label, d.target) for d in dests])
+        if added is None:
+            print(f"[alert_router] alert for {subject} is already in the outbox, not queueing it again")
+            return 0
+        self._wake.set()
+        return added
+
+    def sold_out(self, tracker_sku: str, store_id: str, delete: bool) -> None:
+        """
+        Called when tracker_sku ("ob_"-prefixed for open box) sells out at store_id.
+        With delete=True the alert message is deleted on every webhook it went to,
+        after any post still queued for it.
+        """
+        payload = {"tracker_sku": tracker_sku, "store_id": str(store_id)}
+
+        if self.outbox is not None:
+            default_configured = discord_alert.webhook_configured()
+            if self.outbox.enqueue_sellout(f"{tracker_sku}_{store_id}", payload, delete, default_configured):
+                self._wake.set()
+            return
+
+        if not delete:
+            return
+        with self._lock:
+            dests = [d for d in self._destinations.values() if d.kind == "discord"]
+        if discord_alert.webhook_configured() and not any(d.target is None for d in dests):
+            dests.append(self._destination("discord", DEFAULT_LABEL, None))
+
+        for dest in dests:
+            dest.submit(functools.partial(_send, action="delete", payload=payload))
+
+    def _dispatch_loop(self) -> None:
+        last_housekeeping = 0.0
+        while True:
+            self._wake.wait(OUTBOX_POLL_SECONDS)
+            self._wake.clear()
+            try:
+                if time.monotonic() - last_housekeeping >= OUTBOX_HOUSEKEEPING_SECONDS:
+                    last_housekeeping = time.monotonic()
+                    self.outbox.housekeeping()
+
+                with self._lock:
+                    inflight = set(self._inflight)
+                for row in self.outbox.due(exclude=inflight):
+                    dest = self._destination(row.dest_kind, row.dest_label, row.dest_target)
+                    with self._lock:
+                        self._inflight.add(row.id)
+                    # Latency counts from when the alert was queued, across retries and restarts
+                    dest.submit(functools.partial(self._deliver_row, row), created=row.created)
+            except Exception as e:
+                print(f"[alert_router] outbox dispatch failed (non fatal): {e}")
+
+    def _deliver_row(self, row: OutboxRow, dest: Destination) -> bool | None:
+        ok, error = False, ""
+        try:
+            self.outbox.mark_attempt(row.id)
+            try:
+                ok = _send(dest, row.action, row.payload)
+            except Exception as e:
+                error = str(e)
+
+            if ok or row.action == "delete":
+                # Deletes are best effort; a missing message is not worth retrying
+                self.outbox.mark_delivered(row.id)
+            else:
+                self.outbox.mark_failed(row.id, row.attempts + 1, error or "delivery failed")
+        finally:
+            with self._lock:
+                self._inflight.discard(row.id)
+        return ok
+
+    def metrics(self) -> dict | None:
+        return self.outbox.metrics() if self.outbox else None
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(d.pending() for d in self._destinations.values())
+
+    def summary(self) -> str | None:
+        with self._lock:
+            dests = list(self._destinations.values())
+
+        parts = []
+        for dest in sorted(dests, key=lambda d: d.name):
+            sent, failed, total, worst = dest.take_stats()
+            if not sent and not failed:
+                continue
+            part = f"{dest.name} {sent} sent"
+            if sent:
+                part += f" avg {total / sent:.2f}s max {worst:.2f}s"
+            if failed:
+                part += f", {failed} failed"
+            parts.append(part)
+
+        if not parts:
+            return None
+        return "Alert delivery: " + "; ".join(parts)
+
+
+def _send(dest: Destination, action: str, payload: dict) -> bool | None:
+    """
+    Delivers one alert (new / open_box) or sell-out delete to dest.
+    Returns whether an alert was delivered; None for deletes.
+    """
+    if action == "delete":
+        tracker_sku, store_id = payload["tracker_sku"], payload["store_id"]
+        mid = discord_alert_tracker.get_message_id(sku=tracker_sku, store_id=store_id, webhook=dest.target)
+        if mid:
+            discord_alert.delete_discord_message(str(mid), webhook=dest.target)
+            discord_alert_tracker.clear_message_id(sku=tracker_sku, store_id=store_id, webhook=dest.target)
+        return None
+
+    product, store_name, store_id, qty = payload["product"], payload["store_name"], payload["store_id"], payload["qty"]
+    if dest.kind == "email":
+        return email_alert.send_email_alert(product, store_name, store_id, qty=qty, to_addr=dest.target)
+
+    # Delivered on a worker thread, possibly cycles later: use the settings current now
+    settings = get_settings()
+    if action == "open_box":
+        return discord_alert.send_open_box_alert(
+            product, store_name, store_id, open_box_qty=qty, webhook=dest.target, settings=settings
+        )
+    return discord_alert.send_discord_alert(product, store_name, store_id, qty=qty, webhook=dest.target, settings=settings)
+
+
+_ROUTER: AlertRouter | None = None
+_ROUTER_LOCK = threading.Lock()
+
+
+def get_router() -> AlertRouter:
+    """
+    Process-wide router built from env on first use (after config.env is loaded).
+    ALERT_OUTBOX_PATH empty keeps alerts in memory only.
+    """
+    global _ROUTER
+    with _ROUTER_LOCK:
+        if _ROUTER is None:
+            outbox = None
+            outbox_path = (os.getenv("ALERT_OUTBOX_PATH", "alert_outbox.db") or "").strip()
+            if outbox_path:
+                outbox = AlertOutbox(
+                    outbox_path,
+                    retry_base_seconds=env_float("ALERT_RETRY_BASE_SECONDS", 10.0),
+                    retry_max_seconds=env_float("ALERT_RETRY_MAX_SECONDS", 600.0),
+                    max_age_seconds=env_float("ALERT_OUTBOX_MAX_AGE_HOURS", 24.0) * 3600.0,
+                )
+            _ROUTER = AlertRouter(
+                routes_path=os.getenv("ALERT_ROUTES_FILE", ""),
+                webhook_rate=env_float("DISCORD_WEBHOOK_RATE", 2.5),
+                webhook_burst=env_int("DISCORD_WEBHOOK_BURST", 5),
+                outbox=outbox,
+            )
+        return _ROUTER
@@ -0,0 +1,76 @@
+# bench_backends.py
+#
+# Compares the Selenium and CDP browser backends on real product pages:
+# - Startup time
+# - Per-check wall time (check_stock end to end)
+# - RSS of the whole browser process tree (chromedriver + Chrome)
+#
+# Usage:
+#   python bench_backends.py [checks_per_backend] > bench_output.txt
+
+import dataclasses
+import os
+import statistics
+import sys
+import time
+
+from catalog import Catalog
+from config import Settings, load_settings
+from procutil import tree_pids, tree_rss_bytes
+from stock_checker import browser_pid, build_browser, check_stock
+
+
+def _bench(settings: Settings, backend: str, products: list[dict], store_id: str, checks: int) -> dict:
+    settings = dataclasses.replace(settings, browser_backend=backend)
+
+    t0 = time.perf_counter()
+    driver = build_browser(settings)
+    startup = time.perf_counter() - t0
+
+    timings = []
+    rss_samples = []
+    try:
+        for i in range(checks):
+            product = products[i % len(products)]
+            t = time.perf_counter()
+            check_stock(driver, product, store_id, settings=settings)
+            timings.append(time.perf_counter() - t)
+
+            pid = browser_pid(driver)
+            rss_samples.append(tree_rss_bytes(pid))
+        procs = len(tree_pids(browser_pid(driver)))
+    finally:
+        driver.quit()
+
+    return {
+        "backend": backend,
+        "startup_s": startup,
+        "check_mean_s": statistics.mean(timings),
+        "check_p50_s": statistics.median(timings),
+        "check_max_s": max(timings),
+        "rss_peak_mb": max(rss_samples) / (1024 * 1024) if rss_samples else 0.0,
+        "processes": procs,
+    }
+
+
+def main() -> None:
+    settings = load_settings()
+
+    checks = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    catalog = Catalog(os.getenv("PRODUCTS_FILE", ""), os.getenv("STORES_FILE", ""))
+    store_id = next(iter(catalog.stores.values()))
+
+    rows = [_bench(settings, b, catalog.products, store_id, checks) for b in ("selenium", "cdp")]
+
+    print(f"{checks} checks per backend, store {store_id}")
+    print(f"{'backend':<10}{'startup':>10}{'mean':>10}{'p50':>10}{'max':>10}{'rss MB':>10}{'procs':>7}")
+    for r in rows:
+        print(
+            f"{r['backend']:<10}{r['startup_s']:>10.2f}{r['check_mean_s']:>10.2f}"
+            f"{r['check_p50_s']:>10.2f}{r['check_max_s']:>10.2f}{r['rss_peak_mb']:>10.1f}{r['processes']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# bench_parse.py
+#
+# Compares inline and pooled page parsing (PARSE_MODE) on saved product pages:
+# - Several threads feed pages at once, like browser workers do in a cycle
+# - Reports pages/second for each mode and checks both modes return the same results
+#
+# Usage:
+#   python bench_parse.py page1.html [page2.html ...] [--pages N] [--threads T] [--workers W]
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from page_parser import PageParser, parse_stock
+
+
+def _run(parser: PageParser, pages: list[str], total: int, threads: int) -> tuple[float, list]:
+    work = [pages[i % len(pages)] for i in range(total)]
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        results = list(ex.map(parser.parse, work))
+    return time.perf_counter() - t0, results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("html", nargs="+")
+    ap.add_argument("--pages", type=int, default=200)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=0)
+    args = ap.parse_args()
+
+    pages = []
+    for path in args.html:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            pages.append(f.read())
+
+    expected = [parse_stock(p) for p in pages]
+    print(f"{len(pages)} page(s), avg {sum(map(len, pages)) / len(pages) / 1024:.0f}K chars, results {expected}")
+
+    for mode in ("inline", "pool"):
+        parser = PageParser(mode=mode, workers=args.workers)
+        try:
+            if mode == "pool":
+                # Start the worker processes outside the timed run
+                _run(parser, pages, parser.workers, parser.workers)
+
+            took, results = _run(parser, pages, args.pages, args.threads)
+        finally:
+            parser.close()
+
+        same = all(r == expected[i % len(pages)] for i, r in enumerate(results))
+        label = f"pool x{parser.workers}" if mode == "pool" else "inline"
+        print(
+            f"{label:>10}: {args.pages / took:8.1f} pages/s "
+            f"({1000.0 * took / args.pages:.2f} ms/page, {args.threads} threads), identical={same}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# catalog.py
+#
+# External product/store catalog:
+# - Loads products and stores from JSON, TOML or CSV files
+# - Indexes products by SKU and stores by store id
+# - Reloads when a file changes and reports only the keys that were added or removed
+#
+# Falls back to products.PRODUCTS / stores.STORES when no file is configured.
+
+from __future__ import annotations
+
+import csv
+import json
+import os
+
+try:
+    import tomllib
+except ImportError:  # Python 3.10
+    tomllib = None
+
+from products import PRODUCTS
+from stores import STORES
+
+
+_PRODUCT_BASE_COLUMNS = {"name", "sku", "url", "tags"}
+
+
+def _file_sig(path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_structured(path: str):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if ext == ".toml":
+        if tomllib is None:
+            raise RuntimeError("TOML catalogs need Python 3.11+ (tomllib)")
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    raise ValueError(f"Unsupported catalog format: {path}")
+
+
+def _read_csv_rows(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _product_from_csv_row(row: dict) -> dict:
+    """
+    CSV columns: name, sku, url and optional tags (separated by ";"). Every other
+    non-empty column becomes a spec, so a header like name,sku,url,CPU,GPU keeps
+    the same shape as products.py.
+    """
+    product = {
+        "name": (row.get("name") or "").strip(),
+        "sku": (row.get("sku") or "").strip(),
+        "url": (row.get("url") or "").strip(),
+    }
+    tags = [t.strip() for t in (row.get("tags") or "").split(";") if t.strip()]
+    if tags:
+        product["tags"] = tags
+    specs = {}
+    for k, v in row.items():
+        if k is None or k in _PRODUCT_BASE_COLUMNS:
+            continue
+        v = (v or "").strip()
+        if v:
+            specs[k.strip()] = v
+    if specs:
+        product["specs"] = specs
+    return product
+
+
+def load_products(path: str) -> list[dict]:
+    if path.lower().endswith(".csv"):
+        raw = [_product_from_csv_row(r) for r in _read_csv_rows(path)]
+    else:
+        data = load_structured(path)
+        raw = data.get("products", []) if isinstance(data, dict) else data
+
+    if not isinstance(raw, list):
+        raise ValueError(f"{path}: expected a list of products")
+
+    products = []
+    for p in raw:
+        if not isinstance(p, dict):
+            continue
+        sku = str(p.get("sku", "")).strip()
+        if not sku:
+            continue
+        p = dict(p)
+        p["sku"] = sku
+        products.append(p)
+    return products
+
+
+def load_stores(path: str) -> dict[str, str]:
+    """
+    Returns {store_name: store_id}, same shape as stores.STORES.
+    JSON/TOML: a mapping (optionally under a "stores" key) or a list of {name, id}.
+    CSV columns: name, store_id (or id).
+    """
+    if path.lower().endswith(".csv"):
+        raw = [
+            {"name": r.get("name"), "id": r.get("store_id") or r.get("id")}
+            for r in _read_csv_rows(path)
+        ]
+    else:
+        data = load_structured(path)
+        raw = data.get("stores", data) if isinstance(data, dict) else data
+
+    if isinstance(raw, dict):
+        raw = [{"name": k, "id": v} for k, v in raw.items()]
+
+    stores = {}
+    for s in raw or []:
+        if not isinstance(s, dict):
+            continue
+        name = str(s.get("name") or "").strip()
+        store_id = str(s.get("id") or s.get("store_id") or "").strip()
+        if name and store_id:
+            stores[name] = store_id
+    return stores
+
+
+class CatalogChange:
+    def __init__(self, added_keys: set, removed_keys: set, updated_skus: set):
+        self.added_keys = added_keys
+        self.removed_keys = removed_keys
+        self.updated_skus = updated_skus
+
+    def __bool__(self) -> bool:
+        return bool(self.added_keys or self.removed_keys or self.updated_skus)
+
+    def summary(self) -> str:
+        return (
+            f"+{len(self.added_keys)} keys, -{len(self.removed_keys)} keys, "
+            f"{len(self.updated_skus)} products updated"
+        )
+
+
+class Catalog:
+    """
+    Holds the current products and stores plus lookup indexes.
+    Keys are (sku, store_id) tuples, matching the f"{sku}_{store_id}" state keys.
+    """
+
+    def __init__(self, products_path: str = "", stores_path: str = ""):
+        self.products_path = (products_path or "").strip()
+        self.stores_path = (stores_path or "").strip()
+
+        self.products: list[dict] = []
+        self.stores: dict[str, str] = {}
+        self.products_by_sku: dict[str, dict] = {}
+        self.stores_by_id: dict[str, str] = {}
+
+        self._products_sig = None
+        self._stores_sig = None
+
+        self._set(self._read_products(), self._read_stores())
+        self._products_sig = self._sig(self.products_path)
+        self._stores_sig = self._sig(self.stores_path)
+
+    def _sig(self, path: str):
+        return _file_sig(path) if path else None
+
+    def _read_products(self) -> list[dict]:
+        if self.products_path:
+            return load_products(self.products_path)
+        return [dict(p, sku=str(p.get("sku", "")).strip()) for p in PRODUCTS]
+
+    def _read_stores(self) -> dict[str, str]:
+        if self.stores_path:
+            return load_stores(self.stores_path)
+        return {str(k): str(v) for k, v in STORES.items()}
+
+    def _set(self, products: list[dict], stores: dict[str, str]) -> None:
+        by_sku = {}
+        for p in products:
+            if p["sku"] in by_sku:
+                print(f"[catalog] duplicate SKU {p['sku']}, keeping the last entry")
+            by_sku[p["sku"]] = p
+
+        self.products = list(by_sku.values())
+        self.products_by_sku = by_sku
+        self.stores = stores
+        self.stores_by_id = {store_id: name for name, store_id in stores.items()}
+
+    def keys(self) -> set[tuple[str, str]]:
+        return {(sku, store_id) for sku in self.products_by_sku for store_id in self.stores_by_id}
+
+    def product(self, sku: str) -> dict | None:
+        return self.products_by_sku.get(sku)
+
+    def store_name(self, store_id: str) -> str | None:
+        return self.stores_by_id.get(store_id)
+
+    def refresh(self) -> CatalogChange | None:
+        """
+        Re-reads any catalog file whose mtime/size changed.
+        Returns None when nothing changed or the new file could not be parsed
+        (the previous catalog stays active in that case).
+        """
+        p_sig = self._sig(self.products_path)
+        s_sig = self._sig(self.stores_path)
+        if p_sig == self._products_sig and s_sig == self._stores_sig:
+            return None
+
+        try:
+            products = self._read_products() if p_sig != self._products_sig else self.products
+            stores = self._read_stores() if s_sig != self._stores_sig else self.stores
+        except Exception as e:
+            print(f"[catalog] reload failed, keeping previous catalog: {e}")
+            return None
+
+        self._products_sig = p_sig
+        self._stores_sig = s_sig
+
+        old_keys = self.keys()
+        old_by_sku = self.products_by_sku
+
+        self._set(products, stores)
+
+        new_keys = self.keys()
+        updated = {
+            sku for sku, p in self.products_by_sku.items()
+            if sku in old_by_sku and old_by_sku[sku] != p
+        }
+
+        change = CatalogChange(new_keys - old_keys, old_keys - new_keys, updated)
+        return change if change else None
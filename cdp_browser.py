@@ -0,0 +1,321 @@
+# cdp_browser.py
+#
+# Drives headless Chrome directly over the DevTools Protocol (CDP):
+# - No chromedriver process, no WebDriver HTTP hop
+# - Page readiness from Page.lifecycleEvent instead of fixed sleeps
+# - Cookies via Network.setCookie, extraction via Runtime.evaluate
+#
+# CdpPage exposes the small subset of the Selenium driver API that
+# stock_checker uses (get, add_cookie, page_source, quit).
+
+from __future__ import annotations
+
+import collections
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import requests
+import websocket
+
+from chrome_profiles import get_profile_pool, launch_with_profile
+
+
+CHROME_BINARY = "/usr/bin/google-chrome"
+
+CHROME_ARGS = [
+    "--headless=new",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--window-size=1920,1080",
+    "--no-first-run",
+    "--no-default-browser-check",
+]
+
+
+class CdpError(RuntimeError):
+    pass
+
+
+class CdpSession:
+    """
+    One websocket connection to a CDP endpoint (browser or page target).
+    Not thread safe: each session is driven by a single thread.
+    """
+
+    def __init__(self, ws_url: str, timeout: float = 30.0):
+        self._ws = websocket.create_connection(ws_url, timeout=timeout, suppress_origin=True)
+        self._next_id = 0
+        self._events = collections.deque(maxlen=2000)
+
+    def _recv(self, deadline: float) -> dict:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("CDP receive timed out")
+
+        self._ws.settimeout(remaining)
+        try:
+            raw = self._ws.recv()
+        except websocket.WebSocketTimeoutException:
+            raise TimeoutError("CDP receive timed out")
+
+        return json.loads(raw)
+
+    def call(self, method: str, params: dict | None = None, timeout: float = 30.0) -> dict:
+        self._next_id += 1
+        msg_id = self._next_id
+        self._ws.send(json.dumps({"id": msg_id, "method": method, "params": params or {}}))
+
+        deadline = time.monotonic() + timeout
+        while True:
+            msg = self._recv(deadline)
+            if msg.get("id") == msg_id:
+                if "error" in msg:
+                    raise CdpError(f"{method}: {msg['error'].get('message', msg['error'])}")
+                return msg.get("result", {})
+            if "method" in msg:
+                self._events.append(msg)
+
+    def wait_event(self, method: str, predicate=None, timeout: float = 30.0) -> dict:
+        for i, ev in enumerate(self._events):
+            if ev.get("method") == method and (predicate is None or predicate(ev.get("params", {}))):
+                del self._events[i]
+                return ev["params"]
+
+        deadline = time.monotonic() + timeout
+        while True:
+            msg = self._recv(deadline)
+            if msg.get("method") == method and (predicate is None or predicate(msg.get("params", {}))):
+                return msg.get("params", {})
+            if "method" in msg:
+                self._events.append(msg)
+
+    def clear_events(self) -> None:
+        self._events.clear()
+
+    def close(self) -> None:
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+
+
+class CdpBrowser:
+    """
+    Launches one headless Chrome with a debugging port and owns its lifetime.
+    The browser-level session is shared by every page, so calls on it are serialized.
+    """
+
+    def __init__(
+        self,
+        binary: str = CHROME_BINARY,
+        extra_args: list[str] | None = None,
+        startup_timeout: float = 20.0,
+        profile=None,
+    ):
+        """
+        profile: a chrome_profiles.ChromeProfile to run on (kept after quit and
+        released); without one a throwaway temp profile is used.
+        """
+        self._lock = threading.Lock()
+        self._profile = profile
+        self._profile_dir = profile.path if profile is not None else tempfile.mkdtemp(prefix="cdp-profile-")
+
+        args = [binary, *CHROME_ARGS, *(extra_args or [])]
+        args += ["--remote-debugging-port=0", f"--user-data-dir={self._profile_dir}", "about:blank"]
+
+        self.process = subprocess.Popen(
+            args,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        self.pid = self.process.pid
+
+        try:
+            self.port = self._wait_for_port(startup_timeout)
+            info = requests.get(f"http://127.0.0.1:{self.port}/json/version", timeout=10).json()
+            self.session = CdpSession(info["webSocketDebuggerUrl"])
+        except Exception:
+            # A managed profile stays checked out so the caller can wipe it and retry
+            self._stop()
+            if self._profile is None:
+                shutil.rmtree(self._profile_dir, ignore_errors=True)
+            raise
+
+    def _wait_for_port(self, timeout: float) -> int:
+        port_file = os.path.join(self._profile_dir, "DevToolsActivePort")
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CdpError(f"Chrome exited during startup (code {self.process.returncode})")
+            try:
+                with open(port_file, "r", encoding="utf-8") as f:
+                    first = f.readline().strip()
+                if first:
+                    return int(first)
+            except (OSError, ValueError):
+                pass
+            time.sleep(0.05)
+
+        raise CdpError("Chrome did not open a DevTools port in time")
+
+    def _call(self, method: str, params: dict | None = None, timeout: float = 30.0) -> dict:
+        with self._lock:
+            return self.session.call(method, params, timeout=timeout)
+
+    def new_page(self, owns_browser: bool = False) -> "CdpPage":
+        target_id = self._call("Target.createTarget", {"url": "about:blank"})["targetId"]
+        return CdpPage(self, target_id, owns_browser=owns_browser)
+
+    def new_context_page(self) -> "CdpPage":
+        """
+        Opens a tab inside a fresh isolated browser context (own cookie jar,
+        cache partition and storage). The context is disposed when the page closes.
+        """
+        context_id = self._call("Target.createBrowserContext", {"disposeOnDetach": True})["browserContextId"]
+        try:
+            target_id = self._call(
+                "Target.createTarget", {"url": "about:blank", "browserContextId": context_id}
+            )["targetId"]
+            return CdpPage(self, target_id, browser_context_id=context_id)
+        except Exception:
+            self.dispose_context(context_id)
+            raise
+
+    def dispose_context(self, browser_context_id: str) -> None:
+        try:
+            self._call("Target.disposeBrowserContext", {"browserContextId": browser_context_id}, timeout=5)
+        except Exception:
+            pass
+
+    def close_target(self, target_id: str) -> None:
+        try:
+            self._call("Target.closeTarget", {"targetId": target_id}, timeout=5)
+        except Exception:
+            pass
+
+    def _stop(self) -> None:
+        session = getattr(self, "session", None)
+        if session is not None:
+            session.close()
+
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait(timeout=5)
+
+    def quit(self) -> None:
+        self._stop()
+        if self._profile is not None:
+            self._profile.release()
+        else:
+            shutil.rmtree(self._profile_dir, ignore_errors=True)
+
+
+class CdpPage:
+    """
+    One tab. Drop-in for the parts of webdriver.Chrome used by stock_checker.
+    """
+
+    def __init__(
+        self,
+        browser: CdpBrowser,
+        target_id: str,
+        owns_browser: bool = False,
+        browser_context_id: str | None = None,
+    ):
+        self.browser = browser
+        self.target_id = target_id
+        self.owns_browser = owns_browser
+        self.browser_context_id = browser_context_id
+
+        self.session = CdpSession(f"ws://127.0.0.1:{browser.port}/devtools/page/{target_id}")
+        self.session.call("Page.enable")
+        self.session.call("Page.setLifecycleEventsEnabled", {"enabled": True})
+        self.session.call("Runtime.enable")
+
+    def get(self, url: str, wait_for: str | None = "load", timeout: float = 60.0) -> None:
+        """
+        Navigates and waits for the lifecycle event `wait_for`
+        ("load", "DOMContentLoaded", "networkIdle", ...).
+        wait_for=None returns as soon as the navigation is committed.
+        """
+        self.session.clear_events()
+        result = self.session.call("Page.navigate", {"url": url}, timeout=timeout)
+
+        if result.get("errorText"):
+            raise CdpError(f"navigation to {url} failed: {result['errorText']}")
+
+        if wait_for is None:
+            return
+
+        loader_id = result.get("loaderId")
+        self.session.wait_event(
+            "Page.lifecycleEvent",
+            lambda p: p.get("name") == wait_for and (not loader_id or p.get("loaderId") == loader_id),
+            timeout=timeout,
+        )
+
+    def add_cookie(self, cookie: dict) -> None:
+        params = {
+            "name": cookie["name"],
+            "value": str(cookie["value"]),
+            "domain": cookie.get("domain", ""),
+            "path": cookie.get("path", "/"),
+            "secure": bool(cookie.get("secure", False)),
+            "httpOnly": bool(cookie.get("httpOnly", False)),
+        }
+        ok = self.session.call("Network.setCookie", params).get("success", True)
+        if not ok:
+            raise CdpError(f"Network.setCookie rejected cookie {cookie['name']!r}")
+
+    def evaluate(self, expression: str, timeout: float = 30.0):
+        result = self.session.call(
+            "Runtime.evaluate",
+            {"expression": expression, "returnByValue": True},
+            timeout=timeout,
+        )
+        if "exceptionDetails" in result:
+            raise CdpError(f"Runtime.evaluate failed: {result['exceptionDetails'].get('text', 'exception')}")
+        return result.get("result", {}).get("value")
+
+    def stop_loading(self) -> None:
+        self.session.call("Page.stopLoading", timeout=5)
+
+    @property
+    def page_source(self) -> str:
+        return self.evaluate("document.documentElement ? document.documentElement.outerHTML : ''") or ""
+
+    def close(self) -> None:
+        self.session.close()
+        self.browser.close_target(self.target_id)
+        if self.browser_context_id:
+            self.browser.dispose_context(self.browser_context_id)
+
+    def quit(self) -> None:
+        self.close()
+        if self.owns_browser:
+            self.browser.quit()
+
+
+def build_cdp_page() -> CdpPage:
+    pool = get_profile_pool()
+    if pool is None:
+        browser = CdpBrowser()
+    else:
+        browser = launch_with_profile(pool, lambda profile: CdpBrowser(extra_args=pool.cache_args(), profile=profile))
+    try:
+        return browser.new_page(owns_browser=True)
+    except Exception:
+        browser.quit()
+        raise
@@ -0,0 +1,745 @@
+# check_runner.py
+#
+# Runs one cycle of (product, store) checks and yields results as they finish.
+# - Default: one browser, checks run in order
+# - STORE_CONTEXTS=1 with BROWSER_BACKEND=cdp: one Chrome process with an isolated
+#   browser context per store (own cookie jar and tab), stores checked concurrently
+# - Every check has a hard deadline (CHECK_DEADLINE_SECONDS). A check that overruns
+#   gets its browser process tree force-killed, a replacement browser is spawned and
+#   the key is retried once at the end of that slot's queue. Worst case a cycle takes
+#   about 2 x deadline per check (plus browser restarts), divided by the number of slots.
+# - With a HedgePolicy, a check running past the learned p95 is issued again on a spare
+#   browser; the first to finish wins and the other browser/tab is cancelled
+# - With RESULT_CACHE_PATH set, checks go through the shared result cache so bot
+#   copies on one host do not load the same (sku, store) page twice
+# - With a MemoryGuard, each browser's process tree RSS is sampled between checks and
+#   the browser is recycled before it crosses its budget (with store contexts the
+#   shared Chrome is restarted with all its tabs); new browsers wait while the host
+#   is short on memory
+# - recheck() queues a priority re-check of a key at the front of its slot's queue
+#   while the cycle is running (used for alert confirmation)
+
+from __future__ import annotations
+
+import collections
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+from cdp_browser import CdpBrowser, CdpPage
+from circuit_breaker import CircuitBreaker, sku_key, store_key
+from config import Settings, get_settings
+from heartbeat import beat, keep_beating
+from hedging import HedgePolicy
+from memory_guard import MemoryGuard
+from profiler import get_profiler
+from result_cache import get_result_cache
+from procutil import kill_tree
+from stock_checker import browser_pid, build_browser, check_stock
+
+
+DEADLINE_POLL_SECONDS = 0.5
+
+# Longest browser start the heartbeat is kept alive for (supervisor stale check)
+BROWSER_START_BEAT_SECONDS = 120.0
+
+# Stands in for the hedge driver while the hedge thread is still starting its browser
+_BUILDING = object()
+
+# Tri-state check outcome. UNKNOWN means the page could not be read; callers keep
+# the previous state for the key instead of treating it as a sellout.
+IN_STOCK = "in"
+OUT_OF_STOCK = "out"
+UNKNOWN = "unknown"
+
+
+@dataclass
+class CheckResult:
+    product: dict
+    store_name: str
+    store_id: str
+    new_in_stock: bool = False
+    new_qty: int | None = None
+    open_box_available: bool = False
+    open_box_qty: int | None = None
+    error: str | None = None
+    skipped: bool = False
+    elapsed: float = 0.0
+
+    attempts: int = 1
+    recheck: bool = False
+    cached: bool = False
+
+    @property
+    def status(self) -> str:
+        if self.error or self.skipped:
+            return UNKNOWN
+        return IN_STOCK if self.new_in_stock else OUT_OF_STOCK
+
+    @property
+    def sku(self) -> str:
+        return str(self.product.get("sku", "")).strip()
+
+    @property
+    def key(self) -> str:
+        return f"{self.sku}_{self.store_id}"
+
+    @property
+    def ob_key(self) -> str:
+        return f"ob_{self.sku}_{self.store_id}"
+
+
+@dataclass
+class _Task:
+    product: dict
+    store_name: str
+    store_id: str
+    deadline_hits: int = 0
+    retries: int = 0
+    recheck: bool = False
+    # Times a worker took the task (hedges not counted)
+    attempts: int = 0
+
+    def result(self, **kwargs) -> CheckResult:
+        return CheckResult(
+            product=self.product,
+            store_name=self.store_name,
+            store_id=self.store_id,
+            attempts=max(1, self.attempts),
+            recheck=self.recheck,
+            **kwargs,
+        )
+
+
+class _Slot:
+    """
+    One driver-like object plus its task queue. generation is bumped whenever the
+    supervisor abandons the slot's worker thread (deadline hit), so a late result
+    from the old thread is thrown away.
+    """
+
+    def __init__(self, key, driver):
+        self.key = key
+        self.driver = driver
+        self.tasks: collections.deque[_Task] = collections.deque()
+        self.generation = 0
+        self.current: _Task | None = None
+        self.started = 0.0
+        # Set while the current check waits for a rate limiter token; the deadline
+        # clock (started) is moved forward by the wait once the token is granted
+        self.throttled_since: float | None = None
+        self.running = False
+        self.hedged: _Task | None = None
+
+
+def use_store_contexts(settings: Settings | None = None) -> bool:
+    settings = settings or get_settings()
+    return settings.browser_backend == "cdp" and settings.store_contexts
+
+
+def check_retries(settings: Settings | None = None) -> int:
+    """
+    How many times a failed check is retried at the end of the cycle
+    before its key is reported UNKNOWN (stale).
+    """
+    return (settings or get_settings()).check_retries
+
+
+def check_deadline(settings: Settings | None = None) -> float:
+    """
+    CHECK_DEADLINE_SECONDS=0 disables the per-check deadline.
+    """
+    return (settings or get_settings()).check_deadline_seconds
+
+
+class CheckRunner:
+    """
+    Owns the browsers for one cycle. Call close() when the cycle is done.
+    """
+
+    def __init__(
+        self,
+        open_box_enabled: bool = True,
+        breaker: CircuitBreaker | None = None,
+        hedge: HedgePolicy | None = None,
+        memory: MemoryGuard | None = None,
+        settings: Settings | None = None,
+    ):
+        # One snapshot for the whole cycle (browser backend, timeouts, retries)
+        self.settings = settings or get_settings()
+        self.open_box_enabled = open_box_enabled
+        self.breaker = breaker
+        self.hedge = hedge
+        self.memory = memory
+        self.deadline_seconds = check_deadline(self.settings)
+        self.max_retries = check_retries(self.settings)
+        self.retried = 0
+        self.deadline_hits: collections.Counter[str] = collections.Counter()
+
+        self._browser = None
+        self._slots: dict = {}
+        self._lock = threading.Lock()
+        self._out: queue.Queue[CheckResult] = queue.Queue()
+        self._pending = 0
+
+        # One spare browser (or context tab) for hedged checks, built on first hedge
+        self._spare = None
+        self._hedge_driver = None
+        self._hedge_cancelled = False
+        self._closed = False
+
+        # (kind, root pid) of every browser sampled by the memory guard, forgotten on close
+        self._sampled: set[tuple[str, int | None]] = set()
+        # Shared Chrome over its memory budget, restarted by the supervising thread
+        self._over_budget = None
+
+    def _open_slots(self, stores: dict[str, str]) -> None:
+        """
+        Maps a slot key to a driver-like object. With store contexts every store
+        gets its own slot; otherwise all stores share slot None.
+        """
+        self._wait_for_memory()
+        with keep_beating("browser_start", BROWSER_START_BEAT_SECONDS):
+            if use_store_contexts(self.settings):
+                self._browser = CdpBrowser()
+                for store_id in stores.values():
+                    self._slots[store_id] = _Slot(store_id, self._browser.new_context_page())
+            else:
+                self._slots[None] = _Slot(None, build_browser(self.settings))
+
+    def _release_probe(self, task: _Task) -> None:
+        if self.breaker is not None:
+            self.breaker.release(store_key(task.store_id), sku_key(str(task.product.get("sku", "")).strip()))
+
+    def _forget_memory(self, kind: str, pid: int | None) -> None:
+        if self.memory is None:
+            return
+        self.memory.forget(kind, pid)
+        with self._lock:
+            self._sampled.discard((kind, pid))
+
+    def _wait_for_memory(self) -> None:
+        if self.memory is not None:
+            # Runs on the supervising thread too; a memory pause is not a hang
+            self.memory.wait_for_memory(on_wait=lambda: beat("memory_wait"))
+
+    def _throttled(self, slot: _Slot, task: _Task, waiting: bool, now: float) -> None:
+        with self._lock:
+            if slot.current is not task:
+                return
+            if waiting:
+                slot.throttled_since = now
+            elif slot.throttled_since is not None:
+                slot.started += now - slot.throttled_since
+                slot.throttled_since = None
+
+    def _check(self, driver, task: _Task, slot: _Slot | None = None) -> CheckResult:
+        """
+        Runs one check. Time spent waiting for rate limiter tokens is left out of
+        result.elapsed and, for slot's own worker, out of the deadline and hedge clock.
+        """
+        result = task.result()
+        t0 = time.monotonic()
+        throttled = 0.0
+        since = t0
+
+        def on_throttle(waiting: bool) -> None:
+            nonlocal throttled, since
+            now = time.monotonic()
+            if waiting:
+                since = now
+            else:
+                throttled += now - since
+            if slot is not None:
+                self._throttled(slot, task, waiting, now)
+
+        try:
+            def load():
+                return check_stock(
+                    driver,
+                    task.product,
+                    task.store_id,
+                    open_box_enabled=self.open_box_enabled,
+                    settings=self.settings,
+                    on_throttle=on_throttle,
+                )
+
+            cache = get_result_cache()
+            if cache is None:
+                values = load()
+            else:
+                # Confirmation re-checks must see a new page load, not the cached edge
+                values, result.cached = cache.fetch(
+                    str(task.product.get("sku", "")).strip(),
+                    str(task.store_id),
+                    self.open_box_enabled,
+                    load,
+                    fresh=task.recheck,
+                )
+
+            (
+                result.new_in_stock,
+                result.new_qty,
+                result.open_box_available,
+                result.open_box_qty,
+            ) = values
+        except Exception as e:
+            result.error = str(e) or type(e).__name__
+        result.elapsed = time.monotonic() - t0 - throttled
+        return result
+
+    def _work(self, slot: _Slot, generation: int) -> None:
+        while True:
+            with self._lock:
+                if slot.generation != generation:
+                    return
+                if not slot.tasks:
+                    slot.running = False
+                    return
+                task = slot.tasks.popleft()
+                task.attempts += 1
+                slot.current = task
+                slot.started = time.monotonic()
+                slot.throttled_since = None
+                driver = slot.driver
+
+            breaker_keys = (store_key(task.store_id), sku_key(str(task.product.get("sku", "")).strip()))
+            if self.breaker is not None and not self.breaker.allow(*breaker_keys):
+                result = task.result(skipped=True)
+            else:
+                result = self._check(driver, task, slot)
+
+            with self._lock:
+                if slot.generation != generation:
+                    # Abandoned by the deadline supervisor; the key was already handled
+                    return
+                slot.current = None
+
+                if result.error and not task.recheck and task.retries < self.max_retries:
+                    # End-of-cycle retry queue: try again after everything else in this slot
+                    task.retries += 1
+                    self.retried += 1
+                    slot.tasks.append(task)
+                    # Only the final attempt is recorded; a half-open probe must not stay taken
+                    self._release_probe(task)
+                    continue
+
+                # Primary finished first: cancel a hedge still running for this task
+                hedge_driver = None
+                if slot.hedged is task and self._hedge_driver is not None:
+                    self._hedge_cancelled = True
+                    if self._hedge_driver is not _BUILDING:
+                        hedge_driver = self._hedge_driver
+                slot.hedged = None
+
+            if hedge_driver is not None:
+                threading.Thread(target=self._discard_driver, args=(hedge_driver,), daemon=True).start()
+
+            if self.breaker is not None and not result.skipped:
+                if result.error:
+                    self.breaker.record_failure(*breaker_keys)
+                else:
+                    self.breaker.record_success(*breaker_keys)
+
+            if self.hedge is not None and not result.skipped and not result.error and not result.cached:
+                self.hedge.record(result.elapsed)
+
+            self._out.put(result)
+
+            if slot.tasks:
+                self._guard_memory(slot, generation)
+
+    def _guard_memory(self, slot: _Slot, generation: int) -> None:
+        """
+        Between checks on the slot's own worker thread: recycle the browser when the
+        memory guard says so. The old one is torn down first so recycling never needs
+        room for two. The shared Chrome of store contexts is only flagged here; closing
+        one tab would not bring its RSS down, so _restart_over_budget() restarts it.
+        """
+        if self.memory is None:
+            return
+
+        browser = self._browser
+        if browser is not None and browser is self._over_budget:
+            # Restart already pending
+            return
+        if browser is not None:
+            kind, pid = "chrome", browser.pid
+        else:
+            kind, pid = "browser", browser_pid(slot.driver)
+        with self._lock:
+            self._sampled.add((kind, pid))
+        if self.memory.check(kind, pid) is None:
+            return
+
+        with self._lock:
+            if slot.generation != generation:
+                return
+            if browser is not None:
+                self._over_budget = browser
+                return
+            old_driver = slot.driver
+
+        self._discard_driver(old_driver)
+        self._forget_memory(kind, pid)
+
+        try:
+            self._wait_for_memory()
+            new_driver = build_browser(self.settings)
+        except Exception as e:
+            # Checks on this slot fail (and stay UNKNOWN) until the next cycle starts fresh browsers
+            print(f"Browser recycle failed (non fatal): {e}")
+            return
+
+        with self._lock:
+            stale = slot.generation != generation
+            if not stale:
+                slot.driver = new_driver
+        if stale:
+            # The deadline supervisor replaced this slot's browser meanwhile
+            self._discard_driver(new_driver)
+
+    def _run_worker(self, slot: _Slot, generation: int) -> None:
+        """
+        Thread target: a worker that dies must not leave the slot looking busy,
+        or run_cycle would wait forever for results that never come.
+        """
+        try:
+            self._work(slot, generation)
+        except BaseException as e:
+            print(f"Check worker crashed: {type(e).__name__}: {e}")
+            with self._lock:
+                if slot.generation != generation:
+                    return
+                slot.generation += 1
+                slot.running = False
+                tasks = list(slot.tasks)
+                slot.tasks.clear()
+                if slot.current is not None:
+                    tasks.insert(0, slot.current)
+                    slot.current = None
+                for task in tasks:
+                    self._release_probe(task)
+                    self._out.put(task.result(error=f"check worker crashed: {e}"))
+
+    def _spawn(self, slot: _Slot) -> None:
+        slot.running = True
+        t = threading.Thread(target=get_profiler().wrap(self._run_worker), args=(slot, slot.generation), daemon=True)
+        t.start()
+
+    def _affected_slots(self, slot: _Slot) -> list[_Slot]:
+        # Store contexts share one Chrome process tree, so killing it hits every slot
+        return list(self._slots.values()) if self._browser is not None else [slot]
+
+    def _recover(self, slot: _Slot) -> None:
+        """
+        Deadline hit on slot: abandon its worker, kill the browser process tree,
+        spawn a replacement and requeue the key once.
+        """
+        group = self._affected_slots(slot)
+
+        with self._lock:
+            if self._browser is not None:
+                # The spare tab lives in the browser that is about to be killed
+                self._spare = None
+            for s in group:
+                s.generation += 1
+                task, s.current = s.current, None
+                if task is None:
+                    continue
+
+                if s is not slot:
+                    # Collateral of the shared browser kill: runs again, no outcome recorded
+                    self._release_probe(task)
+                    s.tasks.appendleft(task)
+                    continue
+
+                task.deadline_hits += 1
+                self.deadline_hits[task.store_id] += 1
+                print(
+                    f"Check deadline ({self.deadline_seconds:g}s) exceeded: "
+                    f"{task.product.get('name', 'Unknown')} at {task.store_name}, restarting browser"
+                )
+
+                if self.breaker is not None:
+                    self.breaker.record_failure(store_key(task.store_id), sku_key(str(task.product.get("sku", "")).strip()))
+
+                if task.deadline_hits > 1:
+                    self._out.put(task.result(error=f"check deadline exceeded twice ({self.deadline_seconds:g}s)"))
+                else:
+                    s.tasks.append(task)
+
+        self._restart(slot, group)
+
+    def _restart_over_budget(self) -> None:
+        """
+        Restarts the shared Chrome flagged by _guard_memory, with all its tabs.
+        Checks in flight on the other slots run again; no outcome is recorded.
+        """
+        with self._lock:
+            browser, self._over_budget = self._over_budget, None
+            if browser is None or browser is not self._browser or self._closed:
+                return
+            group = list(self._slots.values())
+            self._spare = None
+            for s in group:
+                s.generation += 1
+                task, s.current = s.current, None
+                if task is not None:
+                    self._release_probe(task)
+                    s.tasks.appendleft(task)
+
+        print("Shared Chrome over its memory budget, restarting it")
+        self._restart(group[0], group)
+
+    def _restart(self, slot: _Slot, group: list[_Slot]) -> None:
+        """
+        Kills the browser process tree of group (already abandoned by its workers),
+        starts a replacement and spawns new workers.
+        """
+        old_browser = self._browser
+        old_drivers = [s.driver for s in group]
+        root_pid = old_browser.pid if old_browser is not None else browser_pid(slot.driver)
+        kill_tree(root_pid)
+        self._forget_memory("chrome" if old_browser is not None else "browser", root_pid)
+
+        # Clean up sockets / temp profiles of the dead browser off the hot path
+        threading.Thread(target=self._quit_all, args=(old_drivers, old_browser), daemon=True).start()
+
+        try:
+            self._wait_for_memory()
+            with keep_beating("browser_restart", BROWSER_START_BEAT_SECONDS):
+                if old_browser is not None:
+                    self._browser = CdpBrowser()
+                    for s in group:
+                        s.driver = self._browser.new_context_page()
+                else:
+                    slot.driver = build_browser(self.settings)
+        except Exception as e:
+            print(f"Browser restart failed: {e}")
+            with self._lock:
+                for s in group:
+                    while s.tasks:
+                        self._out.put(s.tasks.popleft().result(error=f"browser restart failed: {e}"))
+            return
+
+        for s in group:
+            self._spawn(s)
+
+    @staticmethod
+    def _discard_driver(driver) -> None:
+        """
+        Cancels whatever driver is doing: context tabs are closed, standalone
+        browsers have their process tree killed first.
+        """
+        if not (isinstance(driver, CdpPage) and not driver.owns_browser):
+            kill_tree(browser_pid(driver))
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _maybe_hedge(self) -> None:
+        if self.hedge is None or self._closed:
+            return
+        if self.memory is not None and self.memory.memory_tight():
+            return
+        threshold = self.hedge.threshold()
+        if threshold is None:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if self._hedge_driver is not None:
+                return
+            slow = [
+                s for s in self._slots.values()
+                if s.current is not None
+                and s.throttled_since is None
+                and s.hedged is not s.current
+                and now - s.started > threshold
+            ]
+            if not slow:
+                return
+            slot = max(slow, key=lambda s: now - s.started)
+            if not self.hedge.try_acquire():
+                return
+
+            task = slot.current
+            slot.hedged = task
+            # Placeholder until the hedge thread has its driver; blocks a second hedge
+            self._hedge_driver = self._spare or _BUILDING
+            self._spare = None
+            self._hedge_cancelled = False
+            args = (slot, slot.generation, task, slot.started, self._browser, self._hedge_driver)
+
+        print(
+            f"Hedging slow check ({now - slot.started:.1f}s > p{self.hedge.percentile:g} {threshold:.1f}s): "
+            f"{task.product.get('name', 'Unknown')} at {task.store_name}"
+        )
+        threading.Thread(target=self._run_hedge, args=args, daemon=True).start()
+
+    def _run_hedge(self, slot: _Slot, generation: int, task: _Task, started: float, browser, driver) -> None:
+        result = None
+        try:
+            if driver is _BUILDING:
+                driver = browser.new_context_page() if browser is not None else build_browser(self.settings)
+                with self._lock:
+                    cancelled = self._hedge_cancelled or self._closed
+                    if not cancelled:
+                        self._hedge_driver = driver
+                if cancelled:
+                    self._discard_driver(driver)
+                    return
+            hedge_started = time.monotonic()
+            result = self._check(driver, task)
+        except Exception as e:
+            print(f"Hedge browser failed (non fatal): {e}")
+            with self._lock:
+                self._hedge_driver = None
+            return
+
+        old_driver = None
+        with self._lock:
+            won = (
+                not result.error
+                and not self._closed
+                and slot.generation == generation
+                and slot.current is task
+            )
+            cancelled = self._hedge_cancelled
+            keep = not won and not cancelled and not self._closed and self._browser is browser
+            if won:
+                # Abandon the primary worker and take over the hedge browser for this slot
+                slot.generation += 1
+                slot.current = None
+                slot.hedged = None
+                old_driver, slot.driver = slot.driver, driver
+            elif keep and self._spare is None:
+                self._spare = driver
+            self._hedge_driver = None
+
+        if not won:
+            # A cancelled hedge is torn down by whoever cancelled it
+            if not keep and not cancelled:
+                self._discard_driver(driver)
+            return
+
+        # Primary time before the hedge (its own limiter waits excluded) plus the hedge check
+        result.elapsed = hedge_started - started + result.elapsed
+        self.hedge.record(result.elapsed, learn=False)
+        self.hedge.record_win(result.elapsed)
+        if self.breaker is not None:
+            self.breaker.record_success(store_key(task.store_id), sku_key(str(task.product.get("sku", "")).strip()))
+        self._out.put(result)
+
+        threading.Thread(target=self._discard_driver, args=(old_driver,), daemon=True).start()
+        self._spawn(slot)
+
+    def _enforce_deadlines(self) -> None:
+        if self.deadline_seconds <= 0:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            overdue = [
+                s for s in self._slots.values()
+                if s.current is not None and s.throttled_since is None and now - s.started > self.deadline_seconds
+            ]
+
+        for slot in overdue:
+            # An earlier recovery in this pass may already have replaced this slot
+            if slot.current is not None:
+                self._recover(slot)
+
+    def _slot_for(self, store_id: str) -> _Slot:
+        return self._slots.get(store_id) or self._slots[None]
+
+    def recheck(self, result: CheckResult) -> None:
+        """
+        Queues the key of result again, ahead of everything else in its slot.
+        Only valid while run_cycle is being consumed; the re-check comes back
+        through the same generator with recheck=True. No retries for re-checks.
+        """
+        task = _Task(result.product, result.store_name, result.store_id, recheck=True)
+        with self._lock:
+            slot = self._slot_for(result.store_id)
+            slot.tasks.appendleft(task)
+            self._pending += 1
+            idle = not slot.running
+            slot.running = True
+        if idle:
+            self._spawn(slot)
+
+    def run_cycle(self, products: list[dict], stores: dict[str, str]):
+        """
+        Generator of CheckResult, one per (product, store), in completion order.
+        Failed checks are retried CHECK_RETRIES times at the end of the queue and only
+        then reported with error set (status UNKNOWN); only browser startup failures raise.
+        Checks blocked by the circuit breaker come back with skipped=True (status UNKNOWN).
+        """
+        self._open_slots(stores)
+
+        for product in products:
+            for store_name, store_id in stores.items():
+                self._slot_for(store_id).tasks.append(_Task(product, store_name, store_id))
+                self._pending += 1
+
+        for slot in self._slots.values():
+            self._spawn(slot)
+
+        while self._pending > 0:
+            try:
+                result = self._out.get(timeout=DEADLINE_POLL_SECONDS)
+            except queue.Empty:
+                result = None
+
+            # The supervisor loop is alive even while every worker is stuck in a page load
+            beat("checking")
+
+            if result is not None:
+                self._pending -= 1
+                yield result
+
+            self._enforce_deadlines()
+            self._restart_over_budget()
+            self._maybe_hedge()
+
+    @staticmethod
+    def _quit_all(drivers: list, browser) -> None:
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        if browser is not None:
+            try:
+                browser.quit()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            for slot in self._slots.values():
+                slot.generation += 1
+                slot.tasks.clear()
+                if slot.current is not None:
+                    self._release_probe(slot.current)
+                    slot.current = None
+            hedge_driver, self._hedge_driver = self._hedge_driver, None
+            spare, self._spare = self._spare, None
+            sampled, self._sampled = self._sampled, set()
+
+        if self.memory is not None:
+            for kind, pid in sampled:
+                self.memory.forget(kind, pid)
+
+        for driver in (hedge_driver, spare):
+            if driver is not None and driver is not _BUILDING:
+                self._discard_driver(driver)
+
+        self._quit_all([s.driver for s in self._slots.values()], self._browser)
+        self._slots = {}
+        self._browser = None
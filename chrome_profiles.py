@@ -0,0 +1,213 @@
+# chrome_profiles.py
+#
+# Reusable Chrome user-data-dirs (CHROME_PROFILE_DIR), one per browser worker:
+# - The HTTP disk cache (JS bundles, CSS, fonts) survives browser restarts
+# - A profile slot is held with flock, so two browsers or bot copies never share one
+# - Profiles larger than CHROME_PROFILE_MAX_MB are wiped at checkout, and a profile
+#   Chrome cannot start with is treated as corrupt and wiped once
+# - First-load vs later-load page times and bytes downloaded are recorded so the
+#   benefit of a warm cache is visible
+
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from config import env_int
+
+
+MAX_SLOTS = 64
+
+# Left behind when Chrome is killed; a new Chrome refuses the profile while they exist
+_STALE_FILES = ("SingletonLock", "SingletonSocket", "SingletonCookie", "DevToolsActivePort")
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class ChromeProfile:
+    def __init__(self, pool: "ProfilePool", name: str, path: str, lock_file):
+        self.pool = pool
+        self.name = name
+        self.path = path
+        self._lock_file = lock_file
+
+    def reset(self) -> None:
+        """
+        Wipes the profile (corrupt or too large); Chrome recreates it on start.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+
+    def release(self) -> None:
+        self.pool._release(self)
+
+
+class ProfilePool:
+    def __init__(self, root: str, max_bytes: int, cache_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.cache_bytes = cache_bytes
+        self._held: set[str] = set()
+        self._lock = threading.Lock()
+        self.rotations = 0
+        os.makedirs(root, exist_ok=True)
+
+    def cache_args(self) -> list[str]:
+        if self.cache_bytes > 0:
+            return [f"--disk-cache-size={self.cache_bytes}"]
+        return []
+
+    def _try_lock(self, name: str):
+        lock_path = os.path.join(self.root, f"{name}.lock")
+        f = open(lock_path, "a+")
+        if fcntl is None:
+            return f
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return f
+        except OSError:
+            f.close()
+            return None
+
+    def checkout(self) -> ChromeProfile:
+        with self._lock:
+            for i in range(MAX_SLOTS):
+                name = f"worker-{i}"
+                if name in self._held:
+                    continue
+                lock_file = self._try_lock(name)
+                if lock_file is None:
+                    # Held by another bot copy on this host
+                    continue
+                self._held.add(name)
+                break
+            else:
+                raise RuntimeError(f"no free Chrome profile slot under {self.root}")
+
+        profile = ChromeProfile(self, name, os.path.join(self.root, name), lock_file)
+        self._prepare(profile)
+        return profile
+
+    def _prepare(self, profile: ChromeProfile) -> None:
+        os.makedirs(profile.path, exist_ok=True)
+
+        size = dir_size(profile.path)
+        if self.max_bytes > 0 and size > self.max_bytes:
+            print(f"[chrome_profiles] {profile.name} is {size / (1024 * 1024):.0f} MB, rotating")
+            profile.reset()
+            self.rotations += 1
+            return
+
+        for name in _STALE_FILES:
+            try:
+                os.remove(os.path.join(profile.path, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[chrome_profiles] could not remove {name} from {profile.name} (non fatal): {e}")
+
+    def _release(self, profile: ChromeProfile) -> None:
+        with self._lock:
+            if profile.name not in self._held:
+                return
+            self._held.discard(profile.name)
+        try:
+            profile._lock_file.close()
+        except Exception:
+            pass
+
+
+def launch_with_profile(pool: ProfilePool, start):
+    """
+    Checks out a profile and calls start(profile). If Chrome fails to start, the
+    profile is wiped and start is tried once more; the profile is released if
+    that fails too.
+    """
+    profile = pool.checkout()
+    try:
+        try:
+            return start(profile)
+        except Exception as e:
+            print(f"[chrome_profiles] Chrome failed to start with {profile.name}, wiping it: {e}")
+            profile.reset()
+            pool.rotations += 1
+            return start(profile)
+    except Exception:
+        profile.release()
+        raise
+
+
+_POOL: ProfilePool | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_profile_pool() -> ProfilePool | None:
+    """
+    Process-wide pool built from env on first use (after config.env is loaded).
+    Returns None when CHROME_PROFILE_DIR is empty (throwaway profiles).
+    """
+    global _POOL
+    root = (os.getenv("CHROME_PROFILE_DIR") or "").strip()
+    if not root:
+        return None
+
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProfilePool(
+                root,
+                max_bytes=env_int("CHROME_PROFILE_MAX_MB", 512) * 1024 * 1024,
+                cache_bytes=env_int("CHROME_DISK_CACHE_MB", 256) * 1024 * 1024,
+            )
+        return _POOL
+
+
+class ProfileLoadStats:
+    """
+    Product page loads split into the first load after a browser starts
+    (cold unless the profile cache is warm) and every later load.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._data = {"first": [0, 0.0, 0], "later": [0, 0.0, 0]}
+
+    def record(self, first: bool, seconds: float, transfer_bytes: int) -> None:
+        with self._lock:
+            row = self._data["first" if first else "later"]
+            row[0] += 1
+            row[1] += seconds
+            row[2] += transfer_bytes
+
+    def summary(self) -> str | None:
+        labels = {"first": "first load after browser start", "later": "later loads"}
+        with self._lock:
+            parts = [
+                f"{labels[key]}: {n}x avg {seconds / n:.2f}s, {transferred / n / 1024:.0f} KB downloaded"
+                for key, (n, seconds, transferred) in self._data.items()
+                if n
+            ]
+        if not parts:
+            return None
+        return "Page cache: " + "; ".join(parts)
+
+
+PROFILE_STATS = ProfileLoadStats()
@@ -0,0 +1,141 @@
+# circuit_breaker.py
+#
+# Circuit breaker for failing checks, keyed by store ("store:25") and SKU ("sku:698877"):
+# - closed: checks run normally
+# - open: after N consecutive failures, checks are skipped until a backoff expires
+# - half-open: one probe check is let through; success closes, failure reopens
+#   with the backoff doubled (capped)
+
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+def store_key(store_id: str) -> str:
+    return f"store:{store_id}"
+
+
+def sku_key(sku: str) -> str:
+    return f"sku:{sku}"
+
+
+class _Entry:
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.next_probe_ts = 0.0
+        self.probe_in_flight = False
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        base_backoff_seconds: float = 300.0,
+        max_backoff_seconds: float = 7200.0,
+    ):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.base_backoff_seconds = float(base_backoff_seconds)
+        self.max_backoff_seconds = float(max_backoff_seconds)
+        self._entries: dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, key: str) -> _Entry:
+        e = self._entries.get(key)
+        if e is None:
+            e = self._entries[key] = _Entry()
+        return e
+
+    def allow(self, *keys: str) -> bool:
+        """
+        True if a check covering all keys may run. Grants the half-open probe for
+        any key whose backoff has expired; nothing is granted when the answer is False.
+        """
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                e = self._entries.get(key)
+                if e is None or e.state == CLOSED:
+                    continue
+                if e.state == OPEN and now < e.next_probe_ts:
+                    return False
+                if e.state == HALF_OPEN and e.probe_in_flight:
+                    return False
+
+            for key in keys:
+                e = self._entries.get(key)
+                if e is not None and e.state != CLOSED:
+                    e.state = HALF_OPEN
+                    e.probe_in_flight = True
+            return True
+
+    def release(self, *keys: str) -> None:
+        """
+        Gives back a half-open probe whose check ended without an outcome (requeued
+        for retry, moved after a browser restart, cycle closed), so the next attempt
+        can probe again instead of being skipped forever.
+        """
+        with self._lock:
+            for key in keys:
+                e = self._entries.get(key)
+                if e is not None and e.state == HALF_OPEN:
+                    e.probe_in_flight = False
+
+    def record_success(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                e = self._entries.get(key)
+                if e is None:
+                    continue
+                if e.state != CLOSED:
+                    print(f"[circuit_breaker] {key} closed")
+                del self._entries[key]
+
+    def record_failure(self, *keys: str) -> None:
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                e = self._entry(key)
+                e.failures += 1
+                e.probe_in_flight = False
+
+                if e.state == HALF_OPEN or e.failures >= self.failure_threshold:
+                    e.trips += 1
+                    backoff = min(self.base_backoff_seconds * (2 ** (e.trips - 1)), self.max_backoff_seconds)
+                    e.state = OPEN
+                    e.next_probe_ts = now + backoff
+                    print(f"[circuit_breaker] {key} open, next probe in {int(backoff)}s")
+
+    def state(self, key: str) -> str:
+        with self._lock:
+            e = self._entries.get(key)
+            return e.state if e else CLOSED
+
+    def describe(self, tz: ZoneInfo | None = None, limit: int = 5) -> list[str]:
+        """
+        Short lines for the status message, e.g. "store:25 open (probe 3:05:10 PM)".
+        """
+        with self._lock:
+            tripped = [(k, e) for k, e in self._entries.items() if e.state != CLOSED]
+
+        tripped.sort(key=lambda kv: kv[1].next_probe_ts)
+        lines = []
+        for key, e in tripped[:limit]:
+            if e.state == OPEN:
+                when = datetime.fromtimestamp(e.next_probe_ts, tz).strftime("%I:%M:%S %p").lstrip("0")
+                lines.append(f"{key} open (probe {when})")
+            else:
+                lines.append(f"{key} half-open")
+
+        if len(tripped) > limit:
+            lines.append(f"+{len(tripped) - limit} more")
+        return lines
@@ -1,6 +1,23 @@
 # config.py
+#
+# - env_on / env_int / env_float: env parsing helpers for the lazily built components
+# - Settings: frozen snapshot of the settings read on hot paths (alert toggles,
+#   Discord identity, per-check browser / navigation knobs). Built once; main calls
+#   refresh_settings() at the start of every cycle, which reloads config.env only
+#   when its mtime changed, so a cycle never sees a mix of old and new values
+# - Components built once at startup (circuit breaker, alert confirmation, hedging,
+#   memory guard, rate limiter / result cache parameters) keep their startup values
+
+from __future__ import annotations
 
 import os
+import threading
+from dataclasses import dataclass
+
+from dotenv import dotenv_values
+
+
+CONFIG_ENV_PATH = "config.env"
 
 
 def _env_raw(name: str) -> str:
@@ -14,15 +31,158 @@ def env_on(name: str, default: bool = True) -> bool:
     return raw in {"1", "true", "yes", "y", "on"}
 
 
+def env_int(name: str, default: int) -> int:
+    raw = _env_raw(name)
+    if raw == "":
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    raw = _env_raw(name)
+    if raw == "":
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
 def get_webhook_url() -> str:
     return (_env_raw("DISCORD_WEBHOOK_URL") or _env_raw("DISCORD_WEBHOOK"))
 
 
-ENABLE_DISCORD_ALERTS = env_on("ENABLE_DISCORD_ALERTS", True)
-ENABLE_EMAIL_ALERTS = env_on("ENABLE_EMAIL_ALERTS", True)
-ENABLE_NEW_STOCK_ALERTS = env_on("ENABLE_NEW_STOCK_ALERTS", True)
+def _env_color(name: str) -> int | None:
+    raw = _env_raw(name)
+    if raw == "":
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class Settings:
+    enable_discord_alerts: bool = True
+    enable_email_alerts: bool = True
+    enable_new_stock_alerts: bool = True
+    enable_open_box_tracking: bool = True
+    enable_open_box_alerts: bool = True
+    delete_discord_alerts_on_sellout: bool = False
+
+    webhook_url: str = ""
+    discord_username: str = "StockSmart Bot"
+    discord_avatar_url: str = ""
+    discord_role_id: str = ""
+    discord_embed_color: int | None = None
+
+    timezone: str = "America/Chicago"
+
+    browser_backend: str = "selenium"
+    store_contexts: bool = False
+    page_load_strategy: str = "normal"
+    page_load_deadline_seconds: float = 20.0
+    navigation_timeout_seconds: float = 45.0
+    check_retries: int = 1
+    check_deadline_seconds: float = 120.0
+    enable_rate_limit: bool = True
+    result_cache_path: str = ""
+
+    log_format: str = "text"
+
+    def embed_color(self, default: int) -> int:
+        # Alerts and live messages have different default colors
+        return default if self.discord_embed_color is None else self.discord_embed_color
+
+
+def settings_from_env() -> Settings:
+    strategy = _env_raw("PAGE_LOAD_STRATEGY").lower() or "normal"
+    log_format = _env_raw("LOG_FORMAT").lower() or "text"
+    return Settings(
+        enable_discord_alerts=env_on("ENABLE_DISCORD_ALERTS", True),
+        enable_email_alerts=env_on("ENABLE_EMAIL_ALERTS", True),
+        enable_new_stock_alerts=env_on("ENABLE_NEW_STOCK_ALERTS", True),
+        enable_open_box_tracking=env_on("ENABLE_OPEN_BOX_TRACKING", True),
+        enable_open_box_alerts=env_on("ENABLE_OPEN_BOX_ALERTS", True),
+        delete_discord_alerts_on_sellout=env_on("DELETE_DISCORD_ALERTS_ON_SELLOUT", False),
+        webhook_url=get_webhook_url(),
+        discord_username=_env_raw("DISCORD_USERNAME") or "StockSmart Bot",
+        discord_avatar_url=_env_raw("DISCORD_AVATAR_URL"),
+        discord_role_id=_env_raw("DISCORD_ROLE_ID"),
+        discord_embed_color=_env_color("DISCORD_EMBED_COLOR"),
+        timezone=_env_raw("TIMEZONE") or "America/Chicago",
+        browser_backend=_env_raw("BROWSER_BACKEND").lower() or "selenium",
+        store_contexts=env_on("STORE_CONTEXTS", False),
+        page_load_strategy=strategy if strategy in {"normal", "eager", "none"} else "normal",
+        page_load_deadline_seconds=env_float("PAGE_LOAD_DEADLINE_SECONDS", 20.0),
+        navigation_timeout_seconds=env_float("NAVIGATION_TIMEOUT_SECONDS", 45.0),
+        check_retries=max(0, env_int("CHECK_RETRIES", 1)),
+        check_deadline_seconds=env_float("CHECK_DEADLINE_SECONDS", 120.0),
+        enable_rate_limit=env_on("ENABLE_RATE_LIMIT", True),
+        result_cache_path=_env_raw("RESULT_CACHE_PATH"),
+        log_format=log_format if log_format in {"text", "json", "both"} else "text",
+    )
+
+
+_SETTINGS: Settings | None = None
+_SETTINGS_MTIME: float | None = None
+_FILE_KEYS: set[str] = set()
+_SETTINGS_LOCK = threading.Lock()
+
+
+def _mtime(path: str) -> float | None:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _apply_env_file(path: str) -> None:
+    """
+    load_dotenv(path, override=True), except that keys dropped from the file since
+    the last load are removed from the environment again.
+    """
+    global _FILE_KEYS
+    values = {k: v for k, v in dotenv_values(path).items() if v is not None} if os.path.exists(path) else {}
+    for key in _FILE_KEYS - set(values):
+        os.environ.pop(key, None)
+    os.environ.update(values)
+    _FILE_KEYS = set(values)
+
+
+def load_settings(path: str = CONFIG_ENV_PATH) -> Settings:
+    """
+    Loads path into the environment and rebuilds the settings snapshot.
+    """
+    global _SETTINGS, _SETTINGS_MTIME
+    with _SETTINGS_LOCK:
+        _SETTINGS_MTIME = _mtime(path)
+        _apply_env_file(path)
+        _SETTINGS = settings_from_env()
+        return _SETTINGS
+
+
+def refresh_settings(path: str = CONFIG_ENV_PATH) -> Settings:
+    """
+    Current snapshot, reloaded first if path changed on disk since the last load.
+    """
+    if _SETTINGS is not None and _mtime(path) == _SETTINGS_MTIME:
+        return _SETTINGS
+    return load_settings(path)
 
-ENABLE_OPEN_BOX_TRACKING = env_on("ENABLE_OPEN_BOX_TRACKING", True)
-ENABLE_OPEN_BOX_ALERTS = env_on("ENABLE_OPEN_BOX_ALERTS", True)
 
-DELETE_DISCORD_ALERTS_ON_SELLOUT = env_on("DELETE_DISCORD_ALERTS_ON_SELLOUT", False)
+def get_settings() -> Settings:
+    """
+    Current snapshot without touching config.env (delivery threads, live messages).
+    Built from the environment on first use if nothing loaded it yet.
+    """
+    global _SETTINGS
+    if _SETTINGS is None:
+        with _SETTINGS_LOCK:
+            if _SETTINGS is None:
+                _SETTINGS = settings_from_env()
+    return _SETTINGS
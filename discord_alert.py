@@ -1,17 +1,21 @@
 # discord_alert.py
 
-import os
 from datetime import datetime, timezone
 from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
 
 from discord_http import request_with_retry
 
 import discord_alert_tracker
+from config import Settings, get_settings
 
 
 def _get_webhook() -> str:
     # Prefer DISCORD_WEBHOOK_URL, fallback to DISCORD_WEBHOOK
-    return (os.getenv("DISCORD_WEBHOOK_URL") or os.getenv("DISCORD_WEBHOOK") or "").strip()
+    return get_settings().webhook_url
+
+
+def webhook_configured() -> bool:
+    return bool(_get_webhook())
 
 
 def _with_wait_true(url: str) -> str:
@@ -42,8 +46,8 @@ def _format_open_box(open_box_qty: int | None) -> str:
     return f"📦 Open box at this store: {q} OPEN BOX IN STOCK"
 
 
-def _post_embed(payload: dict) -> str | None:
-    webhook = _get_webhook()
+def _post_embed(payload: dict, webhook: str | None = None) -> str | None:
+    webhook = webhook or _get_webhook()
     if not webhook:
         print("DISCORD_WEBHOOK_URL not set, skipping Discord alert")
         return None
@@ -76,8 +80,8 @@ def _post_embed(payload: dict) -> str | None:
         return None
 
 
-def delete_discord_message(message_id: str) -> bool:
-    webhook = _get_webhook()
+def delete_discord_message(message_id: str, webhook: str | None = None) -> bool:
+    webhook = webhook or _get_webhook()
     if not webhook or not message_id:
         return False
 
@@ -98,8 +102,16 @@ def send_discord_alert(
     store_name: str,
     store_id: str | None = None,
     qty: int | None = None,
-) -> None:
-    role_id = (os.getenv("DISCORD_ROLE_ID") or "").strip()
+    webhook: str | None = None,
+    settings: Settings | None = None,
+) -> bool:
+    """
+    webhook: post to this webhook instead of DISCORD_WEBHOOK_URL (alert routing).
+    settings: role / color / identity to use (default: the current snapshot).
+    Returns True if Discord accepted the message.
+    """
+    settings = settings or get_settings()
+    role_id = settings.discord_role_id
     ping_text = f"<@&{role_id}>" if role_id else ""
 
     name = product.get("name", "Item")
@@ -129,7 +141,7 @@ def send_discord_alert(
         "title": "🔥🟢 IN STOCK",
         "url": url if url else None,
         "description": description,
-        "color": int(os.getenv("DISCORD_EMBED_COLOR", "3066993")),
+        "color": settings.embed_color(3066993),
         "footer": {"text": "Micro Center Stock Bot"},
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "fields": [
@@ -143,31 +155,38 @@ def send_discord_alert(
 
     payload = {
         "content": ping_text,
-        "username": (os.getenv("DISCORD_USERNAME") or "StockSmart Bot").strip(),
+        "username": settings.discord_username,
         "embeds": [embed],
         "allowed_mentions": {"parse": [], "roles": [role_id] if role_id else []},
     }
 
-    avatar_url = (os.getenv("DISCORD_AVATAR_URL") or "").strip()
+    avatar_url = settings.discord_avatar_url
     if avatar_url:
         payload["avatar_url"] = avatar_url
 
-    message_id = _post_embed(payload)
+    message_id = _post_embed(payload, webhook=webhook)
 
     if message_id and store_id:
         try:
-            discord_alert_tracker.set_message_id(sku=str(sku), store_id=str(store_id), message_id=str(message_id))
+            discord_alert_tracker.set_message_id(
+                sku=str(sku), store_id=str(store_id), message_id=str(message_id), webhook=webhook
+            )
         except Exception:
             pass
 
+    return message_id is not None
+
 
 def send_open_box_alert(
     product: dict,
     store_name: str,
     store_id: str | None = None,
     open_box_qty: int | None = None,
-) -> None:
-    role_id = (os.getenv("DISCORD_ROLE_ID") or "").strip()
+    webhook: str | None = None,
+    settings: Settings | None = None,
+) -> bool:
+    settings = settings or get_settings()
+    role_id = settings.discord_role_id
     ping_text = f"<@&{role_id}>" if role_id else ""
 
     name = product.get("name", "Item")
@@ -197,7 +216,7 @@ def send_open_box_alert(
         "title": "🟡 OPEN BOX AVAILABLE",
         "url": url if url else None,
         "description": description,
-        "color": int(os.getenv("DISCORD_EMBED_COLOR", "3066993")),
+        "color": settings.embed_color(3066993),
         "footer": {"text": "Micro Center Stock Bot"},
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "fields": [
@@ -211,21 +230,23 @@ def send_open_box_alert(
 
     payload = {
         "content": ping_text,
-        "username": (os.getenv("DISCORD_USERNAME") or "StockSmart Bot").strip(),
+        "username": settings.discord_username,
         "embeds": [embed],
         "allowed_mentions": {"parse": [], "roles": [role_id] if role_id else []},
     }
 
-    avatar_url = (os.getenv("DISCORD_AVATAR_URL") or "").strip()
+    avatar_url = settings.discord_avatar_url
     if avatar_url:
         payload["avatar_url"] = avatar_url
 
-    message_id = _post_embed(payload)
+    message_id = _post_embed(payload, webhook=webhook)
 
     if message_id and store_id:
         try:
             discord_alert_tracker.set_message_id(
-                sku=str("ob_" + str(sku)), store_id=str(store_id), message_id=str(message_id)
+                sku=str("ob_" + str(sku)), store_id=str(store_id), message_id=str(message_id), webhook=webhook
             )
         except Exception:
             pass
+
+    return message_id is not None
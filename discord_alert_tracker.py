@@ -1,11 +1,17 @@
 # discord_alert_tracker.py
 
+import hashlib
 import json
 import os
+import threading
 
 
 STATE_PATH = "discord_instock_alerts.json"
 
+# Alert deliveries run on one worker thread per destination; every read-modify-write
+# of the file goes through this lock
+_LOCK = threading.Lock()
+
 
 def _load() -> dict:
     if not os.path.exists(STATE_PATH):
@@ -18,30 +24,36 @@ def _load() -> dict:
 
 
 def _save(d: dict) -> None:
-    tmp = STATE_PATH + ".tmp"
+    tmp = f"{STATE_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
     with open(tmp, "w", encoding="utf-8") as f:
         json.dump(d, f, indent=2)
     os.replace(tmp, STATE_PATH)
 
 
-def key_for(sku: str, store_id: str) -> str:
+def key_for(sku: str, store_id: str, webhook: str | None = None) -> str:
+    # Routed webhooks get their own key; the URL itself is not written to disk
+    if webhook:
+        return f"{sku}_{store_id}@{hashlib.sha1(webhook.encode('utf-8')).hexdigest()[:12]}"
     return f"{sku}_{store_id}"
 
 
-def set_message_id(sku: str, store_id: str, message_id: str) -> None:
-    d = _load()
-    d[key_for(sku, store_id)] = str(message_id)
-    _save(d)
+def set_message_id(sku: str, store_id: str, message_id: str, webhook: str | None = None) -> None:
+    with _LOCK:
+        d = _load()
+        d[key_for(sku, store_id, webhook)] = str(message_id)
+        _save(d)
 
 
-def get_message_id(sku: str, store_id: str) -> str | None:
-    d = _load()
-    return d.get(key_for(sku, store_id))
+def get_message_id(sku: str, store_id: str, webhook: str | None = None) -> str | None:
+    with _LOCK:
+        d = _load()
+    return d.get(key_for(sku, store_id, webhook))
 
 
-def clear_message_id(sku: str, store_id: str) -> None:
-    d = _load()
-    k = key_for(sku, store_id)
-    if k in d:
-        del d[k]
-        _save(d)
+def clear_message_id(sku: str, store_id: str, webhook: str | None = None) -> None:
+    with _LOCK:
+        d = _load()
+        k = key_for(sku, store_id, webhook)
+        if k in d:
+            del d[k]
+            _save(d)
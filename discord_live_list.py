@@ -1,24 +1,35 @@
 # discord_live_list.py
-
+#
+# Live list of tracked products + their current status, as Discord embed messages
+# posted by a webhook and edited in place:
+# - Split over as many messages (pages) as the 4096-char embed description limit needs
+# - A product keeps its page across cycles; new products go on the last page with room
+# - Only pages whose content changed are edited; the first page also carries the
+#   last check time, so it is edited every cycle
+# - Message id, products and content hash of every page are kept in the state file
+
+import hashlib
 import json
 import os
-import time
 from datetime import datetime, timezone
 from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
 
-import requests
-
+from config import Settings, get_settings
 from discord_http import request_with_retry
 
 
+TITLE = "📋 Tracked Products"
+
+# Embed descriptions are capped at 4096 characters
+PAGE_CHAR_LIMIT = 3900
+
 
 class DiscordLiveListMessage:
     """
-    Maintains ONE Discord embed message (posted by a webhook) and edits it in place.
-    This message is meant to be a live list of tracked products + their current status.
+    Maintains the live list pages (one embed message each) and edits them in place.
     """
 
-    def __init__(self, webhook_url: str, state_path: str = "discord_live_list_state.json"):
+    def __init__(self, webhook_url: str, state_path: str = "discord_live_list_state.json", page_limit: int = PAGE_CHAR_LIMIT):
         if not isinstance(webhook_url, str):
             raise ValueError(
                 f"Discord webhook URL must be a string, got {type(webhook_url).__name__}: {webhook_url!r}"
@@ -29,6 +40,10 @@ class DiscordLiveListMessage:
             raise ValueError("Discord webhook URL is missing")
 
         self.state_path = state_path
+        self.page_limit = page_limit
+
+        self.last_pages = 0
+        self.last_edits = 0
 
     def _load_state(self) -> dict:
         if not os.path.exists(self.state_path):
@@ -52,27 +67,29 @@ class DiscordLiveListMessage:
         new_query = urlencode(q)
         return urlunparse((parts.scheme, parts.netloc, parts.path, parts.params, new_query, parts.fragment))
 
-    def ensure_message(self) -> str:
-        state = self._load_state()
-        message_id = state.get("message_id")
-        if message_id:
-            return str(message_id)
+    def _load_pages(self, state: dict) -> list[dict]:
+        pages = state.get("pages")
+        if isinstance(pages, list):
+            return [p for p in pages if isinstance(p, dict)]
+
+        # Single-message state from before pagination: keep using that message as page 1
+        if state.get("message_id"):
+            return [{"message_id": str(state["message_id"]), "skus": [], "hash": ""}]
+        return []
 
+    def _payload(self, embed: dict, settings: Settings) -> dict:
         payload = {
             "content": "",
-            "embeds": [
-                {
-                    "title": "📋 Tracked Products",
-                    "description": "🟨 Initializing live list...",
-                    "color": int(os.getenv("DISCORD_EMBED_COLOR", "5793266")),
-                    "footer": {"text": "Micro Center Stock Bot"},
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                }
-            ],
+            "embeds": [embed],
             "allowed_mentions": {"parse": []},
-            "username": (os.getenv("DISCORD_USERNAME") or "StockSmart Bot").strip(),
+            "username": settings.discord_username,
         }
 
+        if settings.discord_avatar_url:
+            payload["avatar_url"] = settings.discord_avatar_url
+        return payload
+
+    def _post_message(self, payload: dict) -> str:
         post_url = self._with_wait_true(self.webhook_url)
         r = request_with_retry("POST", post_url, json=payload, timeout=15)
 
@@ -84,12 +101,7 @@ class DiscordLiveListMessage:
         data = r.json() if r is not None else {}
         if "id" not in data:
             raise RuntimeError(f"Discord webhook JSON missing message id: {data!r}")
-
-        message_id = str(data["id"])
-        state["message_id"] = message_id
-        state["created_at_utc"] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-        self._save_state(state)
-        return message_id
+        return str(data["id"])
 
     def _edit_message(self, message_id: str, payload: dict) -> bool:
         edit_url = f"{self.webhook_url}/messages/{message_id}"
@@ -102,52 +114,128 @@ class DiscordLiveListMessage:
 
         return True
 
-    def update(self, lines: list[str], last_check_local: str) -> None:
+    def _delete_message(self, message_id: str) -> None:
+        r = request_with_retry("DELETE", f"{self.webhook_url}/messages/{message_id}", json=None, timeout=15)
+        if r is not None and r.status_code not in {204, 404} and not (200 <= r.status_code < 300):
+            print(f"[discord_live_list] could not delete page message (non fatal): HTTP {r.status_code}")
+
+    def _fit(self, text: str) -> str:
+        if len(text) <= self.page_limit:
+            return text
+        return text[: self.page_limit - 2].rstrip() + "\n…"
+
+    def _assign(self, old_pages: list[dict], texts: dict[str, str]) -> list[tuple[dict | None, list[str]]]:
+        """
+        Keeps every product on its previous page while it fits; products that are new
+        or no longer fit are appended to the last page with room, or to a new page.
+        Returns (previous page or None, skus) per page, empty pages dropped.
         """
-        lines should already be formatted, one per product.
+        layout: list[tuple[dict | None, list[str]]] = []
+        sizes: list[int] = []
+        seen = set()
+        overflow = []
+
+        for page in old_pages:
+            kept, size = [], 0
+            for sku in page.get("skus", []):
+                if sku not in texts or sku in seen:
+                    continue
+                seen.add(sku)
+                add = len(texts[sku]) + (2 if kept else 0)
+                if kept and size + add > self.page_limit:
+                    overflow.append(sku)
+                    continue
+                kept.append(sku)
+                size += add
+            layout.append((page, kept))
+            sizes.append(size)
+
+        for sku in overflow + [s for s in texts if s not in seen]:
+            add = len(texts[sku]) + 2
+            if layout and layout[-1][1] and sizes[-1] + add <= self.page_limit:
+                layout[-1][1].append(sku)
+                sizes[-1] += add
+            elif layout and not layout[-1][1]:
+                layout[-1][1].append(sku)
+                sizes[-1] = len(texts[sku])
+            else:
+                layout.append((None, [sku]))
+                sizes.append(len(texts[sku]))
+
+        kept_layout = [(page, skus) for page, skus in layout if skus]
+        if not kept_layout:
+            # Nothing to list: keep one page for the "no products" text
+            kept_layout = [(old_pages[0] if old_pages else None, [])]
+        return kept_layout
+
+    def update(self, blocks: list[tuple[str, list[str]]], last_check_local: str, settings: Settings | None = None) -> None:
+        """
+        blocks: one (sku, lines) entry per product, lines already formatted.
         Example:
-          🟩 [PowerSpec G758 Gaming PC](url) 4 NEW IN STOCK
-          🟥 [PowerSpec G759 Gaming PC](url) OUT OF STOCK
+          ("698879", ["🟩 [PowerSpec G758 Gaming PC](url)", "• Dallas: 4 NEW IN STOCK"])
+        settings: the cycle's snapshot (default: the current one).
         """
-        message_id = self.ensure_message()
-
-        description = "\n".join(lines).strip()
-        if not description:
-            description = "No products are currently configured."
-
-        embed = {
-            "title": "📋 Tracked Products",
-            "description": description,
-            "color": int(os.getenv("DISCORD_EMBED_COLOR", "5793266")),
-            "footer": {"text": f"Last check: {last_check_local}"},
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-        }
-
-        payload = {
-            "content": "",
-            "embeds": [embed],
-            "allowed_mentions": {"parse": []},
-            "username": (os.getenv("DISCORD_USERNAME") or "StockSmart Bot").strip(),
-        }
-
-        avatar_url = (os.getenv("DISCORD_AVATAR_URL") or "").strip()
-        if avatar_url:
-            payload["avatar_url"] = avatar_url
-
-        try:
-            self._edit_message(str(message_id), payload)
-        except Exception as e:
-            # If edit fails (message deleted/expired/etc), recreate and retry once.
-            try:
-                self.clear_saved_message_id()
-                message_id = self.ensure_message()
-                self._edit_message(str(message_id), payload)
-            except Exception:
-                print(f"[discord_live_list] update failed (non fatal): {e}")
-                return
-
-    def clear_saved_message_id(self) -> None:
+        settings = settings or get_settings()
         state = self._load_state()
-        if "message_id" in state:
-            del state["message_id"]
+        old_pages = self._load_pages(state)
+
+        texts = {}
+        for sku, lines in blocks:
+            text = self._fit("\n".join(lines).strip())
+            if text:
+                texts[str(sku)] = text
+
+        layout = self._assign(old_pages, texts)
+        used = {id(page) for page, _skus in layout if page is not None}
+
+        new_pages = []
+        edits = 0
+        for i, (page, skus) in enumerate(layout):
+            description = "\n\n".join(texts[sku] for sku in skus) or "No products are currently configured."
+            embed = {
+                "title": TITLE if i == 0 else f"{TITLE} (continued)",
+                "description": description,
+                "color": settings.embed_color(5793266),
+            }
+            digest = hashlib.sha1(json.dumps(embed, sort_keys=True).encode("utf-8")).hexdigest()
+
+            if i == 0:
+                embed["footer"] = {"text": f"Last check: {last_check_local}"}
+                embed["timestamp"] = datetime.now(timezone.utc).isoformat()
+
+            message_id = (page or {}).get("message_id")
+            entry = {"message_id": message_id, "skus": skus, "hash": (page or {}).get("hash", "")}
+            new_pages.append(entry)
+
+            if message_id and i > 0 and entry["hash"] == digest:
+                continue
+
+            payload = self._payload(embed, settings)
+            try:
+                if message_id:
+                    try:
+                        self._edit_message(str(message_id), payload)
+                    except Exception as e:
+                        # Message deleted/expired/etc: post it again (it lands below the other pages)
+                        print(f"[discord_live_list] page {i + 1} edit failed, reposting: {e}")
+                        entry["message_id"] = self._post_message(payload)
+                else:
+                    entry["message_id"] = self._post_message(payload)
+                entry["hash"] = digest
+                edits += 1
+            except Exception as e:
+                print(f"[discord_live_list] page {i + 1} update failed (non fatal): {e}")
+
+        for page in old_pages:
+            if id(page) not in used and page.get("message_id"):
+                self._delete_message(str(page["message_id"]))
+
+        if len(new_pages) != self.last_pages:
+            print(f"[discord_live_list] live list spans {len(new_pages)} message(s)")
+        self.last_pages = len(new_pages)
+        self.last_edits = edits
+
+        state.pop("message_id", None)
+        state["pages"] = new_pages
+        state.setdefault("created_at_utc", datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC"))
         self._save_state(state)
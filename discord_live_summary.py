@@ -7,6 +7,7 @@ import os
 from datetime import datetime, timezone
 from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
 
+from config import Settings, get_settings
 from discord_http import request_with_retry
 
 
@@ -51,19 +52,20 @@ class DiscordLiveSummaryMessage:
         if message_id:
             return str(message_id)
 
+        settings = get_settings()
         payload = {
             "content": "",
             "embeds": [
                 {
                     "title": "🧾 Product Summary",
                     "description": "🟨 Initializing summary...",
-                    "color": int(os.getenv("DISCORD_EMBED_COLOR", "5793266")),
+                    "color": settings.embed_color(5793266),
                     "footer": {"text": "Micro Center Stock Bot"},
                     "timestamp": datetime.now(timezone.utc).isoformat(),
                 }
             ],
             "allowed_mentions": {"parse": []},
-            "username": (os.getenv("DISCORD_USERNAME") or "StockSmart Bot").strip(),
+            "username": settings.discord_username,
         }
 
         post_url = self._with_wait_true(self.webhook_url)
@@ -93,7 +95,8 @@ class DiscordLiveSummaryMessage:
             snippet = snippet[:250] if snippet else "no response body"
             raise RuntimeError(f"Discord webhook PATCH failed: HTTP {(r.status_code if r is not None else 'no-status')}: {snippet}")
 
-    def update(self, lines: list[str], last_check_local: str) -> None:
+    def update(self, lines: list[str], last_check_local: str, settings: Settings | None = None) -> None:
+        settings = settings or get_settings()
         try:
             message_id = self.ensure_message()
         except Exception as e:
@@ -107,7 +110,7 @@ class DiscordLiveSummaryMessage:
         embed = {
             "title": "🧾 Product Summary",
             "description": description,
-            "color": int(os.getenv("DISCORD_EMBED_COLOR", "5793266")),
+            "color": settings.embed_color(5793266),
             "footer": {"text": f"Last check: {last_check_local}"},
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }
@@ -116,12 +119,11 @@ class DiscordLiveSummaryMessage:
             "content": "",
             "embeds": [embed],
             "allowed_mentions": {"parse": []},
-            "username": (os.getenv("DISCORD_USERNAME") or "StockSmart Bot").strip(),
+            "username": settings.discord_username,
         }
 
-        avatar_url = (os.getenv("DISCORD_AVATAR_URL") or "").strip()
-        if avatar_url:
-            payload["avatar_url"] = avatar_url
+        if settings.discord_avatar_url:
+            payload["avatar_url"] = settings.discord_avatar_url
 
         try:
             self._edit_message(str(message_id), payload)
@@ -0,0 +1,103 @@
+# discord_publisher.py
+#
+# Background stage that renders and publishes cycle snapshots (status message + live list):
+# - main hands off a snapshot and goes straight back to scraping
+# - only the newest snapshot is kept; an older one still waiting is dropped
+# - queue lag (submit -> publish start) is recorded so a slow Discord is visible
+
+from __future__ import annotations
+
+import threading
+import time
+
+
+class SnapshotPublisher:
+    def __init__(self, status=None, live_list=None):
+        self.status = status
+        self.live_list = live_list
+
+        self._cond = threading.Condition()
+        self._pending: dict | None = None
+        self._pending_ts = 0.0
+        self._closed = False
+
+        self.published = 0
+        self.dropped = 0
+        self.last_lag_seconds: float | None = None
+        self.max_lag_seconds = 0.0
+        self.last_publish_seconds: float | None = None
+
+        self._thread = threading.Thread(target=self._run, name="discord-publisher", daemon=True)
+        self._thread.start()
+
+    def submit(self, snapshot: dict) -> None:
+        """
+        snapshot keys:
+          status: kwargs for DiscordStatusMessage.update
+          render_live_blocks: zero-arg callable returning the live list (sku, lines) blocks
+          last_check_local: footer text for the live list
+          settings: the cycle's config.Settings snapshot for the live list
+        Missing keys are skipped.
+        """
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = snapshot
+            self._pending_ts = time.monotonic()
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                snapshot = self._pending
+                lag = time.monotonic() - self._pending_ts
+                self._pending = None
+
+            self.last_lag_seconds = lag
+            self.max_lag_seconds = max(self.max_lag_seconds, lag)
+
+            t0 = time.monotonic()
+            self._publish(snapshot, lag)
+            self.last_publish_seconds = time.monotonic() - t0
+            self.published += 1
+
+    def _publish(self, snapshot: dict, lag: float) -> None:
+        status_kwargs = snapshot.get("status")
+        if self.status and status_kwargs is not None:
+            try:
+                self.status.update(**status_kwargs, publish_lag_seconds=lag)
+            except Exception as e:
+                print(f"Discord status update failed (non fatal): {e}")
+
+        render = snapshot.get("render_live_blocks")
+        if self.live_list and render is not None:
+            try:
+                blocks = render()
+                self.live_list.update(
+                    blocks=blocks,
+                    last_check_local=snapshot.get("last_check_local", ""),
+                    settings=snapshot.get("settings"),
+                )
+            except Exception as e:
+                print(f"Discord live list update failed (non fatal): {e}")
+
+    def summary(self) -> str:
+        lag = "n/a" if self.last_lag_seconds is None else f"{self.last_lag_seconds:.2f}s"
+        took = "n/a" if self.last_publish_seconds is None else f"{self.last_publish_seconds:.2f}s"
+        return (
+            f"Discord publisher: {self.published} published, {self.dropped} stale dropped, "
+            f"lag {lag} (max {self.max_lag_seconds:.2f}s), last publish took {took}"
+        )
+
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        Lets a pending snapshot finish publishing (up to timeout), then stops.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
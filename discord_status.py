@@ -130,6 +130,9 @@ class DiscordStatusMessage:
         last_error: str | None = None,
         uptime_seconds: int | None = None,
         timezone_name: str | None = None,
+        breakers: list[str] | None = None,
+        publish_lag_seconds: float | None = None,
+        memory: str | None = None,
     ) -> None:
         message_id = self.ensure_message()
 
@@ -173,6 +176,15 @@ class DiscordStatusMessage:
         if tz_line:
             lines.append(tz_line)
 
+        if breakers is not None:
+            lines.append(f"Circuit breakers: {', '.join(breakers) if breakers else 'all closed'}")
+
+        if memory is not None:
+            lines.append(f"Browser memory: {memory}")
+
+        if publish_lag_seconds is not None:
+            lines.append(f"Publish lag: {publish_lag_seconds:.1f}s")
+
         lines.append(f"Last error: {err_text}")
 
         content = "\n".join(lines)
@@ -22,19 +22,32 @@ def _pick_env(*names: str) -> str:
     return ""
 
 
+def email_configured(to_addr: str | None = None) -> bool:
+    return bool(
+        (to_addr or _pick_env("ALERT_EMAIL_TO", "email"))
+        and _pick_env("ALERT_EMAIL_FROM", "email")
+        and _clean_password(_pick_env("ALERT_EMAIL_PASSWORD", "password"))
+    )
+
+
 def send_email_alert(
     product: dict,
     store_name: str,
     store_id: str | None = None,
     qty: int | None = None,
-) -> None:
-    to_addr = _pick_env("ALERT_EMAIL_TO", "email")
+    to_addr: str | None = None,
+) -> bool:
+    """
+    to_addr: send to this recipient instead of ALERT_EMAIL_TO (alert routing).
+    Returns True if the message was sent.
+    """
+    to_addr = to_addr or _pick_env("ALERT_EMAIL_TO", "email")
     from_addr = _pick_env("ALERT_EMAIL_FROM", "email")
     password = _clean_password(_pick_env("ALERT_EMAIL_PASSWORD", "password"))
 
     if not to_addr or not from_addr or not password:
         print("Email env not set. Skipping email alert.")
-        return
+        return False
 
     timezone_name = _pick_env("TIMEZONE") or "America/Chicago"
     try:
@@ -96,5 +109,7 @@ def send_email_alert(
             server.login(from_addr, password)
             server.sendmail(from_addr, [to_addr], msg.as_string())
         print("📧 Email alert sent")
+        return True
     except Exception as e:
         print(f"❌ Email alert failed: {e}")
+        return False
@@ -0,0 +1,166 @@
+# heartbeat.py
+#
+# Low-latency liveness channel from main to the watchdog:
+# - main sends a tiny datagram on a Unix socket (HEARTBEAT_SOCKET) from inside the
+#   check loop and while sleeping, at most once per HEARTBEAT_INTERVAL_SECONDS
+# - Sending never blocks and never fails loudly (no watchdog listening is fine)
+# - The watchdog blocks on the socket with a timeout, so noticing a stall costs
+#   a wakeup per second instead of re-reading the status file
+# - Where Unix datagram sockets are missing (Windows) both sides are no-ops and the
+#   watchdog falls back to the status file heartbeat
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import socket
+import threading
+import time
+
+from config import env_float, env_on
+
+
+class HeartbeatSender:
+    def __init__(self, path: str, min_interval: float = 1.0):
+        self.path = path
+        self.min_interval = min_interval
+        self.seq = 0
+        self._last = 0.0
+        self._lock = threading.Lock()
+        self._sock = None
+        if hasattr(socket, "AF_UNIX"):
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+
+    def beat(self, phase: str = "") -> None:
+        if self._sock is None:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last < self.min_interval:
+                return
+            self._last = now
+            self.seq += 1
+            payload = json.dumps({"pid": os.getpid(), "seq": self.seq, "ts": time.time(), "phase": phase})
+
+        try:
+            self._sock.sendto(payload.encode("utf-8"), self.path)
+        except OSError:
+            # Watchdog not running or its buffer is full; the next beat retries
+            pass
+
+
+class HeartbeatReceiver:
+    def __init__(self, path: str):
+        self.path = path
+        self.last_seen: float | None = None
+        self.last: dict = {}
+
+        # A socket file left by a previous watchdog would make bind fail
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(path)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Blocks up to timeout for heartbeats and drains whatever arrived.
+        Returns True if at least one heartbeat was received.
+        """
+        got = False
+        self._sock.settimeout(timeout)
+        while True:
+            try:
+                data = self._sock.recv(4096)
+            except (socket.timeout, BlockingIOError):
+                return got
+            except OSError:
+                return got
+
+            got = True
+            self.last_seen = time.monotonic()
+            try:
+                self.last = json.loads(data.decode("utf-8"))
+            except ValueError:
+                self.last = {}
+            # Drain the backlog without waiting again
+            self._sock.settimeout(0)
+
+    def age(self) -> float | None:
+        """
+        Seconds since the last heartbeat, None if none has arrived yet.
+        """
+        if self.last_seen is None:
+            return None
+        return time.monotonic() - self.last_seen
+
+    def close(self) -> None:
+        try:
+            self._sock.close()
+        finally:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def heartbeat_path() -> str:
+    return (os.getenv("HEARTBEAT_SOCKET") or "heartbeat.sock").strip()
+
+
+_SENDER: HeartbeatSender | None = None
+_SENDER_LOCK = threading.Lock()
+
+
+def get_heartbeat() -> HeartbeatSender | None:
+    """
+    Process-wide sender built from env on first use (after config.env is loaded).
+    Returns None when ENABLE_HEARTBEAT_SOCKET=0.
+    """
+    global _SENDER
+    if not env_on("ENABLE_HEARTBEAT_SOCKET", True):
+        return None
+
+    with _SENDER_LOCK:
+        if _SENDER is None:
+            _SENDER = HeartbeatSender(heartbeat_path(), env_float("HEARTBEAT_INTERVAL_SECONDS", 1.0))
+        return _SENDER
+
+
+def beat(phase: str = "") -> None:
+    sender = get_heartbeat()
+    if sender is not None:
+        sender.beat(phase)
+
+
+@contextlib.contextmanager
+def keep_beating(phase: str, max_seconds: float):
+    """
+    Beats from a helper thread while a known slow blocking step (browser start)
+    runs on the thread that normally beats. Gives up after max_seconds, so a
+    step that really hangs still goes stale for the watchdog.
+    """
+    if get_heartbeat() is None:
+        yield
+        return
+
+    stop = threading.Event()
+
+    def _run():
+        end = time.monotonic() + max_seconds
+        while time.monotonic() < end:
+            beat(phase)
+            if stop.wait(1.0):
+                return
+
+    t = threading.Thread(target=_run, name="heartbeat-keepalive", daemon=True)
+    t.start()
+    try:
+        yield
+    finally:
+        stop.set()
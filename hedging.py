@@ -0,0 +1,128 @@
+# hedging.py
+#
+# Hedged checks: when a check has been running longer than the learned latency
+# percentile (p95 by default), CheckRunner issues the same (product, store) check
+# on a spare browser and keeps whichever finishes first.
+# - Threshold is learned from recent successful check times (survives across cycles)
+# - Hedges are capped to HEDGE_MAX_RATE of all checks so the extra load stays bounded
+# - summary() reports the cycle's tail latency and compares hedge wins against the
+#   learned unhedged tail (mean of recent checks slower than the threshold)
+
+from __future__ import annotations
+
+import collections
+import threading
+
+from config import env_float, env_int, env_on
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class HedgePolicy:
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        max_rate: float = 0.05,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        self.percentile = float(percentile)
+        self.max_rate = max(0.0, float(max_rate))
+        self.min_samples = max(1, int(min_samples))
+
+        self._samples: collections.deque[float] = collections.deque(maxlen=max(self.min_samples, int(window)))
+        self._lock = threading.Lock()
+
+        self.checks = 0
+        self.hedges = 0
+
+        self._cycle_latencies: list[float] = []
+        self._cycle_hedges = 0
+        self._cycle_wins = 0
+        self._cycle_win_latencies: list[float] = []
+
+    def threshold(self) -> float | None:
+        """
+        Seconds after which a running check gets hedged, or None while still learning.
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            return _percentile(list(self._samples), self.percentile)
+
+    def record(self, elapsed: float, learn: bool = True) -> None:
+        """
+        One finished check (effective latency, i.e. winner time for hedged checks).
+        Only successful primary checks feed the threshold.
+        """
+        with self._lock:
+            self.checks += 1
+            self._cycle_latencies.append(elapsed)
+            if learn:
+                self._samples.append(elapsed)
+
+    def try_acquire(self) -> bool:
+        """
+        Takes a hedge from the budget; False once hedges would exceed max_rate of checks.
+        """
+        with self._lock:
+            if self.hedges + 1 > self.max_rate * max(self.checks, self.min_samples):
+                return False
+            self.hedges += 1
+            self._cycle_hedges += 1
+            return True
+
+    def record_win(self, elapsed: float) -> None:
+        with self._lock:
+            self._cycle_wins += 1
+            self._cycle_win_latencies.append(elapsed)
+
+    def summary(self, reset: bool = True) -> str | None:
+        with self._lock:
+            if not self._cycle_latencies:
+                return None
+
+            lat = self._cycle_latencies
+            line = (
+                f"Hedging: {self._cycle_hedges} hedged, {self._cycle_wins} won by hedge; "
+                f"check latency p50 {_percentile(lat, 50):.1f}s, p95 {_percentile(lat, 95):.1f}s, "
+                f"max {max(lat):.1f}s"
+            )
+            if len(self._samples) >= self.min_samples:
+                samples = list(self._samples)
+                threshold = _percentile(samples, self.percentile)
+                line += f", hedge after {threshold:.1f}s"
+
+                tail = [x for x in samples if x > threshold]
+                won = sum(self._cycle_win_latencies) / len(self._cycle_win_latencies) if self._cycle_win_latencies else 0.0
+                unhedged = sum(tail) / len(tail) if tail else 0.0
+                if won and unhedged > won:
+                    line += (
+                        f"; hedge wins took avg {won:.1f}s vs {unhedged:.1f}s unhedged tail "
+                        f"(~{unhedged - won:.1f}s saved each)"
+                    )
+            line += f"; total {self.hedges}/{self.checks} checks hedged"
+
+            if reset:
+                self._cycle_latencies = []
+                self._cycle_hedges = 0
+                self._cycle_wins = 0
+                self._cycle_win_latencies = []
+            return line
+
+
+def hedge_policy_from_env() -> HedgePolicy | None:
+    """
+    ENABLE_HEDGING=0 (default) returns None.
+    """
+    if not env_on("ENABLE_HEDGING", False):
+        return None
+    return HedgePolicy(
+        percentile=env_float("HEDGE_PERCENTILE", 95.0),
+        max_rate=env_float("HEDGE_MAX_RATE", 0.05),
+        min_samples=env_int("HEDGE_MIN_SAMPLES", 20),
+    )
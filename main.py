@@ -1,36 +1,45 @@
 # main.py
 
+import collections
+import functools
 import os
 import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-from dotenv import load_dotenv
-
-from products import PRODUCTS
-from stores import STORES
-from notifier import notify_all, notify_open_box
+from alert_debounce import AlertDebouncer
+from alert_router import get_router
+from catalog import Catalog
+from chrome_profiles import PROFILE_STATS
+from notifier import notify_all, notify_open_box, notify_sold_out
 from state import load_state, save_state
-from stock_checker import build_driver, check_stock
+from structured_log import get_record_log, log_event
+from check_runner import UNKNOWN, CheckRunner
+from circuit_breaker import CircuitBreaker
+from config import Settings, env_float, env_int, env_on, load_settings, refresh_settings
+from heartbeat import beat
+from hedging import hedge_policy_from_env
+from memory_guard import memory_guard_from_env
+from page_parser import get_parser
+from page_snapshots import get_snapshot_store
+from profiler import get_profiler
+from rate_limiter import get_limiter
+from result_cache import get_result_cache
+from stock_checker import LOAD_STATS
 from discord_status import DiscordStatusMessage
 from discord_live_list import DiscordLiveListMessage
+from discord_publisher import SnapshotPublisher
 
 
 POLL_SECONDS = 120
 STATUS_STATE_PATH = "discord_status_state.json"
+HEARTBEAT_SLEEP_STEP_SECONDS = 5.0
 
 
 def now_local_str(tz: ZoneInfo) -> str:
     return datetime.now(tz).strftime("%I:%M:%S %p").lstrip("0")
 
 
-def _env_on(name: str, default: bool = True) -> bool:
-    raw = (os.getenv(name) or "").strip().lower()
-    if raw == "":
-        return default
-    return raw in {"1", "true", "yes", "y", "on"}
-
-
 def _mk_name_link(product: dict) -> str:
     name = product.get("name", "Unknown")
     url = (product.get("url", "") or "").strip()
@@ -63,173 +72,489 @@ def _fmt_open_box_line(ob_available: bool, ob_qty: int | None) -> str:
         return "OPEN BOX AVAILABLE"
 
 
+def _build_live_blocks(
+    products: list[dict],
+    stores: dict[str, str],
+    new_stock_now_by_key: dict,
+    new_qty_by_key: dict,
+    open_box_now_by_key: dict,
+    open_box_qty_by_key: dict,
+    open_box_tracking: bool,
+    stale_keys: frozenset = frozenset(),
+) -> list[tuple[str, list[str]]]:
+    """
+    One (sku, lines) block per product; the live list pages on block boundaries.
+    """
+    blocks = []
+
+    for product in products:
+        sku = str(product.get("sku", "")).strip()
+        name_link = _mk_name_link(product)
+        lines = []
+
+        any_in_stock = False
+        for store_name, store_id in stores.items():
+            key = f"{sku}_{store_id}"
+            if bool(new_stock_now_by_key.get(key, False)):
+                any_in_stock = True
+                break
+
+        status_square = "🟩" if any_in_stock else "🟥"
+        lines.append(f"{status_square} {name_link}")
+
+        for store_name, store_id in stores.items():
+            key = f"{sku}_{store_id}"
+            ob_key = f"ob_{sku}_{store_id}"
+
+            now_in = bool(new_stock_now_by_key.get(key, False))
+            qty = new_qty_by_key.get(key)
+            new_part = _fmt_new_stock_line(qty, now_in)
+
+            # Last check failed: the values shown are the last known state
+            stale_part = " ⚠️ stale" if key in stale_keys else ""
+
+            if open_box_tracking:
+                ob_now = bool(open_box_now_by_key.get(ob_key, False))
+                ob_qty = open_box_qty_by_key.get(ob_key)
+                ob_part = _fmt_open_box_line(ob_now, ob_qty)
+                lines.append(f"• {store_name}: {new_part} | {ob_part}{stale_part}")
+            else:
+                lines.append(f"• {store_name}: {new_part}{stale_part}")
+
+        blocks.append((sku, lines))
+
+    return blocks
+
+
+def _check_record(result) -> dict:
+    """
+    Structured fields for one check result (JSON-lines log).
+    """
+    return {
+        "sku": result.sku,
+        "store_id": str(result.store_id),
+        "store": result.store_name,
+        "product": result.product.get("name", "Unknown"),
+        "status": result.status,
+        "new_in_stock": result.new_in_stock,
+        "new_qty": result.new_qty,
+        "open_box_available": result.open_box_available,
+        "open_box_qty": result.open_box_qty,
+        "elapsed": round(result.elapsed, 3),
+        "attempts": result.attempts,
+        "error": result.error,
+        "skipped": result.skipped,
+        "cached": result.cached,
+        "recheck": result.recheck,
+    }
+
+
+def _sleep_with_heartbeat(seconds: float) -> None:
+    """
+    time.sleep in short steps so the watchdog keeps hearing from us between cycles.
+    """
+    end = time.monotonic() + seconds
+    while True:
+        beat("sleeping")
+        left = end - time.monotonic()
+        if left <= 0:
+            return
+        time.sleep(min(left, HEARTBEAT_SLEEP_STEP_SECONDS))
+
+
+def _apply_transitions(
+    state: dict,
+    product: dict,
+    store_name: str,
+    store_id: str,
+    new_now: bool,
+    new_qty: int | None,
+    ob_now: bool,
+    ob_qty: int | None,
+    settings: Settings,
+    muted_keys: frozenset = frozenset(),
+) -> bool:
+    """
+    Compares one check result against saved state, sends alerts for
+    out -> in transitions, deletes alerts on sellout and updates state.
+    Runs as soon as the check finishes, so alert latency does not depend on catalog size.
+    settings is the cycle's snapshot, so one cycle never mixes old and new toggles.
+    Keys in muted_keys (flapping) get their state updated but no alert.
+    Returns True when a saved value flipped (caller persists state right away).
+    """
+    sku = str(product.get("sku", "")).strip()
+    key = f"{sku}_{store_id}"
+    ob_key = f"ob_{sku}_{store_id}"
+
+    new_before = bool(state.get(key, False))
+    flipped = new_before != new_now
+
+    delete_on_sellout = settings.delete_discord_alerts_on_sellout and settings.enable_discord_alerts
+
+    if settings.enable_new_stock_alerts:
+        if (not new_before) and new_now and key in muted_keys:
+            log_event(
+                "alert",
+                console=f"ALERT MUTED (flapping): {product.get('name', 'Unknown')} is IN STOCK at {store_name}",
+                kind="new", sku=sku, store_id=str(store_id), qty=new_qty, muted=True,
+            )
+        elif (not new_before) and new_now:
+            log_event(
+                "alert",
+                console=f"ALERT: {product.get('name', 'Unknown')} is IN STOCK at {store_name}",
+                kind="new", sku=sku, store_id=str(store_id), qty=new_qty, muted=False,
+            )
+            notify_all(product=product, store_name=store_name, store_id=store_id, qty=new_qty, settings=settings)
+
+    state[key] = new_now
+
+    if new_before and (not new_now):
+        try:
+            notify_sold_out(str(sku), store_id, delete=delete_on_sellout)
+        except Exception as e:
+            print(f"Sellout delete failed (non fatal): {e}")
+
+    if settings.enable_open_box_tracking and settings.enable_open_box_alerts:
+        ob_before = bool(state.get(ob_key, False))
+        flipped = flipped or (ob_before != ob_now)
+
+        if (not ob_before) and ob_now and ob_key in muted_keys:
+            log_event(
+                "alert",
+                console=f"OPEN BOX ALERT MUTED (flapping): {product.get('name', 'Unknown')} has OPEN BOX at {store_name}",
+                kind="open_box", sku=sku, store_id=str(store_id), qty=ob_qty, muted=True,
+            )
+        elif (not ob_before) and ob_now:
+            log_event(
+                "alert",
+                console=f"OPEN BOX ALERT: {product.get('name', 'Unknown')} has OPEN BOX at {store_name}",
+                kind="open_box", sku=sku, store_id=str(store_id), qty=ob_qty, muted=False,
+            )
+            notify_open_box(
+                product=product, store_name=store_name, store_id=store_id, open_box_qty=ob_qty, settings=settings
+            )
+
+        state[ob_key] = ob_now
+
+        if ob_before and (not ob_now):
+            try:
+                notify_sold_out("ob_" + str(sku), store_id, delete=delete_on_sellout)
+            except Exception as e:
+                print(f"Open box sellout delete failed (non fatal): {e}")
+    else:
+        if ob_key in state:
+            if state.pop(ob_key):
+                # Close the episode, or re-enabling open box alerts would find it still open
+                try:
+                    notify_sold_out("ob_" + str(sku), store_id)
+                except Exception as e:
+                    print(f"Open box episode close failed (non fatal): {e}")
+            flipped = True
+
+    return flipped
+
+
 def main() -> None:
-    load_dotenv("config.env", override=True)
+    settings = load_settings()
 
-    timezone_name = os.getenv("TIMEZONE", "America/Chicago")
+    timezone_name = settings.timezone
     tz = ZoneInfo(timezone_name)
 
     state = load_state()
     print("Loaded env and state. Starting stock checks...")
 
-    webhook_url = (os.getenv("DISCORD_WEBHOOK_URL") or os.getenv("DISCORD_WEBHOOK") or "").strip()
+    webhook_url = settings.webhook_url
 
     status = None
-    if webhook_url and _env_on("ENABLE_DISCORD_ALERTS", True):
+    if webhook_url and settings.enable_discord_alerts:
         status = DiscordStatusMessage(webhook_url, state_path=STATUS_STATE_PATH)
 
     live_list = None
-    if webhook_url and _env_on("ENABLE_DISCORD_ALERTS", True):
+    if webhook_url and settings.enable_discord_alerts:
         try:
             live_list = DiscordLiveListMessage(webhook_url, state_path="discord_live_list_state.json")
         except Exception as e:
             print(f"Discord live list init failed (non fatal): {e}")
             live_list = None
 
-    start_ts = time.time()
+    publisher = None
+    if status or live_list:
+        publisher = SnapshotPublisher(status=status, live_list=live_list)
 
-    product_count = len(PRODUCTS)
-    store_count = len(STORES)
-    checks_per_cycle = product_count * store_count
+    start_ts = time.time()
 
-    open_box_tracking = _env_on("ENABLE_OPEN_BOX_TRACKING", True)
-    delete_alerts_on_sellout = _env_on("DELETE_DISCORD_ALERTS_ON_SELLOUT", False)
+    catalog = Catalog(
+        products_path=os.getenv("PRODUCTS_FILE", ""),
+        stores_path=os.getenv("STORES_FILE", ""),
+    )
+
+    breaker = None
+    if env_on("ENABLE_CIRCUIT_BREAKER", True):
+        breaker = CircuitBreaker(
+            failure_threshold=env_int("BREAKER_FAILURE_THRESHOLD", 3),
+            base_backoff_seconds=env_float("BREAKER_BASE_BACKOFF_SECONDS", 300.0),
+            max_backoff_seconds=env_float("BREAKER_MAX_BACKOFF_SECONDS", 7200.0),
+        )
+
+    debouncer = None
+    if env_on("ENABLE_ALERT_CONFIRMATION", False) or env_int("FLAP_MAX_FLIPS", 0) > 0:
+        debouncer = AlertDebouncer(
+            confirm=env_on("ENABLE_ALERT_CONFIRMATION", False),
+            flap_max_flips=env_int("FLAP_MAX_FLIPS", 0),
+            flap_window_seconds=env_float("FLAP_WINDOW_SECONDS", 3600.0),
+        )
+
+    # Learned latency threshold carries over between cycles
+    hedge = hedge_policy_from_env()
+    memory = memory_guard_from_env()
+
+    # Opt-in: PROFILE_CYCLES, SIGUSR1 (profile next cycles), SIGUSR2 (dump stacks)
+    profiler = get_profiler()
+    profiler.install_signals()
+
+    deadline_hits_total = collections.Counter()
+    stale_keys = set()
 
     while True:
+        profiler.cycle_start()
+        beat("cycle_start")
+
+        # One snapshot per cycle; config.env is re-read only when it changed on disk
+        previous, settings = settings, refresh_settings()
+        if settings is not previous:
+            print("Settings reloaded from config.env")
+        open_box_tracking = settings.enable_open_box_tracking
+
+        change = catalog.refresh()
+        if change:
+            print(f"Catalog reloaded: {change.summary()}")
+            for sku, store_id in change.removed_keys:
+                state.pop(f"{sku}_{store_id}", None)
+                state.pop(f"ob_{sku}_{store_id}", None)
+                # Re-added later, the key starts a fresh alert episode
+                notify_sold_out(str(sku), store_id)
+                notify_sold_out(f"ob_{sku}", store_id)
+                stale_keys.discard(f"{sku}_{store_id}")
+                if debouncer:
+                    debouncer.forget(f"{sku}_{store_id}")
+                    debouncer.forget(f"ob_{sku}_{store_id}")
+
+        products = catalog.products
+        stores = catalog.stores
+        product_count = len(products)
+        store_count = len(stores)
+        checks_per_cycle = product_count * store_count
+
         cycle_start = now_local_str(tz)
         print(f"\n=== Stock check cycle @ {cycle_start} ===")
+        cycle_t0 = time.monotonic()
+        cycle_counts = collections.Counter()
 
         last_error = None
-        prev_state = dict(state)
 
         new_stock_now_by_key = {}
         new_qty_by_key = {}
         open_box_now_by_key = {}
         open_box_qty_by_key = {}
 
-        driver = build_driver()
+        runner = CheckRunner(
+            open_box_enabled=open_box_tracking, breaker=breaker, hedge=hedge, memory=memory, settings=settings
+        )
 
         try:
-            for product in PRODUCTS:
-                sku = str(product.get("sku", "")).strip()
+            for result in runner.run_cycle(products, stores):
+                product = result.product
+                store_name = result.store_name
+                key = result.key
+                ob_key = result.ob_key
+                cycle_counts[result.status] += 1
+
+                if result.status == UNKNOWN:
+                    # Keep the last known state; a timeout must not look like a sellout
+                    if result.skipped:
+                        line = f"{product.get('name', 'Unknown')} at {store_name}: skipped (circuit open), keeping last state"
+                    else:
+                        msg = f"{product.get('name', 'Unknown')} at {store_name}: {result.error}"
+                        line = f"Stock check error: {msg} (after {result.attempts} attempts, keeping last state)"
+                        last_error = msg[:180]
+                    log_event("check", console=line, **_check_record(result))
 
-                for store_name, store_id in STORES.items():
-                    key = f"{sku}_{store_id}"
-                    ob_key = f"ob_{sku}_{store_id}"
+                    if debouncer and result.recheck:
+                        # Confirmation could not read the page; the edge shows up again next cycle
+                        debouncer.drop(key)
+                        debouncer.drop(ob_key)
 
-                    try:
-                        new_in_stock_now, new_qty_now, ob_available_now, ob_qty_now = check_stock(
-                            driver, product, store_id, open_box_enabled=open_box_tracking
-                        )
-                    except Exception as e:
-                        msg = f"{product.get('name', 'Unknown')} at {store_name}: {e}"
-                        print(f"Stock check error: {msg}")
-                        last_error = msg[:180]
+                    stale_keys.add(key)
+                    new_stock_now_by_key[key] = bool(state.get(key, False))
+                    new_qty_by_key[key] = None
+                    open_box_now_by_key[ob_key] = bool(state.get(ob_key, False))
+                    open_box_qty_by_key[ob_key] = None
+                    continue
 
-                        new_stock_now_by_key[key] = False
-                        new_qty_by_key[key] = None
-                        open_box_now_by_key[ob_key] = False
-                        open_box_qty_by_key[ob_key] = None
-                        continue
+                stale_keys.discard(key)
 
-                    new_stock_now_by_key[key] = bool(new_in_stock_now)
-                    new_qty_by_key[key] = new_qty_now
+                new_in_stock_now = result.new_in_stock
+                new_qty_now = result.new_qty
 
-                    if open_box_tracking:
-                        open_box_now_by_key[ob_key] = bool(ob_available_now)
-                        open_box_qty_by_key[ob_key] = ob_qty_now
-                    else:
-                        open_box_now_by_key[ob_key] = False
-                        open_box_qty_by_key[ob_key] = None
+                new_stock_now_by_key[key] = bool(new_in_stock_now)
+                new_qty_by_key[key] = new_qty_now
 
-                    if new_in_stock_now:
-                        new_str = "IN STOCK" if new_qty_now is None else f"IN STOCK ({new_qty_now})"
-                    else:
-                        new_str = "out of stock"
-
-                    if open_box_tracking:
-                        if open_box_qty_by_key[ob_key] is not None:
-                            ob_str = f"{open_box_qty_by_key[ob_key]} OPEN BOX"
-                        else:
-                            ob_str = "OPEN BOX AVAILABLE" if open_box_now_by_key[ob_key] else "NO OPEN BOX"
-                        print(f"{product.get('name', 'Unknown')} at {store_name}: {new_str}   |   {ob_str}")
+                if open_box_tracking:
+                    open_box_now_by_key[ob_key] = bool(result.open_box_available)
+                    open_box_qty_by_key[ob_key] = result.open_box_qty
+                else:
+                    open_box_now_by_key[ob_key] = False
+                    open_box_qty_by_key[ob_key] = None
+
+                if new_in_stock_now:
+                    new_str = "IN STOCK" if new_qty_now is None else f"IN STOCK ({new_qty_now})"
+                else:
+                    new_str = "out of stock"
+
+                if open_box_tracking:
+                    if open_box_qty_by_key[ob_key] is not None:
+                        ob_str = f"{open_box_qty_by_key[ob_key]} OPEN BOX"
                     else:
-                        print(f"{product.get('name', 'Unknown')} at {store_name}: {new_str}")
+                        ob_str = "OPEN BOX AVAILABLE" if open_box_now_by_key[ob_key] else "NO OPEN BOX"
+                    line = f"{product.get('name', 'Unknown')} at {store_name}: {new_str}   |   {ob_str}"
+                else:
+                    line = f"{product.get('name', 'Unknown')} at {store_name}: {new_str}"
+                log_event("check", console=line, **_check_record(result))
+
+                muted_keys = frozenset()
+                if debouncer:
+                    readings = ((key, new_stock_now_by_key[key]), (ob_key, open_box_now_by_key[ob_key]))
+                    rising = [k for k, now in readings if now and not state.get(k, False)]
+
+                    if result.recheck:
+                        for k, now in readings:
+                            latency = debouncer.resolve(k, now)
+                            if latency is not None and not now:
+                                log_event(
+                                    "alert_suppressed",
+                                    console=f"{product.get('name', 'Unknown')} at {store_name}: {k} did not hold on re-check, alert suppressed",
+                                    key=k, sku=result.sku, store_id=str(result.store_id), confirm_seconds=round(latency, 3),
+                                )
+                    elif debouncer.confirm and rising:
+                        # Hold the edge; the re-check result comes back through this loop
+                        debouncer.hold(rising)
+                        runner.recheck(result)
+                        log_event(
+                            "recheck",
+                            console=f"{product.get('name', 'Unknown')} at {store_name}: possible restock, re-checking before alerting",
+                            keys=rising, sku=result.sku, store_id=str(result.store_id),
+                        )
+                        continue
+
+                    for k, now in readings:
+                        if bool(state.get(k, False)) != now:
+                            debouncer.record_flip(k)
+
+                    muted_keys = frozenset(k for k in rising if debouncer.is_flapping(k))
+                    for _ in muted_keys:
+                        debouncer.note_muted()
+
+                flipped = _apply_transitions(
+                    state,
+                    product=product,
+                    store_name=store_name,
+                    store_id=result.store_id,
+                    new_now=new_stock_now_by_key[key],
+                    new_qty=new_qty_by_key[key],
+                    ob_now=open_box_now_by_key[ob_key],
+                    ob_qty=open_box_qty_by_key[ob_key],
+                    settings=settings,
+                    muted_keys=muted_keys,
+                )
+                if flipped:
+                    save_state(state)
 
         except Exception as e:
             last_error = str(e)[:180]
             print(f"Cycle error: {last_error}")
 
         finally:
-            try:
-                driver.quit()
-            except Exception:
-                pass
-
-        for product in PRODUCTS:
-            sku = str(product.get("sku", "")).strip()
-
-            for store_name, store_id in STORES.items():
-                key = f"{sku}_{store_id}"
-                ob_key = f"ob_{sku}_{store_id}"
-
-                new_now = bool(new_stock_now_by_key.get(key, False))
-                new_before = bool(state.get(key, False))
-
-                if _env_on("ENABLE_NEW_STOCK_ALERTS", True):
-                    if (not new_before) and new_now:
-                        qty = new_qty_by_key.get(key)
-                        print(f"ALERT: {product.get('name', 'Unknown')} is IN STOCK at {store_name}")
-                        notify_all(product=product, store_name=store_name, store_id=store_id, qty=qty)
-
-                state[key] = new_now
-
-                if delete_alerts_on_sellout and _env_on("ENABLE_DISCORD_ALERTS", True):
-                    if new_before and (not new_now):
-                        try:
-                            from discord_alert_tracker import get_message_id, clear_message_id
-                            from discord_alert import delete_discord_message
-
-                            mid = get_message_id(sku=str(sku), store_id=str(store_id))
-                            if mid:
-                                delete_discord_message(str(mid))
-                                clear_message_id(sku=str(sku), store_id=str(store_id))
-                        except Exception as e:
-                            print(f"Sellout delete failed (non fatal): {e}")
-
-                if open_box_tracking and _env_on("ENABLE_OPEN_BOX_ALERTS", True):
-                    ob_now = bool(open_box_now_by_key.get(ob_key, False))
-                    ob_before = bool(state.get(ob_key, False))
-
-                    if (not ob_before) and ob_now:
-                        ob_qty = open_box_qty_by_key.get(ob_key)
-                        print(f"OPEN BOX ALERT: {product.get('name', 'Unknown')} has OPEN BOX at {store_name}")
-                        notify_open_box(product=product, store_name=store_name, store_id=store_id, open_box_qty=ob_qty)
-
-                    state[ob_key] = ob_now
-
-                    if delete_alerts_on_sellout and _env_on("ENABLE_DISCORD_ALERTS", True):
-                        if ob_before and (not ob_now):
-                            try:
-                                from discord_alert_tracker import get_message_id, clear_message_id
-                                from discord_alert import delete_discord_message
-
-                                mid = get_message_id(sku=str("ob_" + str(sku)), store_id=str(store_id))
-                                if mid:
-                                    delete_discord_message(str(mid))
-                                    clear_message_id(sku=str("ob_" + str(sku)), store_id=str(store_id))
-                            except Exception as e:
-                                print(f"Open box sellout delete failed (non fatal): {e}")
-                else:
-                    if ob_key in state:
-                        del state[ob_key]
+            runner.close()
+            if debouncer:
+                debouncer.clear_held()
+
+        if runner.deadline_hits:
+            deadline_hits_total.update(runner.deadline_hits)
+            per_store = ", ".join(
+                f"{catalog.store_name(sid) or sid}: {n} (total {deadline_hits_total[sid]})"
+                for sid, n in sorted(runner.deadline_hits.items())
+            )
+            print(f"Deadline hits this cycle: {per_store}")
+
+        load_summary = LOAD_STATS.summary()
+        if load_summary:
+            print(load_summary)
+        LOAD_STATS.reset()
+
+        profile_summary = PROFILE_STATS.summary()
+        if profile_summary:
+            print(profile_summary)
+        PROFILE_STATS.reset()
+
+        parse_summary = get_parser().summary()
+        if parse_summary:
+            print(parse_summary)
+
+        snapshots = get_snapshot_store()
+        snapshot_summary = snapshots.summary() if snapshots else None
+        if snapshot_summary:
+            print(snapshot_summary)
+
+        memory_summary = memory.summary() if memory else None
+        if memory_summary:
+            print(memory_summary)
+
+        hedge_summary = hedge.summary() if hedge else None
+        if hedge_summary:
+            print(hedge_summary)
+
+        result_cache = get_result_cache()
+        cache_summary = result_cache.summary() if result_cache else None
+        if cache_summary:
+            print(cache_summary)
+
+        router = get_router()
+        delivery_summary = router.summary()
+        if delivery_summary:
+            print(delivery_summary)
+        outbox_summary = router.outbox.summary() if router.outbox else None
+        if outbox_summary:
+            print(outbox_summary)
+
+        limiter = get_limiter()
+        limiter_summary = limiter.summary() if limiter else None
+        if limiter_summary:
+            print(limiter_summary)
+
+        if debouncer:
+            debounce_summary = debouncer.summary()
+            if debounce_summary:
+                print(debounce_summary)
 
         save_state(state)
 
-        if status:
-            uptime_seconds = int(time.time() - start_ts)
-            try:
-                status.update(
+        records = get_record_log()
+        log_event(
+            "cycle",
+            started=cycle_start,
+            seconds=round(time.monotonic() - cycle_t0, 3),
+            checks=sum(cycle_counts.values()),
+            **{status: n for status, n in cycle_counts.items()},
+            last_error=last_error,
+            records_dropped=records.dropped if records else 0,
+            outbox=router.metrics(),
+        )
+
+        if publisher:
+            snapshot = {"last_check_local": cycle_start, "settings": settings}
+
+            if status:
+                snapshot["status"] = dict(
                     running=True,
                     store_label="Multiple Stores",
                     products_count=product_count,
@@ -237,57 +562,33 @@ def main() -> None:
                     checks_per_cycle=checks_per_cycle,
                     last_check_local=cycle_start,
                     last_error=last_error,
-                    uptime_seconds=uptime_seconds,
+                    uptime_seconds=int(time.time() - start_ts),
                     timezone_name=timezone_name,
+                    breakers=breaker.describe(tz) if breaker else None,
+                    memory=memory.describe() if memory else None,
                 )
-            except Exception as e:
-                print(f"Discord status update failed (non fatal): {e}")
-
-        if webhook_url and _env_on("ENABLE_DISCORD_ALERTS", True) and live_list:
-            try:
-                lines = []
-
-                for product in PRODUCTS:
-                    sku = str(product.get("sku", "")).strip()
-                    name_link = _mk_name_link(product)
-
-                    any_in_stock = False
-                    for store_name, store_id in STORES.items():
-                        key = f"{sku}_{store_id}"
-                        if bool(new_stock_now_by_key.get(key, False)):
-                            any_in_stock = True
-                            break
-
-                    status_square = "🟩" if any_in_stock else "🟥"
-                    lines.append(f"{status_square} {name_link}")
 
-                    for store_name, store_id in STORES.items():
-                        key = f"{sku}_{store_id}"
-                        ob_key = f"ob_{sku}_{store_id}"
-
-                        now_in = bool(new_stock_now_by_key.get(key, False))
-                        qty = new_qty_by_key.get(key)
-                        new_part = _fmt_new_stock_line(qty, now_in)
-
-                        if open_box_tracking:
-                            ob_now = bool(open_box_now_by_key.get(ob_key, False))
-                            ob_qty = open_box_qty_by_key.get(ob_key)
-                            ob_part = _fmt_open_box_line(ob_now, ob_qty)
-                            lines.append(f"• {store_name}: {new_part} | {ob_part}")
-                        else:
-                            lines.append(f"• {store_name}: {new_part}")
-
-                    lines.append("")
+            if live_list:
+                # Rendered on the publisher thread; these dicts are rebuilt every cycle
+                snapshot["render_live_blocks"] = functools.partial(
+                    _build_live_blocks,
+                    products,
+                    stores,
+                    new_stock_now_by_key,
+                    new_qty_by_key,
+                    open_box_now_by_key,
+                    open_box_qty_by_key,
+                    open_box_tracking,
+                    frozenset(stale_keys),
+                )
 
-                while lines and lines[-1] == "":
-                    lines.pop()
+            publisher.submit(snapshot)
+            print(publisher.summary())
 
-                live_list.update(lines=lines, last_check_local=cycle_start)
-            except Exception as e:
-                print(f"Discord live list update failed (non fatal): {e}")
+        profiler.cycle_end()
 
         print(f"Sleeping for {POLL_SECONDS} seconds...\n")
-        time.sleep(POLL_SECONDS)
+        _sleep_with_heartbeat(POLL_SECONDS)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,178 @@
+# memory_guard.py
+#
+# Keeps headless Chrome inside a memory budget on small hosts:
+# - Samples the RSS of each browser's process tree (chromedriver + Chrome) between checks,
+#   one sample per live browser (keyed by its root pid); dropped when the browser goes
+# - Recycles a browser before it crosses BROWSER_MEMORY_BUDGET_MB, or the largest one
+#   when all browsers together approach HOST_MEMORY_BUDGET_MB
+# - Holds back new browsers while the host has less than MIN_AVAILABLE_MEMORY_MB free
+# - Per-browser memory and recycle counts are kept for the cycle summary and status message
+
+from __future__ import annotations
+
+import collections
+import threading
+import time
+
+from config import env_float, env_int, env_on
+from procutil import tree_rss_bytes
+
+
+MB = 1024 * 1024
+PAUSE_POLL_SECONDS = 1.0
+
+
+def host_available_bytes() -> int | None:
+    """
+    MemAvailable from /proc/meminfo, None where it is not available.
+    """
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class MemoryGuard:
+    def __init__(
+        self,
+        browser_budget_mb: float = 1500.0,
+        host_budget_mb: float = 0.0,
+        min_available_mb: float = 300.0,
+        recycle_at: float = 0.9,
+        max_pause_seconds: float = 60.0,
+    ):
+        self.browser_budget = browser_budget_mb * MB
+        self.host_budget = host_budget_mb * MB
+        self.min_available = min_available_mb * MB
+        self.recycle_at = recycle_at
+        self.max_pause_seconds = max_pause_seconds
+
+        self._lock = threading.Lock()
+        # "chrome:<pid>" / "browser:<pid>" -> latest RSS; peaks are kept per kind
+        self._rss: dict[str, int] = {}
+        self._peak: dict[str, int] = {}
+        self.recycles: collections.Counter[str] = collections.Counter()
+        self.pauses = 0
+        self.pause_seconds = 0.0
+
+    @staticmethod
+    def _name(kind: str, root_pid: int | None) -> str:
+        return f"{kind}:{root_pid}"
+
+    def sample(self, kind: str, root_pid: int | None) -> int:
+        rss = tree_rss_bytes(root_pid)
+        with self._lock:
+            self._rss[self._name(kind, root_pid)] = rss
+            self._peak[kind] = max(self._peak.get(kind, 0), rss)
+        return rss
+
+    def forget(self, kind: str, root_pid: int | None) -> None:
+        """
+        Drops the sample of a browser that was closed, so it stops counting
+        toward the host total.
+        """
+        with self._lock:
+            self._rss.pop(self._name(kind, root_pid), None)
+
+    def check(self, kind: str, root_pid: int | None) -> str | None:
+        """
+        Samples one browser; returns why it should be recycled now, or None.
+        """
+        rss = self.sample(kind, root_pid)
+        name = self._name(kind, root_pid)
+
+        if self.browser_budget > 0 and rss >= self.recycle_at * self.browser_budget:
+            reason = "browser budget"
+        else:
+            with self._lock:
+                total = sum(self._rss.values())
+                largest = max(self._rss, key=self._rss.get) if self._rss else None
+            if not (self.host_budget > 0 and total >= self.recycle_at * self.host_budget and largest == name):
+                return None
+            reason = "host budget"
+
+        with self._lock:
+            self.recycles[reason] += 1
+        print(f"[memory_guard] recycling {name}: {rss / MB:.0f} MB ({reason})")
+        return reason
+
+    def memory_tight(self) -> bool:
+        available = host_available_bytes()
+        return available is not None and self.min_available > 0 and available < self.min_available
+
+    def wait_for_memory(self, what: str = "browser", on_wait=None) -> None:
+        """
+        Called before starting a browser: waits (up to max_pause_seconds) while the
+        host is below MIN_AVAILABLE_MEMORY_MB, then starts it anyway.
+        on_wait() is called on every poll (the caller's heartbeat).
+        """
+        if not self.memory_tight():
+            return
+
+        t0 = time.monotonic()
+        print(f"[memory_guard] host memory low, holding new {what}")
+        while self.memory_tight() and time.monotonic() - t0 < self.max_pause_seconds:
+            if on_wait is not None:
+                on_wait()
+            time.sleep(PAUSE_POLL_SECONDS)
+
+        with self._lock:
+            self.pauses += 1
+            self.pause_seconds += time.monotonic() - t0
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "browsers_mb": {k: round(v / MB, 1) for k, v in self._rss.items()},
+                "peak_mb": {k: round(v / MB, 1) for k, v in self._peak.items()},
+                "total_mb": round(sum(self._rss.values()) / MB, 1),
+                "recycles": dict(self.recycles),
+                "pauses": self.pauses,
+                "pause_seconds": round(self.pause_seconds, 1),
+            }
+
+    def describe(self) -> str:
+        """
+        One line for the Discord status message.
+        """
+        m = self.metrics()
+        recycled = sum(m["recycles"].values())
+        peak = max(m["peak_mb"].values(), default=0.0)
+        return f"{len(m['browsers_mb'])} browser(s), {m['total_mb']:.0f} MB (peak {peak:.0f}), {recycled} recycled"
+
+    def summary(self) -> str | None:
+        m = self.metrics()
+        if not m["peak_mb"] and not m["recycles"] and not m["pauses"]:
+            return None
+
+        # Browsers live for one cycle, so after close() only the peaks are left
+        per_browser = ", ".join(f"{k} {v:.0f} MB" for k, v in sorted(m["browsers_mb"].items()))
+        peaks = ", ".join(f"{k} {v:.0f} MB" for k, v in sorted(m["peak_mb"].items()))
+        available = host_available_bytes()
+        line = f"Browser memory: {per_browser or 'none running'}; total {m['total_mb']:.0f} MB; peak {peaks or 'n/a'}"
+        if available is not None:
+            line += f", host available {available / MB:.0f} MB"
+        if m["recycles"]:
+            line += "; recycled " + ", ".join(f"{n} for {r}" for r, n in sorted(m["recycles"].items()))
+        if m["pauses"]:
+            line += f"; new browsers held {m['pauses']}x ({m['pause_seconds']:.1f}s)"
+        return line
+
+
+def memory_guard_from_env() -> MemoryGuard | None:
+    """
+    ENABLE_MEMORY_GUARD=0 returns None.
+    """
+    if not env_on("ENABLE_MEMORY_GUARD", True):
+        return None
+    return MemoryGuard(
+        browser_budget_mb=env_float("BROWSER_MEMORY_BUDGET_MB", 1500.0),
+        host_budget_mb=env_float("HOST_MEMORY_BUDGET_MB", 0.0),
+        min_available_mb=env_float("MIN_AVAILABLE_MEMORY_MB", 300.0),
+        recycle_at=env_float("MEMORY_RECYCLE_AT", 0.9),
+        max_pause_seconds=env_int("MEMORY_PAUSE_MAX_SECONDS", 60),
+    )
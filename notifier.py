@@ -1,15 +1,7 @@
 # notifier.py
 
-import os
-import discord_alert
-import email_alert
-
-
-def _env_on(name: str, default: bool = True) -> bool:
-    raw = (os.getenv(name) or "").strip().lower()
-    if raw == "":
-        return default
-    return raw in {"1", "true", "yes", "y", "on"}
+from alert_router import get_router
+from config import Settings, get_settings
 
 
 def notify_all(
@@ -17,12 +9,21 @@ def notify_all(
     store_name: str,
     store_id: str,
     qty: int | None = None,
+    settings: Settings | None = None,
 ) -> None:
-    if _env_on("ENABLE_DISCORD_ALERTS", True) and _env_on("ENABLE_NEW_STOCK_ALERTS", True):
-        discord_alert.send_discord_alert(product, store_name, store_id, qty=qty)
+    # Queued per destination (see alert_router); returns without waiting for delivery
+    settings = settings or get_settings()
+    if not settings.enable_new_stock_alerts:
+        return
 
-    if _env_on("ENABLE_EMAIL_ALERTS", True) and _env_on("ENABLE_NEW_STOCK_ALERTS", True):
-        email_alert.send_email_alert(product, store_name, store_id, qty=qty)
+    get_router().notify(
+        product,
+        store_name,
+        store_id,
+        qty=qty,
+        discord=settings.enable_discord_alerts,
+        email=settings.enable_email_alerts,
+    )
 
 
 def notify_open_box(
@@ -30,10 +31,20 @@ def notify_open_box(
     store_name: str,
     store_id: str,
     open_box_qty: int | None = None,
+    settings: Settings | None = None,
 ) -> None:
-    if not _env_on("ENABLE_DISCORD_ALERTS", True):
+    settings = settings or get_settings()
+    if not settings.enable_discord_alerts:
         return
-    if not _env_on("ENABLE_OPEN_BOX_ALERTS", True):
+    if not settings.enable_open_box_alerts:
         return
 
-    discord_alert.send_open_box_alert(product, store_name, store_id, open_box_qty=open_box_qty)
+    get_router().notify(product, store_name, store_id, qty=open_box_qty, open_box=True, email=False)
+
+
+def notify_sold_out(tracker_sku: str, store_id: str, delete: bool = False) -> None:
+    """
+    tracker_sku ("ob_"-prefixed for open box) sold out at store_id: ends its alert
+    episode and, with delete=True, deletes the alert on every webhook it went to.
+    """
+    get_router().sold_out(tracker_sku, store_id, delete=delete)
@@ -0,0 +1,217 @@
+# page_parser.py
+#
+# Stock extraction from product page HTML, plus an optional process pool for it:
+# - parse_stock() is the pure function; the inline and pooled paths both run it,
+#   so results are identical
+# - PARSE_MODE=pool runs it in PARSE_WORKERS spawned processes, so the regex work
+#   does not hold the GIL while browser worker threads wait on it
+# - Pool workers are persistent (started once, reused every cycle) and the page
+#   crosses the pipe as one UTF-8 bytes payload
+# - Parse time per page is recorded for both modes
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+
+from config import env_int
+
+
+IN_STOCK_MARKERS = (
+    "'inStock':'True'",
+    '"inStock":"True"',
+    '"inStock":true',
+    '"inStock": true',
+)
+
+
+def to_text(page_source: str) -> str:
+    if not page_source:
+        return ""
+
+    s = re.sub(r"(?is)<script.*?>.*?</script>", " ", page_source)
+    s = re.sub(r"(?is)<style.*?>.*?</style>", " ", s)
+    s = re.sub(r"(?is)<[^>]+>", " ", s)
+
+    s = s.replace("&nbsp;", " ")
+    s = s.replace("&amp;", "&")
+
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+
+def _extract_new_qty(page_source: str) -> int | None:
+    """
+    Extracts:
+      9 NEW IN STOCK
+      25+ NEW IN STOCK
+    Returns integer (25 for 25+).
+    """
+    if not page_source:
+        return None
+
+    pattern_html = (
+        r"(\d+)\s*\+?\s*"
+        r"(?:<[^>]+>\s*)*NEW\s*"
+        r"(?:<[^>]+>\s*)*IN\s*"
+        r"(?:<[^>]+>\s*)*STOCK"
+    )
+
+    m = re.search(pattern_html, page_source, flags=re.IGNORECASE | re.DOTALL)
+    if m:
+        try:
+            return int(m.group(1))
+        except Exception:
+            return None
+
+    t = to_text(page_source)
+    m2 = re.search(r"\b(\d+)\s*\+?\s*NEW\s+IN\s+STOCK\b", t, flags=re.IGNORECASE)
+    if m2:
+        try:
+            return int(m2.group(1))
+        except Exception:
+            return None
+
+    return None
+
+
+def _extract_open_box_info(page_source: str) -> tuple[int | None, bool]:
+    """
+    Open box is considered available only if the page shows an offer line like:
+      Open Box: from ...
+      1 Open Box: from ...
+
+    This avoids false positives from hidden text.
+    """
+    t = to_text(page_source)
+    if not t:
+        return None, False
+
+    offer_near = re.search(r"\bOpen\s*Box\b.{0,80}\bfrom\b", t, flags=re.IGNORECASE)
+    if not offer_near:
+        return None, False
+
+    m_qty = re.search(r"\b(\d+)\s+Open\s*Box\b", t, flags=re.IGNORECASE)
+    if m_qty:
+        try:
+            return int(m_qty.group(1)), True
+        except Exception:
+            return None, True
+
+    return None, True
+
+
+def parse_stock(page_source: str, open_box_enabled: bool = True) -> tuple[bool, int | None, bool, int | None]:
+    """
+    Returns:
+      (new_in_stock_bool, new_qty_or_none, open_box_available_bool, open_box_qty_or_none)
+    """
+    new_in_stock = any(marker in page_source for marker in IN_STOCK_MARKERS)
+    new_qty = _extract_new_qty(page_source) if new_in_stock else None
+
+    if open_box_enabled:
+        open_box_qty, open_box_available = _extract_open_box_info(page_source)
+    else:
+        open_box_qty, open_box_available = None, False
+
+    return bool(new_in_stock), new_qty, bool(open_box_available), open_box_qty
+
+
+def _parse_bytes(page: bytes, open_box_enabled: bool) -> tuple[bool, int | None, bool, int | None]:
+    return parse_stock(page.decode("utf-8", errors="replace"), open_box_enabled)
+
+
+class PageParser:
+    """
+    mode "inline" parses on the calling thread; "pool" hands pages to a
+    ProcessPoolExecutor. A broken pool falls back to inline parsing.
+    """
+
+    def __init__(self, mode: str = "inline", workers: int = 0):
+        self.mode = mode if mode in {"inline", "pool"} else "inline"
+        self.workers = max(1, workers or (os.cpu_count() or 1))
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pages = 0
+        self._chars = 0
+        self._seconds = 0.0
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                # spawn, not fork: the parent has browser and websocket threads running
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def parse(self, page_source: str, open_box_enabled: bool = True) -> tuple[bool, int | None, bool, int | None]:
+        t0 = time.perf_counter()
+
+        result = None
+        if self.mode == "pool":
+            try:
+                page = page_source.encode("utf-8", errors="replace")
+                result = self._get_pool().submit(_parse_bytes, page, open_box_enabled).result()
+            except Exception as e:
+                print(f"[page_parser] pool parse failed, parsing inline (non fatal): {e}")
+                with self._lock:
+                    self._pool = None
+                    self.mode = "inline"
+
+        if result is None:
+            result = parse_stock(page_source, open_box_enabled)
+
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self._pages += 1
+            self._chars += len(page_source)
+            self._seconds += elapsed
+        return result
+
+    def summary(self, reset: bool = True) -> str | None:
+        with self._lock:
+            if not self._pages:
+                return None
+            label = f"pool x{self.workers}" if self.mode == "pool" else "inline"
+            line = (
+                f"Parsing ({label}): {self._pages} pages, {self._chars / (1024 * 1024):.1f}M chars, "
+                f"avg {1000.0 * self._seconds / self._pages:.1f} ms/page"
+            )
+            if reset:
+                self._pages = 0
+                self._chars = 0
+                self._seconds = 0.0
+            return line
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_PARSER: PageParser | None = None
+_PARSER_LOCK = threading.Lock()
+
+
+def get_parser() -> PageParser:
+    """
+    Process-wide parser built from env on first use (after config.env is loaded).
+    PARSE_MODE=inline (default) or pool, PARSE_WORKERS=0 means one per CPU.
+    """
+    global _PARSER
+    with _PARSER_LOCK:
+        if _PARSER is None:
+            _PARSER = PageParser(
+                mode=(os.getenv("PARSE_MODE") or "inline").strip().lower(),
+                workers=env_int("PARSE_WORKERS", 0),
+            )
+        return _PARSER
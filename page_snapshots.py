@@ -0,0 +1,345 @@
+# page_snapshots.py
+#
+# Page snapshots for debugging false alerts (SNAPSHOT_DIR, off when empty):
+# - Each checked page is reduced to its inventory region (text around the stock and
+#   open box markers) and hashed; a snapshot is kept only when that hash changes for
+#   the (SKU, store), or when the parse looks wrong (in stock without a quantity)
+# - Pages are stored gzip-compressed under their content hash, so identical pages
+#   are kept once no matter how many keys point at them
+# - Stored pages are capped at SNAPSHOT_MAX_MB; the least recently used are evicted
+#
+# Usage:
+#   python page_snapshots.py list [--sku SKU] [--store ID] [--limit N]
+#   python page_snapshots.py show ID [--region] [--out FILE]
+#   python page_snapshots.py stats
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from config import env_int
+from page_parser import IN_STOCK_MARKERS, to_text
+
+
+REGION_WINDOW = 400
+
+_REGION_PATTERNS = (
+    re.compile(r"""['"]inStock['"]\s*:\s*['"]?\w+""", re.IGNORECASE),
+    re.compile(r"NEW\s*(?:<[^>]+>\s*)*IN\s*(?:<[^>]+>\s*)*STOCK", re.IGNORECASE),
+    re.compile(r"Open\s*Box", re.IGNORECASE),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sku TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    region_hash TEXT NOT NULL,
+    page_hash TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    result TEXT NOT NULL,
+    region TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_key ON snapshots (sku, store_id, taken_at);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS latest (
+    sku TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    region_hash TEXT NOT NULL,
+    PRIMARY KEY (sku, store_id)
+);
+"""
+
+
+def inventory_region(page_source: str) -> str:
+    """
+    Visible text around every stock / open box marker, so tokens and timestamps
+    elsewhere on the page do not count as a change.
+    """
+    spans = []
+    for pattern in _REGION_PATTERNS:
+        for m in pattern.finditer(page_source):
+            spans.append((max(0, m.start() - REGION_WINDOW), m.end() + REGION_WINDOW))
+    if not spans:
+        return ""
+
+    spans.sort()
+    merged = [list(spans[0])]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    parts = []
+    for start, end in merged:
+        chunk = page_source[start:end]
+        parts.extend(marker for marker in IN_STOCK_MARKERS if marker in chunk)
+        parts.append(to_text(chunk))
+    return "\n".join(parts)
+
+
+def _anomaly(result: tuple) -> str | None:
+    new_in_stock, new_qty, open_box_available, open_box_qty = result
+    if new_in_stock and new_qty is None:
+        return "in stock without quantity"
+    if open_box_qty is not None and not open_box_available:
+        return "open box quantity without offer"
+    return None
+
+
+class SnapshotStore:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+        self.evicted = 0
+
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.root, "index.db"), timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _blob_path(self, page_hash: str) -> str:
+        return os.path.join(self.root, "objects", page_hash[:2], page_hash[2:] + ".html.gz")
+
+    def observe(self, sku: str, store_id: str, page_source: str, result: tuple) -> int | None:
+        """
+        Called for every parsed page. Returns the snapshot id if one was stored.
+        """
+        region = inventory_region(page_source)
+        region_hash = hashlib.sha256(region.encode("utf-8")).hexdigest()
+        anomaly = _anomaly(result)
+
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT region_hash FROM latest WHERE sku = ? AND store_id = ?", (sku, store_id)
+        ).fetchone()
+        changed = row is None or row[0] != region_hash
+        if not changed and not anomaly:
+            return None
+
+        conn.execute(
+            "INSERT OR REPLACE INTO latest (sku, store_id, region_hash) VALUES (?, ?, ?)",
+            (sku, store_id, region_hash),
+        )
+        if not changed and self._has_recent(sku, store_id, region_hash, anomaly):
+            return None
+
+        page = page_source.encode("utf-8")
+        page_hash = hashlib.sha256(page).hexdigest()
+        self._put_blob(page_hash, page)
+
+        reason = ("first seen" if row is None else "region changed") if changed else f"anomaly: {anomaly}"
+        if changed and anomaly:
+            reason += f", anomaly: {anomaly}"
+        cur = conn.execute(
+            "INSERT INTO snapshots (sku, store_id, taken_at, region_hash, page_hash, reason, result, region) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (sku, store_id, time.time(), region_hash, page_hash, reason, json.dumps(list(result)), region),
+        )
+        self._evict()
+        return cur.lastrowid
+
+    def _has_recent(self, sku: str, store_id: str, region_hash: str, anomaly: str) -> bool:
+        # An anomaly on an unchanged region is kept once, not on every check
+        return self._conn().execute(
+            "SELECT 1 FROM snapshots WHERE sku = ? AND store_id = ? AND region_hash = ? AND reason LIKE ?",
+            (sku, store_id, region_hash, f"%anomaly: {anomaly}%"),
+        ).fetchone() is not None
+
+    def _put_blob(self, page_hash: str, page: bytes) -> None:
+        conn = self._conn()
+        now = time.time()
+        if conn.execute("UPDATE blobs SET last_used = ? WHERE hash = ?", (now, page_hash)).rowcount:
+            with self._lock:
+                self.deduplicated += 1
+            return
+
+        path = self._blob_path(page_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(gzip.compress(page, compresslevel=6))
+        os.replace(tmp, path)
+
+        conn.execute(
+            "INSERT OR REPLACE INTO blobs (hash, size, last_used) VALUES (?, ?, ?)",
+            (page_hash, os.path.getsize(path), now),
+        )
+        with self._lock:
+            self.stored += 1
+
+    def _evict(self) -> None:
+        if self.max_bytes <= 0:
+            return
+        conn = self._conn()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for page_hash, size in conn.execute("SELECT hash, size FROM blobs ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._blob_path(page_hash))
+            except FileNotFoundError:
+                pass
+            conn.execute("DELETE FROM blobs WHERE hash = ?", (page_hash,))
+            conn.execute("DELETE FROM snapshots WHERE page_hash = ?", (page_hash,))
+            total -= size
+            with self._lock:
+                self.evicted += 1
+
+    def list(self, sku: str | None = None, store_id: str | None = None, limit: int = 50) -> list[tuple]:
+        sql = "SELECT id, sku, store_id, taken_at, reason, result, page_hash FROM snapshots"
+        where, args = [], []
+        if sku:
+            where.append("sku = ?")
+            args.append(sku)
+        if store_id:
+            where.append("store_id = ?")
+            args.append(store_id)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY taken_at DESC LIMIT ?"
+        return self._conn().execute(sql, (*args, limit)).fetchall()
+
+    def get(self, snapshot_id: int) -> tuple[dict, str] | None:
+        """
+        Returns (metadata, page html) and marks the page as recently used.
+        """
+        row = self._conn().execute(
+            "SELECT sku, store_id, taken_at, reason, result, page_hash, region FROM snapshots WHERE id = ?",
+            (snapshot_id,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        meta = dict(zip(("sku", "store_id", "taken_at", "reason", "result", "page_hash", "region"), row))
+        with gzip.open(self._blob_path(meta["page_hash"]), "rb") as f:
+            page = f.read().decode("utf-8", errors="replace")
+        self._conn().execute("UPDATE blobs SET last_used = ? WHERE hash = ?", (time.time(), meta["page_hash"]))
+        return meta, page
+
+    def stats(self) -> dict:
+        conn = self._conn()
+        blobs, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        snapshots, keys = conn.execute("SELECT COUNT(*), COUNT(DISTINCT sku || '_' || store_id) FROM snapshots").fetchone()
+        return {"snapshots": snapshots, "keys": keys, "pages": blobs, "bytes": size, "max_bytes": self.max_bytes}
+
+    def summary(self) -> str | None:
+        with self._lock:
+            stored, dedup, evicted = self.stored, self.deduplicated, self.evicted
+            self.stored = self.deduplicated = self.evicted = 0
+        if not (stored or dedup or evicted):
+            return None
+        s = self.stats()
+        return (
+            f"Page snapshots: {stored} stored, {dedup} deduplicated, {evicted} evicted; "
+            f"{s['pages']} pages, {s['bytes'] / (1024 * 1024):.1f} of {s['max_bytes'] / (1024 * 1024):.0f} MB"
+        )
+
+
+_STORE: SnapshotStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_snapshot_store() -> SnapshotStore | None:
+    """
+    Process-wide store built from env on first use (after config.env is loaded).
+    Returns None when SNAPSHOT_DIR is empty.
+    """
+    global _STORE
+    root = (os.getenv("SNAPSHOT_DIR") or "").strip()
+    if not root:
+        return None
+
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = SnapshotStore(root, max_bytes=env_int("SNAPSHOT_MAX_MB", 200) * 1024 * 1024)
+        return _STORE
+
+
+def main() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv("config.env", override=True)
+
+    ap = argparse.ArgumentParser(description="Browse stored page snapshots")
+    ap.add_argument("--dir", default=None, help="snapshot directory (default: SNAPSHOT_DIR)")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    ls = sub.add_parser("list")
+    ls.add_argument("--sku")
+    ls.add_argument("--store")
+    ls.add_argument("--limit", type=int, default=50)
+
+    show = sub.add_parser("show")
+    show.add_argument("id", type=int)
+    show.add_argument("--region", action="store_true", help="print the inventory region instead of the page")
+    show.add_argument("--out", help="write the page to this file")
+
+    sub.add_parser("stats")
+    args = ap.parse_args()
+
+    root = args.dir or (os.getenv("SNAPSHOT_DIR") or "").strip()
+    if not root or not os.path.exists(os.path.join(root, "index.db")):
+        raise SystemExit("No snapshot store found (set SNAPSHOT_DIR or pass --dir)")
+    store = SnapshotStore(root, max_bytes=env_int("SNAPSHOT_MAX_MB", 200) * 1024 * 1024)
+
+    if args.command == "list":
+        for sid, sku, store_id, taken_at, reason, result, page_hash in store.list(args.sku, args.store, args.limit):
+            stamp = datetime.fromtimestamp(taken_at).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{sid:>6}  {stamp}  sku {sku} store {store_id}  {result}  {reason}  {page_hash[:12]}")
+
+    elif args.command == "show":
+        found = store.get(args.id)
+        if found is None:
+            raise SystemExit(f"No snapshot {args.id}")
+        meta, page = found
+        if args.region:
+            print(meta["region"])
+        elif args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                f.write(page)
+            print(f"Wrote {len(page)} chars to {args.out} (sku {meta['sku']}, store {meta['store_id']}, {meta['reason']})")
+        else:
+            sys.stdout.write(page)
+
+    else:
+        s = store.stats()
+        print(
+            f"{s['snapshots']} snapshots of {s['keys']} keys, {s['pages']} unique pages, "
+            f"{s['bytes'] / (1024 * 1024):.1f} of {s['max_bytes'] / (1024 * 1024):.0f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
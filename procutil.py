@@ -0,0 +1,118 @@
+# procutil.py
+#
+# Process tree helpers based on /proc (Linux). No psutil dependency.
+# On platforms without /proc these return empty results instead of raising.
+
+from __future__ import annotations
+
+import os
+import signal
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _read_stat(pid: int) -> tuple[str, int] | None:
+    """
+    Returns (comm, ppid) for a pid, or None if it is gone.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="utf-8", errors="replace") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    # comm is wrapped in parens and may contain spaces
+    lpar = data.find("(")
+    rpar = data.rfind(")")
+    if lpar < 0 or rpar < 0:
+        return None
+
+    comm = data[lpar + 1:rpar]
+    fields = data[rpar + 2:].split()
+    try:
+        return comm, int(fields[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def all_pids() -> list[int]:
+    try:
+        return [int(p) for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return []
+
+
+def tree_pids(root_pid: int | None) -> list[int]:
+    """
+    Returns root_pid plus all of its descendants.
+    """
+    if not root_pid:
+        return []
+
+    children: dict[int, list[int]] = {}
+    for pid in all_pids():
+        st = _read_stat(pid)
+        if st is None:
+            continue
+        children.setdefault(st[1], []).append(pid)
+
+    out = []
+    stack = [int(root_pid)]
+    while stack:
+        pid = stack.pop()
+        out.append(pid)
+        stack.extend(children.get(pid, []))
+    return out
+
+
+def rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm", "r", encoding="utf-8") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def tree_rss_bytes(root_pid: int | None) -> int:
+    return sum(rss_bytes(pid) for pid in tree_pids(root_pid))
+
+
+def pids_with_env(name: str, value: str) -> list[int]:
+    """
+    Returns the pids whose environment has name=value. Children inherit the
+    environment, so this finds a process's descendants even after they were
+    orphaned or started their own session. Other users' processes are skipped.
+    """
+    needle = f"{name}={value}".encode("utf-8")
+    out = []
+    for pid in all_pids():
+        try:
+            with open(f"/proc/{pid}/environ", "rb") as f:
+                if needle in f.read().split(b"\0"):
+                    out.append(pid)
+        except OSError:
+            continue
+    return out
+
+
+def kill_pids(pids: list[int], sig: int = getattr(signal, "SIGKILL", signal.SIGTERM)) -> int:
+    """
+    Sends sig to each pid in order. Returns how many processes were signalled.
+    """
+    killed = 0
+    for pid in pids:
+        try:
+            os.kill(pid, sig)
+            killed += 1
+        except (ProcessLookupError, PermissionError):
+            pass
+    return killed
+
+
+def kill_tree(root_pid: int | None, sig: int = getattr(signal, "SIGKILL", signal.SIGTERM)) -> int:
+    """
+    Sends sig to root_pid and every descendant, leaves first.
+    Returns how many processes were signalled.
+    """
+    return kill_pids(list(reversed(tree_pids(root_pid))), sig)
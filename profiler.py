@@ -0,0 +1,234 @@
+# profiler.py
+#
+# Opt-in profiling for the long-running main loop:
+# - cProfile of the next N cycles (PROFILE_CYCLES at startup, or SIGUSR1 at runtime).
+#   Before Python 3.12 worker threads get their own profile (cProfile only sees the
+#   calling thread) and everything is merged into one report; from 3.12 cProfile is
+#   built on sys.monitoring and the main profile already covers every thread
+# - tracemalloc snapshots diffed cycle to cycle while a capture runs, to catch
+#   growth in state dicts or retained page_source strings
+# - SIGUSR2 dumps the stacks of all threads
+# - Output goes to timestamped files in PROFILE_DIR, oldest removed beyond PROFILE_KEEP
+# - While no capture runs the hooks are a bool check
+
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import signal
+import sys
+import threading
+import traceback
+import tracemalloc
+from datetime import datetime
+
+from config import env_int, env_on
+
+
+TRACEMALLOC_FRAMES = 10
+TOP_LINES = 40
+
+
+class Profiler:
+    def __init__(self, out_dir: str = "profiles", keep: int = 20, signal_cycles: int = 3, use_tracemalloc: bool = True):
+        self.out_dir = out_dir
+        self.keep = max(1, keep)
+        self.signal_cycles = max(1, signal_cycles)
+        self.use_tracemalloc = use_tracemalloc
+
+        self.active = False
+        self._remaining = 0
+        self._armed = 0
+        self._cycle = 0
+        self._lock = threading.Lock()
+
+        self._main_profile: cProfile.Profile | None = None
+        self._thread_profiles: list[cProfile.Profile] = []
+        self._prev_snapshot = None
+        self._stamp = ""
+
+    def arm(self, cycles: int) -> None:
+        """
+        Captures the next `cycles` cycles, starting at the next cycle_start().
+        """
+        self._armed = max(self._armed, int(cycles))
+
+    def install_signals(self) -> None:
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda *_: self._on_arm_signal())
+        if hasattr(signal, "SIGUSR2"):
+            signal.signal(signal.SIGUSR2, lambda *_: self.dump_stacks())
+
+    def _on_arm_signal(self) -> None:
+        print(f"[profiler] SIGUSR1: profiling the next {self.signal_cycles} cycle(s)")
+        self.arm(self.signal_cycles)
+
+    def wrap(self, target):
+        """
+        Wraps a thread target so it is profiled while a capture runs.
+        Returns target unchanged otherwise.
+        """
+        if not self.active or sys.version_info >= (3, 12):
+            # 3.12+: a second profiler raises "Another profiling tool is already active"
+            return target
+
+        def run(*args, **kwargs):
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except Exception as e:
+                print(f"[profiler] could not profile {threading.current_thread().name} (non fatal): {e}")
+                return target(*args, **kwargs)
+            try:
+                return target(*args, **kwargs)
+            finally:
+                prof.disable()
+                with self._lock:
+                    self._thread_profiles.append(prof)
+
+        return run
+
+    def cycle_start(self) -> None:
+        self._cycle += 1
+        if not self.active and self._armed:
+            self._begin(self._armed)
+            self._armed = 0
+
+        if self.active:
+            self._main_profile.enable()
+
+    def cycle_end(self) -> None:
+        if not self.active:
+            return
+
+        self._main_profile.disable()
+        self._snapshot_diff()
+
+        self._remaining -= 1
+        if self._remaining <= 0:
+            self._finish()
+
+    def _begin(self, cycles: int) -> None:
+        self.active = True
+        self._remaining = cycles
+        self._stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self._main_profile = cProfile.Profile()
+        self._thread_profiles = []
+        print(f"[profiler] capturing {cycles} cycle(s) into {self.out_dir}")
+
+        if self.use_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._prev_snapshot = tracemalloc.take_snapshot()
+
+    def _snapshot_diff(self) -> None:
+        if not (self.use_tracemalloc and tracemalloc.is_tracing()):
+            return
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+        current, peak = tracemalloc.get_traced_memory()
+
+        lines = [
+            f"cycle {self._cycle}: traced {current / 1024:.0f} KB (peak {peak / 1024:.0f} KB)",
+            f"top {TOP_LINES} allocation changes since the previous snapshot:",
+            "",
+        ]
+        for stat in snapshot.compare_to(self._prev_snapshot, "lineno")[:TOP_LINES]:
+            lines.append(str(stat))
+
+        self._write(f"{self._stamp}-tracemalloc-cycle{self._cycle}.txt", "\n".join(lines) + "\n")
+        self._prev_snapshot = snapshot
+
+    def _finish(self) -> None:
+        self.active = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._prev_snapshot = None
+
+        with self._lock:
+            profiles = [self._main_profile, *self._thread_profiles]
+            self._thread_profiles = []
+
+        stats = None
+        for prof in profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(prof)
+                else:
+                    stats.add(prof)
+            except TypeError:
+                # Profile that never ran any code
+                continue
+
+        if stats is None:
+            return
+
+        path = self._path(f"{self._stamp}-cycles.prof")
+        os.makedirs(self.out_dir, exist_ok=True)
+        stats.dump_stats(path)
+
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(TOP_LINES)
+        self._write(f"{self._stamp}-cycles.txt", out.getvalue())
+        print(f"[profiler] wrote {path} ({len(profiles)} thread profile(s) merged)")
+
+    def dump_stacks(self) -> str:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        lines = [f"stacks at {datetime.now().isoformat(timespec='seconds')}", ""]
+        for ident, frame in sys._current_frames().items():
+            lines.append(f"--- thread {names.get(ident, '?')} ({ident}) ---")
+            lines.extend(line.rstrip("\n") for line in traceback.format_stack(frame))
+            lines.append("")
+
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-stacks.txt"
+        self._write(name, "\n".join(lines))
+        print(f"[profiler] wrote {self._path(name)}")
+        return self._path(name)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.out_dir, name)
+
+    def _write(self, name: str, text: str) -> None:
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            with open(self._path(name), "w", encoding="utf-8") as f:
+                f.write(text)
+        except OSError as e:
+            print(f"[profiler] could not write {name} (non fatal): {e}")
+            return
+        self._prune()
+
+    def _prune(self) -> None:
+        try:
+            entries = [os.path.join(self.out_dir, n) for n in os.listdir(self.out_dir)]
+            entries = sorted((p for p in entries if os.path.isfile(p)), key=os.path.getmtime)
+            for path in entries[:-self.keep]:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+_PROFILER: Profiler | None = None
+
+
+def get_profiler() -> Profiler:
+    """
+    Process-wide profiler built from env on first use (after config.env is loaded).
+    PROFILE_CYCLES=N captures the first N cycles; SIGUSR1 always arms a capture.
+    """
+    global _PROFILER
+    if _PROFILER is None:
+        _PROFILER = Profiler(
+            out_dir=(os.getenv("PROFILE_DIR") or "profiles").strip(),
+            keep=env_int("PROFILE_KEEP", 20),
+            signal_cycles=env_int("PROFILE_SIGNAL_CYCLES", 3),
+            use_tracemalloc=env_on("PROFILE_TRACEMALLOC", True),
+        )
+        startup_cycles = env_int("PROFILE_CYCLES", 0)
+        if startup_cycles > 0:
+            _PROFILER.arm(startup_cycles)
+    return _PROFILER
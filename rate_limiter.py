@@ -0,0 +1,263 @@
+# rate_limiter.py
+#
+# Politeness limiter for page navigations to microcenter.com:
+# - Token bucket per host and (optionally) per store, with a burst size
+# - Adaptive: the host rate is halved when a challenge page or HTTP 429/503 shows up,
+#   and recovers slowly after clean loads
+# - Thread safe; with RATE_LIMIT_STATE_PATH set, host buckets live in a locked file
+#   so separate processes share one budget
+# - Wait time is recorded so throughput can be tuned against block rate
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from config import env_float, env_int, get_settings
+
+
+MIN_FACTOR = 0.1
+RECOVERY_STEP = 0.05
+
+
+class TokenBucket:
+    """
+    In-process bucket. rate is tokens per second at factor 1.0.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.factor = 1.0
+        self._tokens = float(self.burst)
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._ts) * self.rate * self.factor)
+        self._ts = now
+
+    def acquire(self) -> float:
+        """
+        Blocks until a token is available. Returns seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / (self.rate * self.factor)
+            time.sleep(delay)
+            waited += delay
+
+    def penalize(self) -> float:
+        with self._lock:
+            self.factor = max(MIN_FACTOR, self.factor * 0.5)
+            self._tokens = 0.0
+            return self.factor
+
+    def reward(self) -> float:
+        with self._lock:
+            self.factor = min(1.0, self.factor + RECOVERY_STEP)
+            return self.factor
+
+
+class SharedTokenBucket:
+    """
+    Same behaviour as TokenBucket, but the bucket state lives in a JSON file guarded
+    by flock, so every process pointing at the same file draws from one budget.
+    """
+
+    def __init__(self, path: str, rate: float, burst: int):
+        self.path = path
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+
+    def _update(self, fn):
+        with open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    st = json.loads(f.read() or "{}")
+                except ValueError:
+                    st = {}
+
+                now = time.time()
+                factor = float(st.get("factor", 1.0))
+                tokens = float(st.get("tokens", self.burst))
+                ts = float(st.get("ts", now))
+                tokens = min(self.burst, tokens + max(0.0, now - ts) * self.rate * factor)
+
+                st = {"tokens": tokens, "ts": now, "factor": factor}
+                result = fn(st)
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(st))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @property
+    def factor(self) -> float:
+        return self._update(lambda st: st["factor"])
+
+    def acquire(self) -> float:
+        def take(st):
+            if st["tokens"] >= 1.0:
+                st["tokens"] -= 1.0
+                return 0.0
+            return (1.0 - st["tokens"]) / (self.rate * st["factor"])
+
+        waited = 0.0
+        while True:
+            delay = self._update(take)
+            if delay <= 0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def penalize(self) -> float:
+        def f(st):
+            st["factor"] = max(MIN_FACTOR, st["factor"] * 0.5)
+            st["tokens"] = 0.0
+            return st["factor"]
+        return self._update(f)
+
+    def reward(self) -> float:
+        def f(st):
+            st["factor"] = min(1.0, st["factor"] + RECOVERY_STEP)
+            return st["factor"]
+        return self._update(f)
+
+
+class PolitenessLimiter:
+    def __init__(
+        self,
+        host_per_minute: float,
+        store_per_minute: float = 0.0,
+        burst: int = 5,
+        state_path: str = "",
+    ):
+        self.host_rate = host_per_minute / 60.0
+        self.store_rate = store_per_minute / 60.0
+        self.burst = burst
+        self.state_path = state_path if (state_path and fcntl is not None) else ""
+
+        self._hosts: dict = {}
+        self._stores: dict = {}
+        self._lock = threading.Lock()
+
+        self._acquires = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._blocks = 0
+
+    def _host_bucket(self, host: str):
+        with self._lock:
+            b = self._hosts.get(host)
+            if b is None:
+                if self.state_path:
+                    b = SharedTokenBucket(f"{self.state_path}.{host}", self.host_rate, self.burst)
+                else:
+                    b = TokenBucket(self.host_rate, self.burst)
+                self._hosts[host] = b
+            return b
+
+    def _store_bucket(self, store_id: str) -> TokenBucket | None:
+        if self.store_rate <= 0 or not store_id:
+            return None
+        with self._lock:
+            b = self._stores.get(store_id)
+            if b is None:
+                b = self._stores[store_id] = TokenBucket(self.store_rate, self.burst)
+            return b
+
+    def acquire(self, url: str, store_id: str | None = None) -> float:
+        """
+        Blocks until a navigation to url (on behalf of store_id) is allowed.
+        Returns seconds waited.
+        """
+        waited = 0.0
+        host = (urlparse(url).hostname or "").lower()
+        if host and self.host_rate > 0:
+            waited += self._host_bucket(host).acquire()
+
+        store_bucket = self._store_bucket(str(store_id) if store_id else "")
+        if store_bucket is not None:
+            waited += store_bucket.acquire()
+
+        with self._lock:
+            self._acquires += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return waited
+
+    def report_blocked(self, url: str, reason: str) -> None:
+        host = (urlparse(url).hostname or "").lower()
+        with self._lock:
+            self._blocks += 1
+        if host and self.host_rate > 0:
+            factor = self._host_bucket(host).penalize()
+            print(f"[rate_limiter] {host} blocked ({reason}), rate now x{factor:.2f}")
+
+    def report_ok(self, url: str) -> None:
+        host = (urlparse(url).hostname or "").lower()
+        if host and self.host_rate > 0:
+            self._host_bucket(host).reward()
+
+    def summary(self, reset: bool = True) -> str | None:
+        with self._lock:
+            if not self._acquires:
+                return None
+            factors = ", ".join(f"{h} x{b.factor:.2f}" for h, b in self._hosts.items())
+            line = (
+                f"Rate limiter: {self._acquires} navigations, {self._blocks} blocked, "
+                f"waited {self._wait_total:.1f}s total (avg {self._wait_total / self._acquires:.2f}s, "
+                f"max {self._wait_max:.2f}s)"
+            )
+            if factors:
+                line += f", {factors}"
+            if reset:
+                self._acquires = 0
+                self._wait_total = 0.0
+                self._wait_max = 0.0
+                self._blocks = 0
+            return line
+
+
+_LIMITER: PolitenessLimiter | None = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def get_limiter() -> PolitenessLimiter | None:
+    """
+    Process-wide limiter built from env on first use (after config.env is loaded).
+    Returns None when ENABLE_RATE_LIMIT=0.
+    """
+    global _LIMITER
+    if not get_settings().enable_rate_limit:
+        return None
+
+    with _LIMITER_LOCK:
+        if _LIMITER is None:
+            _LIMITER = PolitenessLimiter(
+                host_per_minute=env_float("RATE_LIMIT_HOST_PER_MINUTE", 60.0),
+                store_per_minute=env_float("RATE_LIMIT_STORE_PER_MINUTE", 0.0),
+                burst=env_int("RATE_LIMIT_BURST", 5),
+                state_path=(os.getenv("RATE_LIMIT_STATE_PATH") or "").strip(),
+            )
+        return _LIMITER
@@ -0,0 +1,207 @@
+# result_cache.py
+#
+# Shared result cache for several bot copies on one host (RESULT_CACHE_PATH):
+# - SQLite file keyed by (sku, store_id), entries are fresh for RESULT_CACHE_TTL_SECONDS
+# - Before loading a page an instance takes a lease on the key; other instances wait
+#   for its result instead of loading the same page. A crashed holder's lease expires
+#   after RESULT_CACHE_LEASE_SECONDS
+# - Failed checks are not cached, so every instance still sees errors as UNKNOWN
+# - Page loads on the host scale with unique keys, not with the number of instances
+
+from __future__ import annotations
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from config import env_float, get_settings
+
+
+WAIT_POLL_SECONDS = 0.25
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    sku TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    new_in_stock INTEGER NOT NULL,
+    new_qty INTEGER,
+    open_box_available INTEGER NOT NULL,
+    open_box_qty INTEGER,
+    open_box_checked INTEGER NOT NULL,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (sku, store_id)
+);
+CREATE TABLE IF NOT EXISTS leases (
+    sku TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (sku, store_id)
+);
+"""
+
+
+class SharedResultCache:
+    def __init__(self, path: str, ttl_seconds: float = 90.0, lease_seconds: float = 60.0):
+        self.path = path
+        self.ttl_seconds = float(ttl_seconds)
+        self.lease_seconds = float(lease_seconds)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers and the lease writer overlap
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sku: str, store_id: str, open_box_enabled: bool = True, newer_than: float | None = None):
+        """
+        Returns (new_in_stock, new_qty, open_box_available, open_box_qty) if a fresh
+        entry exists, else None. newer_than (epoch seconds) replaces the TTL check.
+        """
+        row = self._conn().execute(
+            "SELECT new_in_stock, new_qty, open_box_available, open_box_qty, open_box_checked, checked_at "
+            "FROM results WHERE sku = ? AND store_id = ?",
+            (sku, store_id),
+        ).fetchone()
+        if row is None:
+            return None
+        if newer_than is not None:
+            if row[5] < newer_than:
+                return None
+        elif time.time() - row[5] > self.ttl_seconds:
+            return None
+        if open_box_enabled and not row[4]:
+            return None
+        return bool(row[0]), row[1], bool(row[2]), row[3]
+
+    def _try_lease(self, sku: str, store_id: str) -> bool:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT owner, expires_at FROM leases WHERE sku = ? AND store_id = ?",
+                (sku, store_id),
+            ).fetchone()
+            if row is not None and row[0] != self.owner and row[1] > now:
+                conn.execute("COMMIT")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (sku, store_id, owner, expires_at) VALUES (?, ?, ?, ?)",
+                (sku, store_id, self.owner, now + self.lease_seconds),
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _release(self, sku: str, store_id: str) -> None:
+        self._conn().execute(
+            "DELETE FROM leases WHERE sku = ? AND store_id = ? AND owner = ?",
+            (sku, store_id, self.owner),
+        )
+
+    def put(self, sku: str, store_id: str, result: tuple, open_box_checked: bool) -> None:
+        new_in_stock, new_qty, ob_available, ob_qty = result
+        self._conn().execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (sku, store_id, int(bool(new_in_stock)), new_qty, int(bool(ob_available)), ob_qty,
+             int(bool(open_box_checked)), time.time()),
+        )
+
+    def fetch(self, sku: str, store_id: str, open_box_enabled: bool, check_fn, fresh: bool = False) -> tuple[tuple, bool]:
+        """
+        Returns (result, from_cache). check_fn() loads the page when no other
+        instance has a fresh result or is loading it right now.
+        fresh=True only accepts results written after the call started
+        (confirmation re-checks); the new result is still published.
+        """
+        newer_than = time.time() if fresh else None
+        t0 = time.monotonic()
+        waited = False
+
+        while True:
+            cached = self.get(sku, store_id, open_box_enabled, newer_than=newer_than)
+            if cached is not None:
+                with self._lock:
+                    self.hits += 1
+                    if waited:
+                        self.waited += 1
+                        self.wait_seconds += time.monotonic() - t0
+                return cached, True
+
+            if self._try_lease(sku, store_id):
+                break
+
+            # Another instance is loading this page; its result lands in the cache
+            waited = True
+            time.sleep(WAIT_POLL_SECONDS)
+
+        try:
+            result = check_fn()
+            self.put(sku, store_id, result, open_box_checked=open_box_enabled)
+        finally:
+            self._release(sku, store_id)
+
+        with self._lock:
+            self.loads += 1
+        return result, False
+
+    def summary(self, reset: bool = True) -> str | None:
+        with self._lock:
+            total = self.hits + self.loads
+            if not total:
+                return None
+            line = (
+                f"Result cache: {self.hits}/{total} from cache ({100.0 * self.hits / total:.0f}%), "
+                f"{self.loads} page loads, {self.waited} waited on another instance"
+            )
+            if self.waited:
+                line += f" (avg {self.wait_seconds / self.waited:.1f}s)"
+            if reset:
+                self.hits = 0
+                self.loads = 0
+                self.waited = 0
+                self.wait_seconds = 0.0
+            return line
+
+
+_CACHE: SharedResultCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_result_cache() -> SharedResultCache | None:
+    """
+    Process-wide cache built from env on first use (after config.env is loaded).
+    Returns None when RESULT_CACHE_PATH is empty.
+    """
+    global _CACHE
+    path = get_settings().result_cache_path
+    if not path:
+        return None
+
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = SharedResultCache(
+                path,
+                ttl_seconds=env_float("RESULT_CACHE_TTL_SECONDS", 90.0),
+                lease_seconds=env_float("RESULT_CACHE_LEASE_SECONDS", 60.0),
+            )
+        return _CACHE
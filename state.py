@@ -17,5 +17,9 @@ def load_state() -> Dict[str, bool]:
         return {}
 
 def save_state(state: Dict[str, bool]) -> None:
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
+    # Saved after every transition, so write atomically: a crash mid-write
+    # must not leave a truncated file that loads as {} and re-alerts everything.
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, STATE_FILE)
@@ -1,148 +1,401 @@
 # stock_checker.py
 
-import re
+import threading
 import time
+import weakref
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 
+from cdp_browser import CdpPage, build_cdp_page
+from chrome_profiles import PROFILE_STATS, get_profile_pool, launch_with_profile
+from config import Settings, get_settings
+from page_parser import get_parser
+from page_snapshots import get_snapshot_store
+from rate_limiter import get_limiter
+
 PAGE_LOAD_DELAY = 5
+READY_POLL_SECONDS = 0.2
+
+# True once the product data layer is in the DOM and the document is parsed.
+# Subresources (images, fonts, trackers) are not needed for anything we read.
+_INVENTORY_READY_JS = (
+    "return (function(){"
+    "var d=document.documentElement;"
+    "if(!d||document.readyState==='loading')return false;"
+    "return /['\"]inStock['\"]\\s*:/.test(d.innerHTML);"
+    "})();"
+)
+
+_RESPONSE_STATUS_JS = (
+    "return (performance.getEntriesByType('navigation')[0] || {}).responseStatus || 0;"
+)
+
+BLOCKED_STATUSES = {429, 503}
+
+# Bot-protection interstitials served instead of the product page
+CHALLENGE_MARKERS = [
+    "px-captcha",
+    "Pardon Our Interruption",
+    "<title>Access Denied</title>",
+    "_Incapsula_Resource",
+    "challenge-platform",
+]
+
+# Bytes fetched over the network for the current page (cache hits report 0)
+_TRANSFER_BYTES_JS = (
+    "return performance.getEntriesByType('navigation')"
+    ".concat(performance.getEntriesByType('resource'))"
+    ".reduce(function(a,e){return a+(e.transferSize||0);},0);"
+)
+
+# Drivers that already loaded a product page (first load after start is tracked apart)
+_WARM_DRIVERS = weakref.WeakSet()
+
+_DOMAIN_READY_JS = (
+    "return location.hostname.endsWith('microcenter.com') && document.readyState !== 'loading';"
+)
+
+
+class BlockedPageError(RuntimeError):
+    pass
+
+
+def page_load_strategy(settings: Settings | None = None) -> str:
+    """
+    PAGE_LOAD_STRATEGY=normal (default): wait for the full load event, then PAGE_LOAD_DELAY.
+    PAGE_LOAD_STRATEGY=eager or none: poll for the inventory markers and stop the
+    page load as soon as they are present, up to PAGE_LOAD_DEADLINE_SECONDS.
+    """
+    return (settings or get_settings()).page_load_strategy
+
+
+def page_load_deadline(settings: Settings | None = None) -> float:
+    return (settings or get_settings()).page_load_deadline_seconds
 
 
-def build_driver() -> webdriver.Chrome:
+def navigation_timeout(settings: Settings | None = None) -> float:
+    """
+    Hard limit for a single navigation (WebDriver page load / script timeout, CDP navigate).
+    """
+    return (settings or get_settings()).navigation_timeout_seconds
+
+
+class LoadStats:
+    """
+    Thread safe counters for product page loads in eager/none mode.
+    saved_seconds is a lower bound: the part of the fixed PAGE_LOAD_DELAY
+    that was not slept (the skipped load event wait is not measurable).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.loads = 0
+            self.early_exits = 0
+            self.deadline_fallbacks = 0
+            self.wait_seconds = 0.0
+            self.saved_seconds = 0.0
+
+    def record(self, early_exit: bool, waited: float, saved: float) -> None:
+        with self._lock:
+            self.loads += 1
+            self.wait_seconds += waited
+            self.saved_seconds += saved
+            if early_exit:
+                self.early_exits += 1
+            else:
+                self.deadline_fallbacks += 1
+
+    def summary(self) -> str | None:
+        with self._lock:
+            if not self.loads:
+                return None
+            rate = 100.0 * self.early_exits / self.loads
+            return (
+                f"Page loads: {self.loads}, early exit {rate:.0f}%, "
+                f"deadline fallbacks {self.deadline_fallbacks}, "
+                f"avg wait {self.wait_seconds / self.loads:.2f}s, "
+                f"avg saved >= {self.saved_seconds / self.loads:.2f}s"
+            )
+
+
+LOAD_STATS = LoadStats()
+
+
+class _ProfiledChrome(webdriver.Chrome):
+    """
+    Chrome on a managed profile from chrome_profiles; quit() hands the profile back.
+    """
+
+    profile = None
+
+    def quit(self) -> None:
+        try:
+            super().quit()
+        finally:
+            if self.profile is not None:
+                self.profile.release()
+
+
+def _chrome_options(settings: Settings) -> Options:
     chrome_options = Options()
     chrome_options.binary_location = "/usr/bin/google-chrome"
+    chrome_options.page_load_strategy = page_load_strategy(settings)
     chrome_options.add_argument("--headless=new")
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--window-size=1920,1080")
-    return webdriver.Chrome(options=chrome_options)
+    return chrome_options
 
 
-def set_store_and_load_product(driver: webdriver.Chrome, store_id: str, product_url: str) -> None:
-    driver.get("https://www.microcenter.com")
-    time.sleep(PAGE_LOAD_DELAY)
-
-    driver.add_cookie(
-        {
-            "name": "storeSelected",
-            "value": str(store_id),
-            "domain": ".microcenter.com",
-            "path": "/",
-            "secure": True,
-            "httpOnly": False,
-        }
-    )
-
-    driver.get(product_url)
-    time.sleep(PAGE_LOAD_DELAY)
-
+def build_driver(settings: Settings | None = None) -> webdriver.Chrome:
+    settings = settings or get_settings()
+    pool = get_profile_pool()
+    if pool is None:
+        driver = webdriver.Chrome(options=_chrome_options(settings))
+    else:
+        def start(profile):
+            chrome_options = _chrome_options(settings)
+            chrome_options.add_argument(f"--user-data-dir={profile.path}")
+            for arg in pool.cache_args():
+                chrome_options.add_argument(arg)
+            d = _ProfiledChrome(options=chrome_options)
+            d.profile = profile
+            return d
 
-def _to_text(page_source: str) -> str:
-    if not page_source:
-        return ""
+        driver = launch_with_profile(pool, start)
 
-    s = re.sub(r"(?is)<script.*?>.*?</script>", " ", page_source)
-    s = re.sub(r"(?is)<style.*?>.*?</style>", " ", s)
-    s = re.sub(r"(?is)<[^>]+>", " ", s)
+    driver.set_page_load_timeout(navigation_timeout(settings))
+    driver.set_script_timeout(navigation_timeout(settings))
+    return driver
 
-    s = s.replace("&nbsp;", " ")
-    s = s.replace("&amp;", "&")
 
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+def build_browser(settings: Settings | None = None) -> webdriver.Chrome | CdpPage:
+    """
+    BROWSER_BACKEND=selenium (default) uses chromedriver.
+    BROWSER_BACKEND=cdp talks to Chrome over the DevTools Protocol directly.
+    """
+    settings = settings or get_settings()
+    if settings.browser_backend == "cdp":
+        return build_cdp_page()
+    return build_driver(settings)
 
 
-def _extract_new_qty(page_source: str) -> int | None:
+def browser_pid(driver) -> int | None:
     """
-    Extracts:
-      9 NEW IN STOCK
-      25+ NEW IN STOCK
-    Returns integer (25 for 25+).
+    Root pid of the process tree behind a browser (chromedriver or Chrome).
     """
-    if not page_source:
+    if isinstance(driver, CdpPage):
+        return driver.browser.pid
+    try:
+        return driver.service.process.pid
+    except Exception:
         return None
 
-    pattern_html = (
-        r"(\d+)\s*\+?\s*"
-        r"(?:<[^>]+>\s*)*NEW\s*"
-        r"(?:<[^>]+>\s*)*IN\s*"
-        r"(?:<[^>]+>\s*)*STOCK"
-    )
-
-    m = re.search(pattern_html, page_source, flags=re.IGNORECASE | re.DOTALL)
-    if m:
-        try:
-            return int(m.group(1))
-        except Exception:
-            return None
 
-    t = _to_text(page_source)
-    m2 = re.search(r"\b(\d+)\s*\+?\s*NEW\s+IN\s+STOCK\b", t, flags=re.IGNORECASE)
-    if m2:
-        try:
-            return int(m2.group(1))
-        except Exception:
-            return None
+def _store_cookie(store_id: str) -> dict:
+    return {
+        "name": "storeSelected",
+        "value": str(store_id),
+        "domain": ".microcenter.com",
+        "path": "/",
+        "secure": True,
+        "httpOnly": False,
+    }
 
-    return None
 
+def _eval(driver: webdriver.Chrome | CdpPage, script: str):
+    if isinstance(driver, CdpPage):
+        # Runtime.evaluate takes an expression, not a function body
+        return driver.evaluate(script.removeprefix("return ").rstrip(";"))
+    return driver.execute_script(script)
 
-def _extract_open_box_info(page_source: str) -> tuple[int | None, bool]:
-    """
-    Open box is considered available only if the page shows an offer line like:
-      Open Box: from ...
-      1 Open Box: from ...
 
-    This avoids false positives from hidden text.
-    """
-    t = _to_text(page_source)
-    if not t:
-        return None, False
+def _stop_loading(driver: webdriver.Chrome | CdpPage) -> None:
+    try:
+        if isinstance(driver, CdpPage):
+            driver.stop_loading()
+        else:
+            driver.execute_script("window.stop();")
+    except Exception:
+        pass
 
-    offer_near = re.search(r"\bOpen\s*Box\b.{0,80}\bfrom\b", t, flags=re.IGNORECASE)
-    if not offer_near:
-        return None, False
 
-    m_qty = re.search(r"\b(\d+)\s+Open\s*Box\b", t, flags=re.IGNORECASE)
-    if m_qty:
+def _poll_until(driver: webdriver.Chrome | CdpPage, script: str, deadline_seconds: float) -> bool:
+    """
+    Evaluates script until it returns true or the deadline passes.
+    Stops the page load either way so no more subresources are fetched.
+    """
+    deadline = time.monotonic() + deadline_seconds
+    ready = False
+    while True:
         try:
-            return int(m_qty.group(1)), True
+            ready = bool(_eval(driver, script))
         except Exception:
-            return None, True
+            ready = False
+        if ready or time.monotonic() >= deadline:
+            break
+        time.sleep(READY_POLL_SECONDS)
+
+    _stop_loading(driver)
+    return ready
+
+
+def _navigate(
+    driver: webdriver.Chrome | CdpPage,
+    url: str,
+    store_id: str,
+    settings: Settings,
+    commit_only: bool = False,
+    on_throttle=None,
+) -> None:
+    """
+    Every page navigation goes through here so the politeness limiter sees it.
+    commit_only: CDP returns once the navigation commits (Selenium follows its load strategy).
+    on_throttle(waiting): called with True before and False after waiting for a limiter token.
+    """
+    limiter = get_limiter()
+    if limiter is not None:
+        if on_throttle is not None:
+            on_throttle(True)
+        try:
+            limiter.acquire(url, store_id)
+        finally:
+            if on_throttle is not None:
+                on_throttle(False)
+
+    if isinstance(driver, CdpPage):
+        driver.get(url, wait_for=None if commit_only else "load", timeout=navigation_timeout(settings))
+    else:
+        driver.get(url)
+
+
+def _load_product_early_exit(
+    driver: webdriver.Chrome | CdpPage, store_id: str, product_url: str, settings: Settings, on_throttle=None
+) -> None:
+    t0 = time.monotonic()
+    _navigate(driver, product_url, store_id, settings, commit_only=True, on_throttle=on_throttle)
+
+    ready = _poll_until(driver, _INVENTORY_READY_JS, page_load_deadline(settings))
+    waited = time.monotonic() - t0
+
+    saved = 0.0 if isinstance(driver, CdpPage) else max(0.0, PAGE_LOAD_DELAY - waited)
+    LOAD_STATS.record(early_exit=ready, waited=waited, saved=saved if ready else 0.0)
+
+
+def set_store_and_load_product(
+    driver: webdriver.Chrome | CdpPage,
+    store_id: str,
+    product_url: str,
+    settings: Settings | None = None,
+    on_throttle=None,
+) -> None:
+    settings = settings or get_settings()
+    early_exit = page_load_strategy(settings) != "normal"
+
+    if isinstance(driver, CdpPage):
+        # Network.setCookie does not need the page to be on the cookie's domain,
+        # and get() returns on the load lifecycle event, so no fixed sleeps.
+        driver.add_cookie(_store_cookie(store_id))
+        if early_exit:
+            _load_product_early_exit(driver, store_id, product_url, settings, on_throttle)
+        else:
+            _navigate(driver, product_url, store_id, settings, on_throttle=on_throttle)
+        return
+
+    _navigate(driver, "https://www.microcenter.com", store_id, settings, on_throttle=on_throttle)
+    if early_exit:
+        # add_cookie only needs the document to be on the microcenter.com domain
+        _poll_until(driver, _DOMAIN_READY_JS, page_load_deadline(settings))
+    else:
+        time.sleep(PAGE_LOAD_DELAY)
+
+    driver.add_cookie(_store_cookie(store_id))
 
-    return None, True
+    if early_exit:
+        _load_product_early_exit(driver, store_id, product_url, settings, on_throttle)
+        return
+
+    _navigate(driver, product_url, store_id, settings, on_throttle=on_throttle)
+    time.sleep(PAGE_LOAD_DELAY)
 
 
-def check_stock(driver: webdriver.Chrome, product: dict, store_id: str, open_box_enabled: bool = True) -> tuple[bool, int | None, bool, int | None]:
+def _response_status(driver: webdriver.Chrome | CdpPage) -> int:
+    """
+    HTTP status of the current document from Navigation Timing (Chrome 109+), 0 if unknown.
+    """
+    try:
+        return int(_eval(driver, _RESPONSE_STATUS_JS) or 0)
+    except Exception:
+        return 0
+
+
+def _record_transfer(driver: webdriver.Chrome | CdpPage, seconds: float) -> None:
+    first = driver not in _WARM_DRIVERS
+    _WARM_DRIVERS.add(driver)
+    try:
+        transferred = int(_eval(driver, _TRANSFER_BYTES_JS) or 0)
+    except Exception:
+        transferred = 0
+    PROFILE_STATS.record(first=first, seconds=seconds, transfer_bytes=transferred)
+
+
+def _blocked_reason(status: int, page_source: str) -> str | None:
+    if status in BLOCKED_STATUSES:
+        return f"HTTP {status}"
+    for marker in CHALLENGE_MARKERS:
+        if marker in page_source:
+            return f"challenge page ({marker})"
+    return None
+
+
+def check_stock(
+    driver: webdriver.Chrome | CdpPage,
+    product: dict,
+    store_id: str,
+    open_box_enabled: bool = True,
+    settings: Settings | None = None,
+    on_throttle=None,
+) -> tuple[bool, int | None, bool, int | None]:
     """
     Returns:
       (new_in_stock_bool, new_qty_or_none, open_box_available_bool, open_box_qty_or_none)
 
     Important:
     open box availability is independent of new stock.
+    settings: the cycle's snapshot (default: the current one).
+    on_throttle(waiting): see _navigate (lets the caller stop its clock while rate limited).
     """
     product_url = product.get("url", "")
     if not product_url:
         raise ValueError("product['url'] is missing")
 
-    set_store_and_load_product(driver, store_id, product_url)
+    t0 = time.monotonic()
+    set_store_and_load_product(driver, store_id, product_url, settings, on_throttle)
+    _record_transfer(driver, time.monotonic() - t0)
 
     page_source = driver.page_source or ""
 
-    in_stock_markers = [
-        "'inStock':'True'",
-        '"inStock":"True"',
-        '"inStock":true',
-        '"inStock": true',
-    ]
+    limiter = get_limiter()
+    blocked = _blocked_reason(_response_status(driver), page_source)
+    if blocked:
+        if limiter is not None:
+            limiter.report_blocked(product_url, blocked)
+        raise BlockedPageError(f"blocked: {blocked}")
+    if limiter is not None:
+        limiter.report_ok(product_url)
 
-    new_in_stock = any(marker in page_source for marker in in_stock_markers)
-    new_qty = _extract_new_qty(page_source) if new_in_stock else None
+    result = get_parser().parse(page_source, open_box_enabled=open_box_enabled)
 
-    if open_box_enabled:
-        open_box_qty, open_box_available = _extract_open_box_info(page_source)
-    else:
-        open_box_qty, open_box_available = None, False
+    snapshots = get_snapshot_store()
+    if snapshots is not None:
+        try:
+            snapshots.observe(str(product.get("sku", "")), str(store_id), page_source, result)
+        except Exception as e:
+            print(f"[page_snapshots] could not store snapshot (non fatal): {e}")
 
-    return bool(new_in_stock), new_qty, bool(open_box_available), open_box_qty
+    return result
@@ -0,0 +1,117 @@
+# structured_log.py
+#
+# Per-check and per-alert records as JSON lines, written off the hot path:
+# - LOG_FORMAT=text (default) keeps the human-readable console lines,
+#   json writes JSON-lines records only, both does both
+# - Records go into a bounded in-memory queue and a background listener thread
+#   writes them to LOG_JSON_PATH with size-based rotation
+# - Emitting never blocks: when the queue is full the record is dropped and counted
+
+from __future__ import annotations
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from config import env_int, get_settings
+
+
+QUEUE_SIZE = 10000
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The record dict is serialized on the listener thread, not here
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+class JsonLinesLog:
+    def __init__(self, path: str, max_bytes: int = 20 * 1024 * 1024, backups: int = 5):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True
+        )
+        file_handler.setFormatter(_JsonLinesFormatter())
+
+        self.path = path
+        self._handler = _DroppingQueueHandler(queue.Queue(maxsize=QUEUE_SIZE))
+        self._listener = logging.handlers.QueueListener(self._handler.queue, file_handler)
+        self._listener.start()
+
+        self._logger = logging.getLogger(f"stockbot.records.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(self._handler)
+
+    @property
+    def dropped(self) -> int:
+        return self._handler.dropped
+
+    def emit(self, event: str, **fields) -> None:
+        self._logger.info({"ts": round(time.time(), 3), "event": event, **fields})
+
+    def close(self) -> None:
+        self._listener.stop()
+
+
+_LOG: JsonLinesLog | None = None
+_LOG_LOCK = threading.Lock()
+
+
+def log_format() -> str:
+    # From the settings snapshot: no env lookup per event, and config.env reloads apply
+    return get_settings().log_format
+
+
+def get_record_log() -> JsonLinesLog | None:
+    """
+    Process-wide JSON-lines log built from env on first use (after config.env
+    is loaded). None while LOG_FORMAT=text.
+    """
+    global _LOG
+    if log_format() == "text":
+        return None
+
+    with _LOG_LOCK:
+        if _LOG is None:
+            _LOG = JsonLinesLog(
+                (os.getenv("LOG_JSON_PATH") or "logs/checks.jsonl").strip(),
+                max_bytes=env_int("LOG_MAX_MB", 20) * 1024 * 1024,
+                backups=env_int("LOG_BACKUPS", 5),
+            )
+        return _LOG
+
+
+def log_event(event: str, console: str | None = None, **fields) -> None:
+    """
+    console: the human-readable line, printed with LOG_FORMAT=text or both.
+    fields: the structured record, queued with LOG_FORMAT=json or both.
+    """
+    if console is not None and log_format() != "json":
+        print(console)
+
+    records = get_record_log()
+    if records is not None:
+        records.emit(event, **fields)
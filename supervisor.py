@@ -0,0 +1,198 @@
+# supervisor.py
+#
+# Supervisor mode for the watchdog (WATCHDOG_SUPERVISE=1 or `python watchdog.py --supervise`):
+# - Runs main.py as a child process and restarts it when it exits or its socket
+#   heartbeat goes stale, with exponential backoff between restarts
+# - Every process started under the child carries a marker in its environment, so
+#   Chrome / chromedriver trees left behind by a killed driver or a dead child are
+#   found and killed, both before each restart and periodically while it runs
+# - The backoff resets once the child has stayed healthy for SUPERVISOR_HEALTHY_SECONDS
+
+from __future__ import annotations
+
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import time
+
+from config import env_float, env_int
+from heartbeat import HeartbeatReceiver
+from procutil import kill_pids, pids_with_env, tree_pids
+
+
+MARKER_ENV = "STOCKBOT_SUPERVISOR"
+POLL_SECONDS = 1.0
+
+
+def _default_command() -> list[str]:
+    return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")]
+
+
+class Supervisor:
+    def __init__(
+        self,
+        receiver: HeartbeatReceiver | None,
+        report,
+        command: list[str] | None = None,
+        stale_seconds: float = 60.0,
+        backoff_seconds: float = 5.0,
+        max_backoff_seconds: float = 300.0,
+        healthy_seconds: float = 600.0,
+        stop_grace_seconds: float = 15.0,
+        sweep_seconds: float = 60.0,
+    ):
+        """
+        report(reason): called with a reason when the child is restarted and with
+        None once a restarted child is heard from again.
+        """
+        self.receiver = receiver
+        self.report = report
+        self.command = command or _default_command()
+        self.stale_seconds = stale_seconds
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.healthy_seconds = healthy_seconds
+        self.stop_grace_seconds = stop_grace_seconds
+        self.sweep_seconds = sweep_seconds
+
+        self.marker = f"{os.getpid()}-{int(time.time())}"
+        self.child: subprocess.Popen | None = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.orphans_killed = 0
+        self._failures = 0
+        self._recovered = True
+
+    def _start(self) -> None:
+        if self.receiver:
+            # Beats still queued from the previous child are not proof of life
+            self.receiver.wait(0)
+
+        env = dict(os.environ)
+        env[MARKER_ENV] = self.marker
+        self.child = subprocess.Popen(self.command, env=env)
+        self.started_at = time.monotonic()
+        print(f"[supervisor] started main (pid {self.child.pid}): {' '.join(self.command)}")
+
+    def _stop(self) -> None:
+        child, self.child = self.child, None
+        if child is not None and child.poll() is None:
+            child.terminate()
+            try:
+                child.wait(timeout=self.stop_grace_seconds)
+            except subprocess.TimeoutExpired:
+                print(f"[supervisor] main (pid {child.pid}) ignored SIGTERM, killing it")
+                child.kill()
+                child.wait()
+
+        # Anything still carrying the marker is left over from this child
+        self._kill_orphans(everything=True)
+
+    def _kill_orphans(self, everything: bool = False) -> None:
+        """
+        Kills marked processes that are no longer under the child (all of them
+        when everything=True, i.e. once the child is gone).
+        """
+        marked = pids_with_env(MARKER_ENV, self.marker)
+        if not everything and self.child is not None:
+            alive = set(tree_pids(self.child.pid))
+            marked = [pid for pid in marked if pid not in alive]
+        if not marked:
+            return
+
+        killed = kill_pids(marked)
+        self.orphans_killed += killed
+        print(f"[supervisor] killed {killed} orphaned browser process(es)")
+
+    def _quiet_seconds(self) -> float | None:
+        """
+        Seconds since the child was last heard from (its start counts), None without a socket.
+        """
+        if not self.receiver:
+            return None
+        last = max(self.receiver.last_seen or 0.0, self.started_at)
+        return time.monotonic() - last
+
+    def _backoff(self) -> float:
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** self._failures))
+        self._failures += 1
+        return delay
+
+    def _restart(self, reason: str) -> None:
+        self.restarts += 1
+        delay = self._backoff()
+        print(f"[supervisor] {reason}; restarting main in {delay:.0f}s (restart #{self.restarts})")
+        self._notify(f"{reason}; supervisor restarting main in {delay:.0f}s (restart #{self.restarts})")
+        self._recovered = False
+
+        self._stop()
+        time.sleep(delay)
+        self._start()
+
+    def _notify(self, reason: str | None) -> None:
+        try:
+            self.report(reason)
+        except Exception as e:
+            print(f"[supervisor] status report failed (non fatal): {e}")
+
+    def run(self) -> None:
+        def _on_term(*_):
+            raise SystemExit(0)
+
+        if hasattr(signal, "SIGTERM"):
+            signal.signal(signal.SIGTERM, _on_term)
+
+        self._start()
+        last_sweep = time.monotonic()
+        try:
+            while True:
+                if self.receiver:
+                    self.receiver.wait(POLL_SECONDS)
+                else:
+                    time.sleep(POLL_SECONDS)
+
+                code = self.child.poll()
+                if code is not None:
+                    self._restart(f"main exited with code {code}")
+                    continue
+
+                quiet = self._quiet_seconds()
+                if quiet is not None and quiet >= self.stale_seconds:
+                    phase = self.receiver.last.get("phase") or "unknown"
+                    self._restart(f"No heartbeat for {int(quiet)}s (last phase: {phase})")
+                    continue
+
+                now = time.monotonic()
+                heard = self.receiver and (self.receiver.last_seen or 0.0) > self.started_at
+                if not self._recovered and (heard or not self.receiver):
+                    self._recovered = True
+                    self._notify(None)
+
+                if self._failures and now - self.started_at >= self.healthy_seconds:
+                    self._failures = 0
+
+                if now - last_sweep >= self.sweep_seconds:
+                    last_sweep = now
+                    self._kill_orphans()
+
+        except (KeyboardInterrupt, SystemExit):
+            print("[supervisor] shutting down main")
+            self._stop()
+            raise
+
+
+def supervisor_from_env(receiver: HeartbeatReceiver | None, report) -> Supervisor:
+    raw_command = (os.getenv("SUPERVISOR_COMMAND") or "").strip()
+    return Supervisor(
+        receiver,
+        report,
+        command=shlex.split(raw_command) if raw_command else None,
+        stale_seconds=env_float("HEARTBEAT_STALE_SECONDS", 60.0),
+        backoff_seconds=env_float("SUPERVISOR_BACKOFF_SECONDS", 5.0),
+        max_backoff_seconds=env_float("SUPERVISOR_MAX_BACKOFF_SECONDS", 300.0),
+        healthy_seconds=env_float("SUPERVISOR_HEALTHY_SECONDS", 600.0),
+        stop_grace_seconds=env_float("SUPERVISOR_STOP_GRACE_SECONDS", 15.0),
+        sweep_seconds=env_int("SUPERVISOR_ORPHAN_SWEEP_SECONDS", 60),
+    )
@@ -1,6 +1,8 @@
 # watchdog.py
 
 import os
+import socket
+import sys
 import time
 import smtplib
 from email.mime.text import MIMEText
@@ -9,7 +11,13 @@ from zoneinfo import ZoneInfo
 
 from dotenv import load_dotenv
 
+from config import env_on
 from discord_status import DiscordStatusMessage
+from heartbeat import HeartbeatReceiver, heartbeat_path
+from supervisor import supervisor_from_env
+
+
+SOCKET_WAIT_SECONDS = 1.0
 
 
 def _load_int_env(name: str, default: int) -> int:
@@ -73,6 +81,43 @@ def send_email_alert(reason: str, last_check: str, timezone_name: str) -> None:
         server.sendmail(from_addr, [to_addr], msg.as_string())
 
 
+def _report(status: DiscordStatusMessage, reason: str | None, stopped_fields: dict) -> None:
+    """
+    reason set: marks the bot STOPPED (Discord + email) once per outage.
+    reason None: the bot is alive again, so the next outage is reported.
+    """
+    state = status._load_state()
+    stopped_notified = bool(state.get("stopped_notified", False))
+
+    if reason is None:
+        if stopped_notified:
+            state["stopped_notified"] = False
+            status._save_state(state)
+        return
+
+    if stopped_notified:
+        return
+
+    last_check_local = state.get("last_check_local", "unknown")
+    status.set_stopped(reason=reason, last_check_local=last_check_local, **stopped_fields)
+
+    send_email_alert(reason=reason, last_check=last_check_local, timezone_name=stopped_fields["timezone_name"])
+
+    state["stopped_notified"] = True
+    state["stopped_notified_ts"] = time.time()
+    status._save_state(state)
+
+
+def _open_heartbeat_receiver() -> HeartbeatReceiver | None:
+    if not env_on("ENABLE_HEARTBEAT_SOCKET", True) or not hasattr(socket, "AF_UNIX"):
+        return None
+    try:
+        return HeartbeatReceiver(heartbeat_path())
+    except OSError as e:
+        print(f"Heartbeat socket unavailable, using the status file only (non fatal): {e}")
+        return None
+
+
 def main() -> None:
     load_dotenv("config.env", override=True)
 
@@ -96,73 +141,80 @@ def main() -> None:
 
     check_every = _load_int_env("WATCHDOG_INTERVAL_SECONDS", 1800)
     stale_after = _load_int_env("WATCHDOG_STALE_SECONDS", 5400)
+    socket_stale_after = _load_int_env("HEARTBEAT_STALE_SECONDS", 60)
 
     status = DiscordStatusMessage(webhook_url, state_path=state_path)
 
-    while True:
+    stopped_fields = dict(
+        store_label=store_label,
+        products_count=products_count,
+        stores_count=stores_count,
+        checks_per_cycle=checks_per_cycle,
+        timezone_name=timezone_name,
+        mention_role_id=role_id or None,
+        mention_user_id=None if role_id else (user_id or None),
+    )
+
+    # Socket heartbeats arrive every second or so while main runs; the status file
+    # heartbeat (once per cycle) is only consulted until the first one arrives
+    receiver = _open_heartbeat_receiver()
+    if receiver:
+        print(f"Listening for heartbeats on {receiver.path} (stale after {socket_stale_after}s)")
+
+    if env_on("WATCHDOG_SUPERVISE", False) or "--supervise" in sys.argv[1:]:
+        if not receiver:
+            print("Supervisor without a heartbeat socket: main is only restarted when it exits")
+        supervisor = supervisor_from_env(receiver, lambda reason: _report(status, reason, stopped_fields))
         try:
-            state = status._load_state()
-            last_hb = state.get("last_heartbeat_ts")
-            last_check_local = state.get("last_check_local", "unknown")
+            supervisor.run()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            if receiver:
+                receiver.close()
+        return
 
-            now = time.time()
-            stopped_notified = bool(state.get("stopped_notified", False))
+    socket_stalled = False
+    next_file_check = 0.0
 
+    while True:
+        try:
+            age = None
+            if receiver:
+                receiver.wait(SOCKET_WAIT_SECONDS)
+                age = receiver.age()
+
+            if age is not None:
+                stalled = age >= socket_stale_after
+                if stalled != socket_stalled:
+                    reason = None
+                    if stalled:
+                        phase = receiver.last.get("phase") or "unknown"
+                        reason = f"No heartbeat for {int(age)}s (watchdog, last phase: {phase})"
+                    _report(status, reason, stopped_fields)
+                    socket_stalled = stalled
+                continue
+
+            if time.time() < next_file_check:
+                continue
+            next_file_check = time.time() + check_every
+
+            last_hb = status._load_state().get("last_heartbeat_ts")
             if not last_hb:
-                if not stopped_notified:
-                    reason = "No heartbeat recorded yet"
-                    status.set_stopped(
-                        reason=reason,
-                        store_label=store_label,
-                        products_count=products_count,
-                        stores_count=stores_count,
-                        checks_per_cycle=checks_per_cycle,
-                        last_check_local=last_check_local,
-                        timezone_name=timezone_name,
-                        mention_role_id=role_id or None,
-                        mention_user_id=None if role_id else (user_id or None),
-                    )
-
-                    send_email_alert(reason=reason, last_check=last_check_local, timezone_name=timezone_name)
-
-                    state["stopped_notified"] = True
-                    state["stopped_notified_ts"] = now
-                    status._save_state(state)
-
+                _report(status, "No heartbeat recorded yet", stopped_fields)
             else:
-                age = now - float(last_hb)
-
-                if age >= stale_after:
-                    if not stopped_notified:
-                        reason = f"No heartbeat for {int(age)}s (watchdog)"
-                        status.set_stopped(
-                            reason=reason,
-                            store_label=store_label,
-                            products_count=products_count,
-                            stores_count=stores_count,
-                            checks_per_cycle=checks_per_cycle,
-                            last_check_local=last_check_local,
-                            timezone_name=timezone_name,
-                            mention_role_id=role_id or None,
-                            mention_user_id=None if role_id else (user_id or None),
-                        )
-
-                        send_email_alert(reason=reason, last_check=last_check_local, timezone_name=timezone_name)
-
-                        state["stopped_notified"] = True
-                        state["stopped_notified_ts"] = now
-                        status._save_state(state)
-
-                else:
-                    if stopped_notified:
-                        state["stopped_notified"] = False
-                        status._save_state(state)
+                file_age = time.time() - float(last_hb)
+                reason = f"No heartbeat for {int(file_age)}s (watchdog)" if file_age >= stale_after else None
+                _report(status, reason, stopped_fields)
 
         except Exception as e:
             stamp = datetime.now(tz).strftime("%I:%M:%S %p").lstrip("0")
             print(f"[{stamp}] Watchdog error: {e}")
+            if receiver:
+                time.sleep(SOCKET_WAIT_SECONDS)
 
-        time.sleep(check_every)
+        if not receiver:
+            time.sleep(check_every)
 
 
 if __name__ == "__main__":